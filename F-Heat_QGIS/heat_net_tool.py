@@ -38,13 +38,17 @@ import re
 from pathlib import Path
 
 try:
+    import numpy as np
     import pandas as pd
     import geopandas as gpd
+    import shapely
     from shapely import Point
     from .src.download_files import file_list_from_URL, search_filename, read_file_from_zip, filter_df, get_shape_from_wfs, clean_data, add_point, create_square, get_area_for_zensus
     from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join
     from .src.status_analysis import WLD, Polygons
-    from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss
+    from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss, restore_field_names
+    from .src.incremental import IncrementalNet
+    from .src.pipe_sizing import PipeCosts
     from .src.load_curve import Temperature, LoadProfile, safe_in_excel
     from workalendar.europe import Germany
 except:
@@ -88,6 +92,9 @@ class HeatNetTool:
         # Gemarkung (Name and info of municipalities and cities in NRW)
         self.gemarkungen_df = pd.DataFrame()
 
+        # Net of the last network analysis, updated when only routes, connected buildings or powers change
+        self.incremental_net = None
+
     # noinspection PyMethodMayBeStatic
     def tr(self, message):
         """Get the translation for a string using Qt translation API.
@@ -253,13 +260,17 @@ class HeatNetTool:
             self.dlg.intro_label.repaint()
 
         # Import all packages
+        import numpy as np
         import pandas as pd
         import geopandas as gpd
+        import shapely
         from shapely import Point
         from .src.download_files import file_list_from_URL, search_filename, read_file_from_zip, filter_df, get_shape_from_wfs, clean_data, add_point, create_square, get_area_for_zensus
         from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join
         from .src.status_analysis import WLD, Polygons
-        from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss
+        from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss, restore_field_names
+        from .src.incremental import IncrementalNet
+        from .src.pipe_sizing import PipeCosts
         from .src.load_curve import Temperature, LoadProfile, safe_in_excel
         from workalendar.europe import Germany
 
@@ -373,6 +384,36 @@ class HeatNetTool:
             for subgroup in subgroups:
                 fheat_group.addGroup(subgroup)
 
+    def add_disconnected_layers(self, graph, points, shape_path):
+        '''
+        Saves the nodes and edges which are not connected to any source and adds them to the 'Net' group.
+
+        Parameters
+        ----------
+        graph : Graph
+            The street network graph.
+        points : list of tuple
+            Coordinates of the sources.
+        shape_path : str
+            File path of the net shapefile, the layers are saved next to it as '<net>_disconnected_nodes' and
+            '<net>_disconnected_edges'.
+
+        Returns
+        -------
+        int
+            Number of disconnected components.
+        '''
+        nodes, edges = graph.disconnected_components(points)
+        path = Path(shape_path)
+        for name, gdf in [('nodes', nodes), ('edges', edges)]:
+            layer_path = str(path.with_name(f'{path.stem}_disconnected_{name}{path.suffix}'))
+            gdf.to_file(layer_path)
+            self.add_shapefile_to_project(layer_path, group_name='Net')
+
+        n_components = nodes['component'].nunique()
+        print(f'{len(nodes)} disconnected nodes in {n_components} components, largest with {nodes["size"].max()} nodes')
+        return n_components
+
     def add_shapefile_to_project(self, shapefile_path, style=None, group_name=None):
         '''
         Adds a shapefile to the QGIS project.
@@ -615,6 +656,7 @@ class HeatNetTool:
         self.load_layers_to_combobox(self.dlg.net_comboBox_streets)
         self.load_layers_to_combobox(self.dlg.net_comboBox_source)
         self.load_layers_to_combobox(self.dlg.net_comboBox_polygon)
+        self.load_layers_to_combobox(self.dlg.net_comboBox_closures)
 
     # Main Methods
     def download_files(self):
@@ -924,7 +966,7 @@ class HeatNetTool:
         - **ID Assignment**: Assigns new IDs to buildings and merges building data as needed.
 
         7. **Street Data Adjustments**:
-        - Rounds street coordinates and adds a boolean column to indicate possible routes.
+        - Converts MultiLineString streets to LineStrings and adds a boolean column to indicate possible routes.
 
         8. **Saving and Layer Update**:
         - Determines whether to create new files or overwrite existing ones based on user input.
@@ -1148,6 +1190,7 @@ class HeatNetTool:
 
         4. **Retrieve Temperatures**:
         - Retrieves supply and return temperatures from SpinBoxes in the user interface.
+        - Optional temperature scenarios are read as supply/return pairs, e.g. `90/60; 70/40`.
 
         5. **Retrieve Layer Paths**:
         - Retrieves the file paths and objects for source, streets, and buildings layers from combo boxes.
@@ -1165,36 +1208,42 @@ class HeatNetTool:
         - Creates instances of classes for buildings, source, and streets, loading the respective data.
 
         10. **Polygon Filtering**:
-            - If a polygon is selected, filters buildings to those within the polygon boundaries.
+            - If a polygon is selected, only buildings within the polygon boundaries are connected.
 
         11. **Drop Unwanted Routes**:
-            - Removes street segments marked as not possible routes, if the attribute exists.
+            - Street segments marked as not possible routes and buildings marked as not connected are switched off, if the attributes exist.
 
         12. **Create Connection Points**:
             - Adds centroids to buildings and finds closest points to streets.
             - Establishes connection points for sources to the street network.
 
         13. **Graph Construction**:
-            - Constructs a network graph based on street geometry.
-            - Connects building centroids and source points to the graph.
-            - Adds edge attributes, such as length, to the graph.
+            - Constructs a network graph based on street geometry and connects building centroids and source points to it.
+            - If the geometries and temperatures are the same as in the last run, the net of the last run is kept and only the changed routes, buildings and powers are updated.
+            - The prepared graph is cached in a `.graph.npz` file next to the net shapefile and loaded in later sessions as long as the street, building and source geometries are unchanged.
 
         14. **Connectivity Check**:
-            - Verifies that all points in the network are connected.
-            - If not, provides feedback and visualization to assist in fixing disconnections.
+            - Verifies that all points in the network are connected to at least one source.
+            - If not, labels all components at once and adds the disconnected nodes and edges with their component id and size as `<net>_disconnected_nodes` and `<net>_disconnected_edges` layers to the 'Net' group, to assist in fixing disconnections.
 
         15. **Progress Bar Update**:
             - Updates the progress bar after constructing the graph.
 
         16. **Network Analysis**:
-            - Creates a `Net` object and performs a detailed network analysis, computing the optimal network for heat distribution based on the supply and return temperatures, pipe data, and building attributes.
+            - Creates a `Net` object from the shortest path tree of the `IncrementalNet`, computing the optimal network for heat distribution based on the supply and return temperatures, pipe data, and building attributes.
+            - With several sources every building is supplied by its closest source and the net gets a `source_id` attribute.
+            - With cost-optimal pipe sizing every pipe gets the DN with the lowest annual cost of investment, heat losses and pump energy, limited by velocity and pressure gradient and not increasing downstream.
+            - With temperature scenarios the same routes are additionally sized for every scenario. The net gets scenario-suffixed attributes, e.g. `DN [mm] 90/60`, and a summary table of all scenarios is saved as `.scenarios.xlsx` next to the net shapefile. Shapefiles cut field names to 10 characters, so for `.shp` output the scenario attributes are saved only in the sheet `edges` of the `.scenarios.xlsx`, one row per edge of the shapefile.
+
+            - Calculates the pressure loss of every pipe with the Darcy-Weisbach equation, the cumulative pressure loss from the source to every node and the critical path to the worst-case building.
+            - With a layer of ring closures, the ends of every closure line are snapped to the closest node of the net and the looped net is calculated with the sized pipes, see Net.add_closures and Net.solve_hydraulics. The net gets `loop_flow [l/s]`, `loop_velocity [m/s]` and `loop_loss [bar]`, the nodes `loop_pressure_loss [bar]`, and the pump heads of tree and looped net are shown.
 
         17. **GeoDataFrame Creation and Saving**:
             - Converts the graph to a GeoDataFrame with the computed network.
-            - Saves the GeoDataFrame as a shapefile at the specified output path.
+            - Saves the GeoDataFrame as a shapefile at the specified output path and the nodes with their pressure loss as `<net>_nodes` next to it.
 
         18. **Add Layer to Project**:
-            - Adds the resulting network shapefile as a layer in the GIS project.
+            - Adds the resulting network and node shapefiles as layers in the GIS project.
 
         19. **Completion**:
             - Finalizes the progress bar and provides user feedback indicating the successful completion of the network analysis.
@@ -1229,6 +1278,15 @@ class HeatNetTool:
             self.dlg.net_label_response.repaint()
             return
 
+        # optional temperature scenarios as supply/return pairs, e.g. '90/60; 70/40'
+        scenarios = [(float(h), float(l)) for h, l in re.findall(r'(\d+(?:\.\d+)?)\s*/\s*(\d+(?:\.\d+)?)', self.dlg.net_lineEdit_scenarios.text())]
+        if any(h <= l for h, l in scenarios):
+            # feedback
+            self.dlg.net_label_response.setText('The return temperature of every scenario has to be smaller than its supply temperature!')
+            self.dlg.net_label_response.setStyleSheet("color: red")
+            self.dlg.net_label_response.repaint()
+            return
+
         # Layer paths
         source_path, source_layer, source_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_source)
         streets_path, streets_layer, streets_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_streets)
@@ -1248,6 +1306,9 @@ class HeatNetTool:
         source = Source(source_path, source_layer)
         streets = Streets(streets_path, streets_layer)
         
+        # Connected buildings, all buildings with heat demand by default
+        building_active = np.ones(len(buildings.gdf), dtype=bool)
+
         # check if polygon checkbox is checked
         if self.dlg.net_checkBox_polygon.isChecked():
             polygon_path, polygon_layer, polygon_layer_obj  = self.get_layer_path_from_combobox(self.dlg.net_comboBox_polygon)
@@ -1258,96 +1319,123 @@ class HeatNetTool:
                 polygon = gpd.read_file(polygon_path, layer=polygon_layer)
 
             # only buildings within polygon
-            buildings.gdf = gpd.sjoin(buildings.gdf, polygon, how="inner", predicate="within")
+            within = gpd.sjoin(buildings.gdf, polygon, how="inner", predicate="within")
+            building_active &= buildings.gdf.index.isin(within.index)
 
-        # Drop unwanted routes if existing
-        try:
-            streets.gdf = streets.gdf[streets.gdf['possible_route']==1]
-        except:
-            pass
+        # Switch off unwanted routes if existing
+        if 'possible_route' in streets.gdf.columns:
+            street_active = (streets.gdf['possible_route']==1).to_numpy()
+        else:
+            street_active = np.ones(len(streets.gdf), dtype=bool)
 
-        # Drop unconnected buildings if existing
-        try:
-            buildings.gdf = buildings.gdf[buildings.gdf['Anschluss']==1]
-        except:
-            pass
+        # Switch off unconnected buildings if existing
+        if 'Anschluss' in buildings.gdf.columns:
+            building_active &= (buildings.gdf['Anschluss']==1).to_numpy()
 
         # update progressBar
         self.dlg.net_progressBar.setValue(5)
 
-        # create connection points
+        # create connection points and graph, the net of the last run is updated if only masks or powers changed
         buildings.add_centroid()
-        buildings.closest_points_buildings(streets.gdf)
-        source.closest_points_sources(streets.gdf)
-        streets.add_connection_to_streets(buildings.gdf, source.gdf)
+        power = buildings.gdf[power_attribute].to_numpy()
+        # the prepared graph is cached next to the net shape and rebuilt if the geometries change
+        cache_path = Path(shape_path).with_suffix('.graph.npz')
+        incremental_net = self.incremental_net
+        if incremental_net is not None and (incremental_net.htemp, incremental_net.ltemp) == (t_supply, t_return) and incremental_net.matches(streets.gdf, buildings.gdf, source.gdf):
+            incremental_net.update(street_active, building_active, power)
+            incremental_net.save(cache_path)
+        else:
+            incremental_net = IncrementalNet(streets.gdf, buildings.gdf, source.gdf, power, pipe_info, t_supply, t_return, street_active, building_active, cache=cache_path)
+        self.incremental_net = incremental_net
+        graph = incremental_net.graph
 
         # update progressBar
         self.dlg.net_progressBar.setValue(15)
 
-        # Graph erstellen
-        graph = Graph(crs=buildings.gdf.crs)
-        graph.create_street_network(streets.gdf)
-        graph.connect_centroids(buildings.gdf)
-        graph.connect_source(source.gdf)
-        graph.add_attribute_length()
-
-        # test connection
-        start_point = (source.gdf['geometry'][0].x, source.gdf['geometry'][0].y)
-        connected_points = graph.get_connected_points(start_point)
-        all_points = list(graph.graph.nodes)
-        if start_point not in connected_points:
-            connected_points.append(start_point)
-        if len(all_points) > len(connected_points):
-            print(len(all_points), len(connected_points))
-            # check if polygon is activated
-            if self.dlg.net_checkBox_polygon.isChecked():
-                # check if disconnected points are inside the polygon
-                disconnected_points = [point for point in all_points if point not in connected_points and point != start_point]
-                print( f'disconnected nodes: {len(disconnected_points)}')
-                print(disconnected_points)
-                if any(polygon['geometry'][0].contains(Point(point)) for point in disconnected_points):
-                    # feedback
-                    self.dlg.net_label_response.setText('Some points of the street network in your area are not connected! Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.')
-                    self.dlg.net_label_response.setStyleSheet("color: red")
-                    self.dlg.net_label_response.repaint()
-                    graph.plot_graph(start_point, connected_points)
-                    raise RuntimeError("Some points of the street network in your area are not connected!")
-            else:
-                disconnected_points = [point for point in all_points if point not in connected_points and point != start_point]
-                print( f'{len(disconnected_points)} disconnected nodes')
-                print(disconnected_points)
+        # test connection, every point has to be connected to at least one source
+        start_points = [(point.x, point.y) for point in source.gdf['geometry']]
+        node_coords, connected = graph.connected_mask(start_points)
+        if not connected.all():
+            disconnected_points = node_coords[~connected]
+            print(f'{len(disconnected_points)} of {len(node_coords)} nodes are not connected to a source')
+            # check if polygon is activated, then only disconnected points inside the polygon matter
+            area = ' in your area' if self.dlg.net_checkBox_polygon.isChecked() else ''
+            if not area or shapely.contains_xy(polygon['geometry'][0], disconnected_points[:, 0], disconnected_points[:, 1]).any():
+                # layers of the disconnected nodes and edges with their component
+                n_components = self.add_disconnected_layers(graph, start_points, shape_path)
                 # feedback
-                self.dlg.net_label_response.setText('Some points of the street network are not connected! Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.')
+                self.dlg.net_label_response.setText(f'Some points of the street network{area} are not connected! {n_components} separate parts are shown in the "disconnected" layers of the Net group. Please set their "possible_route"-attribute to zero or connect them to the street network by using the snapping tool.')
                 self.dlg.net_label_response.setStyleSheet("color: red")
                 self.dlg.net_label_response.repaint()
-                graph.plot_graph(start_point, connected_points)
-                raise RuntimeError("Some points of the street network are not connected!")
+                raise RuntimeError(f"Some points of the street network{area} are not connected!")
 
         # update progressBar
         self.dlg.net_progressBar.setValue(30)
 
 
         ### Net Analysis ###
-        net = Net(t_supply,t_return,crs=buildings.gdf.crs)
-        net.network_analysis(graph.graph, buildings.gdf, source.gdf, pipe_info, power_att=power_attribute, progressBar=self.dlg.net_progressBar)
+        for i in incremental_net.unreachable():
+            print(f'No connection for:\n{buildings.gdf.iloc[i]}')
+        net = incremental_net.to_net()
+
+        # cheapest pipes with monotone DN instead of the smallest suitable DN
+        if self.dlg.net_checkBox_optimize.isChecked():
+            costs = PipeCosts(Path(self.plugin_dir) / 'data/costs.xlsx', incremental_net.catalog)
+            net.optimize_pipes(incremental_net.catalog, costs, source.gdf)
+
+        # size the same routes for all temperature scenarios and save the summary next to the net shape
+        scenario_columns = []
+        if scenarios:
+            scenario_table = net.scenario_sweep(scenarios, incremental_net.catalog)
+            with pd.ExcelWriter(Path(shape_path).with_suffix('.scenarios.xlsx')) as writer:
+                scenario_table.to_excel(writer, sheet_name='scenarios', index=False)
+                # shapefiles cut field names to 10 characters, so the edge attributes of the scenarios are saved here with the row of the edge in the shapefile
+                if Path(shape_path).suffix.lower() == '.shp':
+                    suffixes = tuple(f' {name}' for name in scenario_table['scenario'])
+                    scenario_columns = [name for name in net.edges.columns if name.endswith(suffixes)]
+                    net.edges.to_frame(['type', 'length [m]'] + scenario_columns).to_excel(writer, sheet_name='edges', index_label='FID')
+            print(scenario_table)
+
+        # pressure loss of the pipes and along the tree to every node
+        nodes = net.add_pressure_loss(incremental_net.catalog, source.gdf)
+        response = f'Completed, pressure loss on the critical path: {net.pump_head:.2f} bar'
+
+        # optional ring closures, the looped net is calculated with the sized pipes of the tree
+        if self.dlg.net_checkBox_closures.isChecked():
+            closures_path, closures_layer, closures_layer_obj = self.get_layer_path_from_combobox(self.dlg.net_comboBox_closures)
+            if closures_layer == None:
+                closures = gpd.read_file(closures_path)
+            else:
+                closures = gpd.read_file(closures_path, layer=closures_layer)
+            if closures.crs is not None:
+                closures = closures.to_crs(net.crs)
+            net.add_closures(closures.geometry)
+            loop_nodes = net.solve_hydraulics(incremental_net.catalog, source.gdf)
+            nodes['loop_pressure_loss [bar]'] = loop_nodes['pressure_loss [bar]'].to_numpy()
+            response += f', with ring closures: {net.pump_head:.2f} bar'
 
         # update progressBar
         self.dlg.net_progressBar.setValue(45)
 
         # GeoDataFrame from net
-        net.ensure_power_attribute()
         net.graph_to_gdf()
         
-        # save net shape
-        net.gdf.to_file(shape_path)
+        # save net shape, without the scenario attributes for shapefiles
+        net.gdf.drop(columns=scenario_columns).to_file(shape_path)
 
-        # load net as layer
+        # save nodes with the cumulative pressure loss next to the net shape
+        nodes_path = Path(shape_path)
+        nodes_path = str(nodes_path.with_name(f'{nodes_path.stem}_nodes{nodes_path.suffix}'))
+        nodes.to_file(nodes_path)
+
+        # load net and nodes as layer
+        self.add_shapefile_to_project(nodes_path, group_name='Net')
         self.add_shapefile_to_project(shape_path, 'net', group_name='Net')
 
         # update progressBar
         self.dlg.net_progressBar.setValue(100)
         # feedback
-        self.dlg.net_label_response.setText('Completed')
+        self.dlg.net_label_response.setText(response)
         self.dlg.net_label_response.setStyleSheet("color: rgb(0, 255, 0)")
         self.dlg.net_label_response.repaint()
 
@@ -1405,6 +1493,8 @@ class HeatNetTool:
 
         16. **Aggregate Demand and Losses**:
             - Adds a column for the sum of all buildings' demands and calculates losses. 
+            - The hourly losses are simulated along the net with the load of all buildings, see Net.thermal_simulation.
+            - The annual sums of the simulated losses replace the static losses of the summary, split over the diameters by their share of U-value times length.
             - Adds a total column that includes both the demand and losses.
 
         17. **Visualization**:
@@ -1453,7 +1543,8 @@ class HeatNetTool:
 
         # net path
         net_path = self.dlg.net_lineEdit_net.text()
-        net_gdf = gpd.read_file(net_path)
+        # field names which a shapefile cut to 10 characters get their full names again
+        net_gdf = restore_field_names(gpd.read_file(net_path))
 
         # Instantiate classes
         buildings = Buildings(buildings_path, heat_attribute, buildings_layer)
@@ -1573,8 +1664,20 @@ class HeatNetTool:
         # glf = result.data_dict['GLF'][0] # Gleichzeitigkeitsfaktor/coincident factor
         # demand_glf = load_profile.add_glf(demand_with_sum_buildings,glf)
 
+        # hourly loss of the net with the load of all buildings
+        total_demand = demand_with_sum_buildings['Summe aller Gebäudetypen'].to_numpy()
+        load_factor = total_demand / total_demand.max() if total_demand.max() > 0 else total_demand
+        thermal_net = Net.from_gdf(net_gdf, t_supply, t_return)
+        thermal = thermal_net.thermal_simulation(pipe_info, source.gdf, load_factor)
+        thermal_extra = thermal_net.thermal_simulation(pipe_info, source.gdf, load_factor, extra_insulation=True)
+        print(f"Lowest supply temperature at a building: {thermal['min_supply_temperature [°C]'].min():.1f} °C")
+
+        # annual loss of the simulation in the summary
+        result.set_annual_loss(thermal['loss [kW]'], thermal_extra['loss [kW]'])
+        result.save_in_excel(result_table = result.gdf)
+
         # add loss
-        demand_with_loss = load_profile.add_loss(demand_with_sum_buildings, load_profile.net_result, resolution)
+        demand_with_loss = load_profile.add_loss(demand_with_sum_buildings, load_profile.net_result, resolution, thermal['loss [kW]'].to_numpy()/1000, thermal_extra['loss [kW]'].to_numpy()/1000)
         
         # add sum buildings+loss
         demand_with_sum = load_profile.add_sum(demand_with_loss)
@@ -1652,13 +1755,17 @@ class HeatNetTool:
 
             # check modules
             try:
+                import numpy as np
                 import pandas as pd
                 import geopandas as gpd
+                import shapely
                 from shapely import Point
                 from .src.download_files import file_list_from_URL, search_filename, read_file_from_zip, filter_df, get_shape_from_wfs
                 from .src.adjust_files import Streets_adj, Buildings_adj, Parcels_adj, spatial_join
                 from .src.status_analysis import WLD, Polygons
-                from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss
+                from .src.net_analysis import Streets, Source, Buildings, Graph, Net, Result, get_closest_point, calculate_GLF, calculate_volumeflow, calculate_diameter_velocity_loss, restore_field_names
+                from .src.incremental import IncrementalNet
+                from .src.pipe_sizing import PipeCosts
                 from .src.load_curve import Temperature, LoadProfile, safe_in_excel
                 from workalendar.europe import Germany
             except Exception as e:
@@ -9,7 +9,7 @@ class Streets_adj():
     '''
     A class used to represent and manipulate street geometries.
 
-    This class provides methods to round the coordinates of street geometries and to add a boolean column
+    This class provides methods to convert street geometries to LineStrings and to add a boolean column
     indicating possible routes.
 
     Attributes
@@ -20,7 +20,7 @@ class Streets_adj():
     Methods
     -------
     round_streets():
-        Rounds the coordinates of street geometries to 3 decimal places.
+        Converts MultiLineString street geometries to LineString geometries.
         
     add_bool_column():
         Adds a boolean column indicating possible routes.
@@ -39,10 +39,10 @@ class Streets_adj():
         
     def round_streets(self):
         '''
-        Rounds the coordinates of street geometries to 3 decimal places.
+        Converts MultiLineString street geometries to LineString geometries.
 
-        This method processes the geometries in the GeoDataFrame, converting any MultiLineString geometries
-        to LineString geometries, and then rounds their coordinates to 3 decimal places.
+        The coordinates are no longer rounded here. Nearly coincident vertices are merged into one node
+        by the NodeIndex of the street graph when the network is created.
 
         Notes
         -----
@@ -75,27 +75,9 @@ class Streets_adj():
             else:
                 return geometry, x
 
-        def round_coordinates(line):
-            '''
-            Rounds the coordinates of a LineString geometry to 3 decimal places.
-
-            Parameters
-            ----------
-            line : shapely.geometry.LineString
-                The LineString geometry to be rounded.
-
-            Returns
-            -------
-            shapely.geometry.LineString
-                The rounded LineString geometry.
-            '''
-            rounded_coords = [(round(x, 3), round(y, 3)) for x, y in line.coords]
-            return LineString(rounded_coords)
-
         streets = self.gdf
         x = 0
         streets['geometry'], x = zip(*streets['geometry'].apply(lambda geom: convert_multilinestring_to_linestring(geom, x)))
-        streets['geometry'] = streets['geometry'].apply(round_coordinates)
         
         if max(x) > 0:
             print('At least one street geometry is a MultiLineString! Continuing with the first LineString as the street. Check the street geometry if necessary.')
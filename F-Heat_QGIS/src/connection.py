@@ -0,0 +1,255 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from .street_graph import path_sums, subtree_sums, tree_depth
+
+class ConnectionSelection:
+    '''
+    Greedy selection of the buildings which are worth connecting to a heat network.
+
+    Starting from the shortest path tree of an IncrementalNet with all active buildings, the building with the highest
+    marginal trench length (or cost) per demand is removed again and again. The marginal trench of a building is the
+    part of the tree which only leads to this building. The tree is kept compressed to the buildings, the sources and
+    the branching nodes, so every removal only updates the chains next to the removed building instead of the whole
+    tree.
+
+    Attributes
+    ----------
+    net : IncrementalNet
+        The net with the full shortest path tree.
+    demand : ndarray
+        Demand of each building, e.g. the annual heat demand.
+    building_active : ndarray
+        Boolean mask of the buildings which were connected when the selection was prepared.
+    order : ndarray
+        Positions of the connected buildings in the order of their removal.
+    curve : DataFrame
+        One row per step with 'n_building', 'demand', 'trench_length [m]', 'cost' and 'ratio', the marginal trench
+        length or cost per demand of the building which is removed next. Row k is the net after k removals.
+
+    Methods
+    -------
+    run(criterion='length'):
+        Removes the buildings greedily and returns the curve of connected demand vs. trench length and cost.
+    building_mask(step):
+        Returns the mask of the connected buildings after a number of removals.
+    to_net(step):
+        Updates the IncrementalNet to the buildings of a step and converts it to a Net.
+    '''
+
+    def __init__(self, net, demand=None, costs=None, extra_insulation=False):
+        '''
+        Prepares the greedy selection for the current tree of an IncrementalNet.
+
+        Parameters
+        ----------
+        net : IncrementalNet
+            The net with all buildings which may be connected switched on.
+        demand : array_like, optional
+            Demand of each building in the buildings GeoDataFrame of the net (default is None, the power of the net).
+        costs : PipeCosts, optional
+            Pipe prices for the cost of every tree edge with the DN of the full net (default is None, the cost equals
+            the trench length).
+        extra_insulation : bool, optional
+            Use the prices of the pipes with extra insulation (default is False).
+        '''
+        self.net = net
+        self.demand = np.asarray(net.power if demand is None else demand, dtype=np.float64)
+        self.costs = costs
+        self.extra_insulation = extra_insulation
+        self.building_active = net.building_active.copy()
+        self.order = np.empty(0, dtype=np.int64)
+        self.curve = None
+
+    def _tree(self):
+        '''
+        Returns the tree edges which lead to connected buildings with their length and cost.
+        '''
+        net = self.net
+        G = net.graph.graph
+        pred = net.pred
+        n = len(pred)
+
+        # Connected buildings and their nodes
+        node = net.building_node
+        connected = net.building_active & (node >= 0)
+        connected[connected] = np.isfinite(net.dist[node[connected]])
+        buildings = np.flatnonzero(connected)
+
+        count = np.zeros(n)
+        np.add.at(count, node[buildings], 1)
+        count = subtree_sums(pred, count)
+
+        # Length and cost of the tree edge to every node
+        tree = np.flatnonzero((pred >= 0) & (count > 0))
+        edge = G.edge_index(pred[tree], tree)
+        length = np.zeros(n)
+        length[tree] = G.length[edge]
+        cost = length.copy()
+        if self.costs is not None and len(tree) > 0:
+            position = {value: i for i, value in enumerate(net.catalog.dn)}
+            idx = np.array([position.get(value, net.catalog.min_index) for value in net.edge_data['DN [mm]'][tree]], dtype=np.int64)
+            investment = self.costs.investment(length[tree], G.edge_type[edge] == 'Hausanschluss', self.extra_insulation)
+            cost[tree] = np.nan_to_num(investment[np.arange(len(tree)), idx])
+        return buildings, count, length, cost
+
+    def run(self, criterion='length'):
+        '''
+        Removes the buildings greedily and returns the curve of connected demand vs. trench length and cost.
+
+        Parameters
+        ----------
+        criterion : str, optional
+            'length' to remove the building with the highest marginal trench length per demand first, 'cost' for the
+            highest marginal cost per demand (default is 'length').
+
+        Returns
+        -------
+        DataFrame
+            The curve, see the attribute curve.
+        '''
+        if criterion not in ('length', 'cost'):
+            raise ValueError(f"criterion must be 'length' or 'cost', not {criterion!r}")
+        net = self.net
+        pred = net.pred
+        buildings, count, length, cost = self._tree()
+
+        # Buildings and their demand per node
+        node = net.building_node[buildings]
+        node_demand = {}
+        node_buildings = {}
+        for b, v, d in zip(buildings.tolist(), node.tolist(), self.demand[buildings].tolist()):
+            node_demand[v] = node_demand.get(v, 0.0) + d
+            node_buildings.setdefault(v, []).append(b)
+
+        # Nodes of the compressed tree: buildings, sources and nodes where several branches meet
+        in_tree = count > 0
+        children = np.bincount(pred[in_tree & (pred >= 0)], minlength=len(pred))
+        keep = in_tree & ((children >= 2) | (pred < 0))
+        keep[node] = True
+
+        # Closest kept ancestor of every node, level by level from the sources
+        depth = tree_depth(pred)
+        nodes = np.flatnonzero(in_tree)
+        nodes = nodes[np.argsort(depth[nodes], kind='stable')]
+        ancestor = np.full(len(pred), -1, dtype=np.int64)
+        bounds = np.flatnonzero(np.diff(depth[nodes])) + 1
+        for level in np.split(nodes, bounds):
+            parent = pred[level]
+            inner = parent >= 0
+            ancestor[level[inner]] = np.where(keep[parent[inner]], parent[inner], ancestor[parent[inner]])
+
+        # Chain of every kept node to its kept ancestor
+        length_to_root = path_sums(pred, length)
+        cost_to_root = path_sums(pred, cost)
+        kept = np.flatnonzero(keep & (ancestor >= 0))
+        parent_of = dict(zip(kept.tolist(), ancestor[kept].tolist()))
+        chain_length = dict(zip(kept.tolist(), (length_to_root[kept] - length_to_root[ancestor[kept]]).tolist()))
+        chain_cost = dict(zip(kept.tolist(), (cost_to_root[kept] - cost_to_root[ancestor[kept]]).tolist()))
+        child_set = {v: set() for v in np.flatnonzero(keep).tolist()}
+        for c, p in parent_of.items():
+            child_set[p].add(c)
+
+        chain = chain_length if criterion == 'length' else chain_cost
+        version = dict.fromkeys(node_demand, 0)
+        heap = []
+
+        def push(v):
+            # Buildings at leaves free their chain, buildings inside the tree free nothing
+            version[v] += 1
+            marginal = chain[v] if not child_set[v] else 0.0
+            ratio = marginal / node_demand[v] if node_demand[v] > 0 else np.inf
+            heapq.heappush(heap, (-ratio, v, version[v]))
+
+        def dissolve(v):
+            # A node which is neither building nor branch any more joins the chain of its only child
+            (c,) = child_set.pop(v)
+            p = parent_of.pop(v)
+            child_set[p].discard(v)
+            child_set[p].add(c)
+            parent_of[c] = p
+            chain_length[c] += chain_length.pop(v)
+            chain_cost[c] += chain_cost.pop(v)
+            if c in node_demand and not child_set[c]:
+                push(c)
+
+        for v in node_demand:
+            push(v)
+
+        total_length = float(length[in_tree].sum())
+        total_cost = float(cost[in_tree].sum())
+        total_demand = float(sum(node_demand.values()))
+        n_building = len(buildings)
+        rows = []
+        order = []
+        while heap:
+            ratio, v, v_version = heapq.heappop(heap)
+            if v not in node_demand or version[v] != v_version:
+                continue
+            rows.append((n_building, total_demand, total_length, total_cost, -ratio))
+            order.extend(node_buildings[v])
+            n_building -= len(node_buildings[v])
+            total_demand -= node_demand.pop(v)
+
+            if child_set[v]:
+                # The node stays as a branch or joins the chain of its only child
+                if len(child_set[v]) == 1:
+                    dissolve(v)
+                continue
+
+            # Remove the chain of the leaf
+            total_length -= chain_length.pop(v)
+            total_cost -= chain_cost.pop(v)
+            p = parent_of.pop(v)
+            del child_set[v]
+            child_set[p].remove(v)
+            if p in node_demand:
+                if not child_set[p]:
+                    push(p)
+            elif len(child_set[p]) == 1 and p in parent_of:
+                dissolve(p)
+
+        rows.append((n_building, max(total_demand, 0.0), max(total_length, 0.0), max(total_cost, 0.0), np.nan))
+        self.order = np.array(order, dtype=np.int64)
+        self.curve = pd.DataFrame(rows, columns=['n_building', 'demand', 'trench_length [m]', 'cost', 'ratio'])
+        return self.curve
+
+    def building_mask(self, step):
+        '''
+        Returns the mask of the connected buildings after a number of removals.
+
+        Parameters
+        ----------
+        step : int
+            Row of the curve, i.e. the number of removal steps.
+
+        Returns
+        -------
+        ndarray
+            Boolean mask of the buildings in the buildings GeoDataFrame of the net.
+        '''
+        if self.curve is None:
+            raise RuntimeError('run has to be called before a step can be selected')
+        removed = int(self.curve['n_building'].iloc[0] - self.curve['n_building'].iloc[step])
+        mask = self.building_active.copy()
+        mask[self.order[:removed]] = False
+        return mask
+
+    def to_net(self, step):
+        '''
+        Updates the IncrementalNet to the buildings of a step and converts it to a Net.
+
+        Parameters
+        ----------
+        step : int
+            Row of the curve, i.e. the number of removal steps.
+
+        Returns
+        -------
+        Net
+            The sized network of the remaining buildings, e.g. for graph_to_gdf.
+        '''
+        self.net.update(building_active=self.building_mask(step))
+        return self.net.to_net()
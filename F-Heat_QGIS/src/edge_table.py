@@ -0,0 +1,306 @@
+import geopandas as gpd
+import networkx as nx
+import numpy as np
+import pandas as pd
+import shapely
+
+class EdgeTable:
+    '''
+    The edges of a net with their attributes as NumPy columns indexed by edge id.
+
+    Attributes
+    ----------
+    coords : ndarray
+        Coordinates of the start and end node of each edge with shape (m, 2, 2).
+    columns : dict
+        One array of length m per attribute, e.g. 'power [kW]' or 'DN [mm]'.
+
+    Methods
+    -------
+    append(xy_u, xy_v, columns=None):
+        Appends edges and returns their ids.
+    set(name, values, ids=None):
+        Sets the values of an attribute for all or some edges.
+    get(name, default=np.nan):
+        Returns the values of an attribute, edges without the attribute get the default.
+    find(u, v):
+        Returns the id of the edge between two nodes.
+    find_all(xy_u, xy_v):
+        Returns the ids of the edges between pairs of nodes.
+    node_arrays():
+        Returns the coordinates of the nodes and the node ids of the edges.
+    rows():
+        Iterates over the edges as (u, v, data) like NetworkX.
+    to_networkx():
+        Converts the edges to a NetworkX graph with coordinate tuples as nodes.
+    to_frame(names=None):
+        Returns the attributes as a DataFrame without copying the columns.
+    to_gdf(crs, defaults=None):
+        Returns the edges as a GeoDataFrame with one straight line per edge.
+    from_edges(edges):
+        Creates a table from edges as (u, v, data).
+    '''
+
+    def __init__(self):
+        '''
+        Initializes an empty table.
+        '''
+        self.coords = np.empty((0, 2, 2), dtype=np.float64)
+        self.columns = {}
+        self._lookup = None
+
+    def __len__(self):
+        return len(self.coords)
+
+    @staticmethod
+    def _array(values):
+        '''
+        Converts values to an array, texts become objects so that longer texts can be set later.
+        '''
+        values = np.asarray(values)
+        return values.astype(object) if values.dtype.kind in 'US' else values
+
+    @staticmethod
+    def _keys(coords):
+        '''
+        Returns the order independent keys of edges with coordinates of shape (k, 2, 2).
+        '''
+        return [frozenset([(x0, y0), (x1, y1)]) for x0, y0, x1, y1 in coords.reshape(-1, 4).tolist()]
+
+    @staticmethod
+    def _missing(values, n):
+        '''
+        Returns n missing values of the kind of an array, NaN for numbers and None for other objects.
+        '''
+        if values.dtype.kind in 'iufb':
+            return np.full(n, np.nan)
+        return np.full(n, None, dtype=object)
+
+    def append(self, xy_u, xy_v, columns=None):
+        '''
+        Appends edges and returns their ids.
+
+        Parameters
+        ----------
+        xy_u, xy_v : array_like
+            Coordinates of the start and end node of each edge with shape (k, 2).
+        columns : dict, optional
+            Values of the attributes of the new edges, attributes which the table does not have yet get missing values
+            for the old edges and the other way round (default is None).
+
+        Returns
+        -------
+        ndarray
+            Ids of the new edges.
+        '''
+        xy = np.stack([np.asarray(xy_u, dtype=np.float64).reshape(-1, 2), np.asarray(xy_v, dtype=np.float64).reshape(-1, 2)], axis=1)
+        n, k = len(self.coords), len(xy)
+        columns = {name: self._array(values) for name, values in (columns or {}).items()}
+
+        for name in list(self.columns) + [name for name in columns if name not in self.columns]:
+            old = self.columns[name] if name in self.columns else self._missing(columns[name], n)
+            new = columns[name] if name in columns else self._missing(old, k)
+            self.columns[name] = np.concatenate([old, new]) if n > 0 else new.copy()
+
+        self.coords = np.concatenate([self.coords, xy])
+        # The lookup of find is extended instead of being built again
+        if self._lookup is not None:
+            self._lookup.update(zip(self._keys(xy), range(n, n + k)))
+        return np.arange(n, n + k)
+
+    def set(self, name, values, ids=None):
+        '''
+        Sets the values of an attribute for all or some edges.
+
+        Parameters
+        ----------
+        name : str
+            Name of the attribute.
+        values : array_like or scalar
+            The values, one per edge or per id.
+        ids : array_like, optional
+            Ids of the edges (default is None, all edges). Other edges get missing values if the attribute is new.
+        '''
+        values = self._array(values)
+        if ids is None:
+            self.columns[name] = np.array(np.broadcast_to(values, (len(self),)))
+            return
+        if name not in self.columns:
+            self.columns[name] = self._missing(values, len(self))
+        column = self.columns[name]
+        if column.dtype.kind in 'iufb' and values.dtype.kind in 'iufb':
+            kind = np.result_type(column, values)
+        else:
+            kind = np.dtype(object)
+        if kind != column.dtype:
+            column = self.columns[name] = column.astype(kind)
+        column[np.asarray(ids, dtype=np.int64)] = values
+
+    def get(self, name, default=np.nan):
+        '''
+        Returns the values of an attribute, edges without the attribute get the default.
+
+        Parameters
+        ----------
+        name : str
+            Name of the attribute.
+        default : scalar, optional
+            Value of edges without the attribute (default is NaN).
+
+        Returns
+        -------
+        ndarray
+            One value per edge, the column itself if the table has the attribute.
+        '''
+        if name not in self.columns:
+            return np.full(len(self), default, dtype=object if isinstance(default, str) or default is None else None)
+        column = self.columns[name]
+        if default is np.nan or column.dtype.kind in 'iub':
+            return column
+        missing = pd.isna(column)
+        return np.where(missing, default, column) if missing.any() else column
+
+    def find(self, u, v):
+        '''
+        Returns the id of the edge between two nodes.
+
+        Parameters
+        ----------
+        u, v : tuple
+            Coordinates of the nodes, in any order.
+
+        Returns
+        -------
+        int
+            Id of the edge, -1 if there is none.
+        '''
+        if self._lookup is None:
+            self._lookup = dict(zip(self._keys(self.coords), range(len(self))))
+        return self._lookup.get(frozenset([tuple(u), tuple(v)]), -1)
+
+    def find_all(self, xy_u, xy_v):
+        '''
+        Returns the ids of the edges between pairs of nodes.
+
+        Parameters
+        ----------
+        xy_u, xy_v : array_like
+            Coordinates of the nodes of each pair with shape (k, 2), in any order.
+
+        Returns
+        -------
+        ndarray
+            Id of the edge of each pair, -1 if there is none.
+        '''
+        if self._lookup is None:
+            self._lookup = dict(zip(self._keys(self.coords), range(len(self))))
+        xy = np.stack([np.asarray(xy_u, dtype=np.float64).reshape(-1, 2), np.asarray(xy_v, dtype=np.float64).reshape(-1, 2)], axis=1)
+        return np.array([self._lookup.get(key, -1) for key in self._keys(xy)], dtype=np.int64)
+
+    def node_arrays(self):
+        '''
+        Returns the coordinates of the nodes and the node ids of the edges.
+
+        Returns
+        -------
+        tuple
+            The coordinates of the nodes with shape (n, 2) and the node ids u and v of the edges. Nodes are equal if
+            their coordinates are exactly equal, like the coordinate tuples of a NetworkX graph.
+        '''
+        coords, inverse = np.unique(self.coords.reshape(-1, 2), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1, 2)
+        return coords, inverse[:, 0].astype(np.int64), inverse[:, 1].astype(np.int64)
+
+    def rows(self):
+        '''
+        Iterates over the edges as (u, v, data) like NetworkX.
+
+        Yields
+        ------
+        tuple
+            Coordinate tuples of both nodes and a new dict with the attributes of the edge.
+        '''
+        names = list(self.columns)
+        values = [self.columns[name].tolist() for name in names]
+        for (x0, y0, x1, y1), row in zip(self.coords.reshape(-1, 4).tolist(), zip(*values)):
+            yield (x0, y0), (x1, y1), dict(zip(names, row))
+
+    def to_networkx(self):
+        '''
+        Converts the edges to a NetworkX graph with coordinate tuples as nodes.
+
+        Returns
+        -------
+        nx.Graph
+            A new graph, changes to it do not change the table.
+        '''
+        G = nx.Graph()
+        G.add_edges_from(self.rows())
+        return G
+
+    def to_frame(self, names=None):
+        '''
+        Returns the attributes as a DataFrame without copying the columns.
+
+        Parameters
+        ----------
+        names : list of str, optional
+            Attributes to include (default is None, all attributes).
+
+        Returns
+        -------
+        DataFrame
+            One row per edge.
+        '''
+        names = list(self.columns) if names is None else names
+        return pd.DataFrame({name: self.columns[name] for name in names}, copy=False)
+
+    def to_gdf(self, crs, defaults=None):
+        '''
+        Returns the edges as a GeoDataFrame with one straight line per edge.
+
+        Parameters
+        ----------
+        crs : string
+            coordinate reference system
+        defaults : dict, optional
+            Columns which always exist and the value of edges without them (default is None).
+
+        Returns
+        -------
+        GeoDataFrame
+            The attributes as columns, which share the memory of the table where possible.
+        '''
+        data = dict(self.columns)
+        for name, default in (defaults or {}).items():
+            data[name] = self.get(name, default)
+        return gpd.GeoDataFrame(data, geometry=shapely.linestrings(self.coords), crs=crs, copy=False)
+
+    @classmethod
+    def from_edges(cls, edges):
+        '''
+        Creates a table from edges as (u, v, data).
+
+        Parameters
+        ----------
+        edges : iterable of tuple
+            Edges with coordinate tuples as nodes, e.g. from the edges of a NetworkX graph.
+
+        Returns
+        -------
+        EdgeTable
+            The table, attributes which only some edges have get missing values for the others.
+        '''
+        edges = list(edges)
+        table = cls()
+        if not edges:
+            return table
+        edge_data = [data for u, v, data in edges]
+        names = dict.fromkeys(key for data in edge_data for key in data)
+        columns = {}
+        for name in names:
+            values = [data.get(name, np.nan) for data in edge_data]
+            column = np.asarray(values) if all(isinstance(value, (bool, int, float, np.number)) for value in values) else np.array(values, dtype=object)
+            columns[name] = column
+        table.append([u for u, v, data in edges], [v for u, v, data in edges], columns)
+        return table
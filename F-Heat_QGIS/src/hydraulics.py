@@ -0,0 +1,197 @@
+import numpy as np
+from scipy.sparse import csr_matrix, diags
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import spsolve
+
+from .water_properties import density, kinematic_viscosity
+
+GRAVITY = 9.81  # m/s²
+
+def friction_factor(reynolds, relative_roughness):
+    '''
+    Darcy friction factor of pipe flow.
+
+    Parameters
+    ----------
+    reynolds : array_like
+        Reynolds number of each pipe.
+    relative_roughness : array_like
+        Roughness divided by the inner diameter.
+
+    Returns
+    -------
+    ndarray
+        64/Re for laminar flow (Re < 2300), otherwise the Swamee-Jain approximation of the Colebrook equation.
+        Pipes without flow get 0.
+    '''
+    reynolds = np.asarray(reynolds, dtype=np.float64)
+    relative_roughness = np.asarray(relative_roughness, dtype=np.float64)
+    flow = reynolds > 0
+    re = np.where(flow, reynolds, 1.0)
+
+    laminar = 64 / re
+    turbulent = 0.25 / np.log10(relative_roughness / 3.7 + 5.74 / re ** 0.9) ** 2
+    return np.where(flow, np.where(re < 2300, laminar, turbulent), 0.0)
+
+def pressure_gradient(velocity, di, temp, roughness=0.1):
+    '''
+    Pressure loss per metre of pipe with the Darcy-Weisbach equation.
+
+    Parameters
+    ----------
+    velocity : array_like
+        Flow velocity in m/s.
+    di : array_like
+        Inner diameter in mm.
+    temp : float or array_like
+        Water temperature in °C.
+    roughness : float or array_like, optional
+        Absolute roughness of the pipe wall in mm (default is 0.1).
+
+    Returns
+    -------
+    ndarray
+        Pressure loss in Pa/m.
+    '''
+    velocity = np.abs(np.asarray(velocity, dtype=np.float64))
+    d = np.asarray(di, dtype=np.float64) / 1000
+    reynolds = velocity * d / kinematic_viscosity(temp)
+    f = friction_factor(reynolds, np.asarray(roughness, dtype=np.float64) / 1000 / d)
+    return f / d * density(temp) * velocity ** 2 / 2
+
+def critical_path(pred, pressure, targets=None):
+    '''
+    Path from the source to the node with the highest cumulative pressure loss.
+
+    Parameters
+    ----------
+    pred : ndarray
+        Predecessor of every node, -1 for the sources and for unreachable nodes.
+    pressure : ndarray
+        Cumulative pressure loss of every node, e.g. from street_graph.path_sums.
+    targets : array_like, optional
+        Candidate end nodes, e.g. the building nodes (default is None, all nodes).
+
+    Returns
+    -------
+    ndarray
+        Node ids from the source to the worst-case node, empty if there are no candidates.
+    '''
+    targets = np.arange(len(pred)) if targets is None else np.asarray(targets, dtype=np.int64)
+    if len(targets) == 0:
+        return np.empty(0, dtype=np.int64)
+
+    path = [int(targets[np.argmax(pressure[targets])])]
+    while pred[path[-1]] >= 0:
+        path.append(int(pred[path[-1]]))
+    return np.array(path[::-1], dtype=np.int64)
+
+def solve_network(edges, length, di, demand, sources, temp, roughness=0.1, tol=1e-6, max_iter=100):
+    '''
+    Steady-state flows and pressures of a looped network by Newton iteration on the node pressures.
+
+    Every iteration linearizes the Darcy-Weisbach pressure loss of all pipes around the current flows and solves one
+    sparse symmetric system for the pressures of the free nodes, the sources keep a fixed pressure. The flows follow
+    from the new pressures, so continuity holds in every node after each step.
+
+    Parameters
+    ----------
+    edges : array_like
+        Node ids of the pipes with shape (m, 2), the flow is positive from the first to the second node.
+    length : array_like
+        Length of each pipe in m.
+    di : array_like
+        Inner diameter of each pipe in mm.
+    demand : array_like
+        Flow drawn off at each node in l/s, the demand of the sources is ignored.
+    sources : array_like
+        Node ids of the sources, which supply the demand at equal pressure.
+    temp : float or tuple of float
+        Water temperature in °C. With several temperatures, e.g. of supply and return line, the pressure losses of one
+        pipe per temperature are added.
+    roughness : float, optional
+        Absolute roughness of the pipe walls in mm (default is 0.1).
+    tol : float, optional
+        Largest change of a flow in l/s at convergence (default is 1e-6).
+    max_iter : int, optional
+        Maximum number of iterations (default is 100).
+
+    Returns
+    -------
+    tuple
+        A tuple containing:
+        - flow (ndarray): Flow of each pipe in l/s, 0 for pipes without connection to a source.
+        - pressure_loss (ndarray): Pressure loss between the sources and each node in bar, nan without connection.
+        - iterations (int): Number of iterations, max_iter + 1 if the iteration did not converge.
+    '''
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    length = np.asarray(length, dtype=np.float64)
+    d = np.asarray(di, dtype=np.float64) / 1000
+    demand = np.asarray(demand, dtype=np.float64) / 1000
+    sources = np.unique(np.asarray(sources, dtype=np.int64))
+    n, m = len(demand), len(edges)
+    area = np.pi * d ** 2 / 4
+
+    flow = np.zeros(m)
+    pressure_loss = np.full(n, np.nan)
+    if m == 0 or len(sources) == 0:
+        return flow, pressure_loss, 0
+
+    # Only the components with a source can be supplied
+    incidence = csr_matrix((np.ones(2 * m), (np.concatenate([edges[:, 0], edges[:, 1]]), np.tile(np.arange(m), 2))), shape=(n, m))
+    _, labels = connected_components(incidence @ incidence.T, directed=False)
+    supplied = np.isin(labels, labels[sources])
+    active = supplied[edges[:, 0]]
+    free = supplied.copy()
+    free[sources] = False
+
+    # Incidence matrix of the free nodes, +1 where a pipe leaves a node and -1 where it enters
+    position = np.full(n, -1, dtype=np.int64)
+    position[free] = np.arange(free.sum())
+    pipes = np.flatnonzero(active)
+    rows = np.concatenate([position[edges[pipes, 0]], position[edges[pipes, 1]]])
+    cols = np.tile(np.arange(len(pipes)), 2)
+    signs = np.repeat([1.0, -1.0], len(pipes))
+    keep = rows >= 0
+    B = csr_matrix((signs[keep], (rows[keep], cols[keep])), shape=(free.sum(), len(pipes)))
+    injection = -demand[free]
+
+    # Resistance factor of the pipes, dp = R(Q) * Q * |Q|
+    temps = np.atleast_1d(np.asarray(temp, dtype=np.float64))
+    factor = sum(density(t) for t in temps) * length[pipes] / (2 * d[pipes] * area[pipes] ** 2)
+    q_min = area[pipes] * 1e-3
+
+    def resistance(q):
+        velocity = np.maximum(np.abs(q), q_min) / area[pipes]
+        friction = sum(
+            density(t) * friction_factor(velocity * d[pipes] / kinematic_viscosity(t), roughness / 1000 / d[pipes])
+            for t in temps
+        ) / sum(density(t) for t in temps)
+        return friction * factor
+
+    # Start with 1 m/s in every pipe
+    q = area[pipes].copy()
+    pressure = np.zeros(free.sum())
+    for iteration in range(1, max_iter + 2):
+        if iteration > max_iter:
+            print(f'The hydraulic calculation did not converge after {max_iter} iterations.')
+            break
+        R = resistance(q)
+        dp = R * q * np.abs(q)
+        conductance = 1 / (2 * R * np.maximum(np.abs(q), q_min))
+
+        # Pressures of the free nodes, the sources are at pressure 0
+        system = (B @ diags(conductance) @ B.T).tocsc()
+        rhs = injection - B @ q + B @ (conductance * dp)
+        pressure = np.atleast_1d(spsolve(system, rhs)) if system.shape[0] > 0 else pressure
+        q_new = q + conductance * (B.T @ pressure - dp)
+
+        change = np.max(np.abs(q_new - q))
+        q = q_new
+        if change * 1000 < tol:
+            break
+
+    flow[pipes] = q * 1000
+    pressure_loss[sources] = 0
+    pressure_loss[free] = -pressure / 1e5
+    return flow, pressure_loss, iteration
@@ -0,0 +1,786 @@
+import hashlib
+import heapq
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from scipy.sparse import coo_matrix, csr_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from .net_analysis import Graph, Net, PipeCatalog, StreetSegmentIndex, size_pipes
+from .street_graph import StreetGraph, subtree_sums
+
+def input_hash(streets, buildings, sources, tolerance=0.001):
+    '''
+    Hashes the geometries a street graph is built from, so that a saved graph can be checked against the current layers.
+
+    Parameters
+    ----------
+    streets : GeoDataFrame
+        All street geometries.
+    buildings : GeoDataFrame
+        All buildings with the column 'centroid'.
+    sources : GeoDataFrame
+        The energy sources.
+    tolerance : float, optional
+        Distance up to which vertices are merged into one node (default is 0.001).
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-1 digest of the indices, geometries, crs and tolerance.
+    '''
+    digest = hashlib.sha1()
+    digest.update(str(buildings.crs).encode())
+    digest.update(np.float64(tolerance).tobytes())
+    for gdf, column in ((streets, 'geometry'), (buildings, 'centroid'), (sources, 'geometry')):
+        digest.update(np.int64(len(gdf)).tobytes())
+        digest.update(pd.util.hash_pandas_object(gdf.index, index=False).to_numpy().tobytes())
+        digest.update(b''.join(wkb or b'' for wkb in shapely.to_wkb(np.asarray(gdf[column].values))))
+    return digest.hexdigest()
+
+class IncrementalNet:
+    '''
+    A heat network which keeps its street graph and shortest path tree between calculations, so that switching single
+    buildings or streets on and off only updates the affected parts of the network.
+
+    All streets and buildings are passed once, the masks street_active and building_active select the possible routes
+    and the connected buildings. Buildings are snapped to the closest active street edge when they are switched on,
+    streets which are switched off invalidate the subtrees below their edges, which are then repaired with a Dijkstra
+    run over the invalidated nodes only. Power and building count are re-accumulated and the pipes are sized again only
+    along the root paths of changed nodes. The prepared street graph can be saved to an .npz file, which is loaded
+    instead of snapping all buildings again as long as the geometries are unchanged.
+
+    Attributes
+    ----------
+    graph : Graph
+        The street network graph with the array backend.
+    streets : GeoDataFrame
+        All streets, including streets which are not possible routes.
+    buildings : GeoDataFrame
+        All buildings with the column 'centroid'.
+    sources : GeoDataFrame
+        The energy sources.
+    street_active : ndarray
+        Boolean mask of the streets which are possible routes.
+    building_active : ndarray
+        Boolean mask of the buildings which are connected to the net.
+    power : ndarray
+        Power of each building in kW.
+    building_node, building_point : ndarray
+        Node of the centroid and of the connection point of each building, -1 if the building is not snapped yet.
+    building_street : ndarray
+        Street of the connection point of each building, -1 if the building is not snapped yet.
+    source_node, source_point, source_street : ndarray
+        Node, connection point node and street of each source.
+    dist, pred, origin : ndarray
+        Distance to the closest source, predecessor and closest source of each node, see StreetGraph.shortest_path_tree.
+    values : ndarray
+        Power and number of active buildings at each node with shape (n, 2).
+    sums : ndarray
+        Power and number of buildings in the subtree of each node with shape (n, 2).
+    edge_data : dict
+        Results of size_pipes for the tree edge from the predecessor to each node.
+    htemp : float
+        Supply temperature.
+    ltemp : float
+        Return temperature.
+    catalog : PipeCatalog
+        The compiled pipe information.
+    crs : string
+        coordinate reference system
+
+    Methods
+    -------
+    matches(streets, buildings, sources):
+        Checks whether the net was built from the same geometries.
+    save(path):
+        Saves the street graph and the connections of buildings and sources.
+    update(street_active=None, building_active=None, power=None):
+        Applies changed masks and powers to the network.
+    unreachable():
+        Returns the active buildings which are not connected to any source.
+    to_net():
+        Converts the current tree to a Net.
+    check():
+        Compares the network with a network which is built again from the current masks.
+    '''
+
+    def __init__(self, streets, buildings, sources, power, pipe_info, htemp, ltemp, street_active=None, building_active=None, tolerance=0.001, cache=None):
+        '''
+        Builds the street graph, connects the active buildings and sources and calculates the network.
+
+        Parameters
+        ----------
+        streets : GeoDataFrame
+            All street geometries.
+        buildings : GeoDataFrame
+            All buildings with the column 'centroid'.
+        sources : GeoDataFrame
+            The energy sources.
+        power : array_like
+            Power of each building in kW.
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+        htemp : float
+            Supply temperature.
+        ltemp : float
+            Return temperature.
+        street_active : array_like, optional
+            Boolean mask of the streets which are possible routes (default is None, all streets).
+        building_active : array_like, optional
+            Boolean mask of the buildings which are connected (default is None, all buildings).
+        tolerance : float, optional
+            Distance up to which vertices are merged into one node (default is 0.001).
+        cache : str or Path, optional
+            Path of an .npz file with the prepared street graph (default is None, no cache). A graph saved from the same
+            geometries is loaded instead of being built, otherwise the file is written after building.
+        '''
+        self.streets = streets
+        self.buildings = buildings
+        self.sources = sources
+        self.htemp = htemp
+        self.ltemp = ltemp
+        self.crs = buildings.crs
+        self.catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+
+        self.street_active = self._mask(street_active, len(streets))
+        self.building_active = self._mask(building_active, len(buildings))
+        self.power = np.asarray(power, dtype=np.float64).copy()
+
+        self.building_node = np.full(len(buildings), -1, dtype=np.int64)
+        self.building_point = np.full(len(buildings), -1, dtype=np.int64)
+        self.building_street = np.full(len(buildings), -1, dtype=np.int64)
+        self.source_node = np.full(len(sources), -1, dtype=np.int64)
+        self.source_point = np.full(len(sources), -1, dtype=np.int64)
+        self.source_street = np.full(len(sources), -1, dtype=np.int64)
+
+        self.dist = np.empty(0)
+        self.pred = np.empty(0, dtype=np.int64)
+        self.origin = np.empty(0, dtype=np.int64)
+        self.values = np.empty((0, 2))
+        self.sums = np.empty((0, 2))
+        self.edge_data = {}
+        self._invalid_roots = []
+        self._key = None
+
+        # Street graph with the connections of all active buildings and sources, restored from the cache if possible
+        self.graph = Graph(crs=self.crs, backend='array', tolerance=tolerance)
+        street_active, building_active = self.street_active, self.building_active
+        loaded = cache is not None and self._load(cache)
+        if not loaded:
+            self.graph.create_street_network(streets[self.street_active])
+            self._connect(np.flatnonzero(self.building_active), np.arange(len(sources)))
+        self._resize()
+
+        # Full shortest path tree and subtree sums, calculated without the inner nodes of street chains
+        G = self.graph.graph
+        sources_connected = self.source_node[self.source_node >= 0]
+        reduced = G.contract(np.concatenate([sources_connected, self.building_node[self.building_node >= 0]]))
+        if len(sources_connected) > 0:
+            dist, pred, origin = reduced.shortest_path_tree(sources_connected)
+            self.dist, self.pred, self.origin = dist, pred.astype(np.int64), origin.astype(np.int64)
+        self._invalid_roots = []
+
+        self.values = self._node_values()
+        self.sums = reduced.subtree_sums(self.pred, self.values)
+        self._size(np.arange(G.n_nodes))
+
+        # The cached graph may have been saved with other routes and buildings
+        changed = not (loaded and np.array_equal(street_active, self.street_active) and np.array_equal(building_active, self.building_active))
+        if loaded and changed:
+            self.update(street_active, building_active)
+        if cache is not None and changed:
+            self.save(cache)
+
+    @staticmethod
+    def _mask(mask, n):
+        '''
+        Returns a copy of a boolean mask, all True if the mask is None.
+        '''
+        if mask is None:
+            return np.ones(n, dtype=bool)
+        return np.asarray(mask, dtype=bool).copy()
+
+    def matches(self, streets, buildings, sources):
+        '''
+        Checks whether the net was built from the same geometries, so that it can be updated instead of rebuilt.
+
+        Parameters
+        ----------
+        streets : GeoDataFrame
+            All street geometries.
+        buildings : GeoDataFrame
+            All buildings.
+        sources : GeoDataFrame
+            The energy sources.
+
+        Returns
+        -------
+        bool
+            True if the indices and coordinates of all geometries are unchanged.
+        '''
+        for old, new in ((self.streets, streets), (self.buildings, buildings), (self.sources, sources)):
+            if not old.index.equals(new.index):
+                return False
+            if not np.array_equal(shapely.get_coordinates(old.geometry.values), shapely.get_coordinates(new.geometry.values)):
+                return False
+        return True
+
+    def save(self, path):
+        '''
+        Saves the street graph, the masks and the connections of buildings and sources to an .npz file. The file is
+        keyed by input_hash and can be loaded with the cache parameter of IncrementalNet.
+
+        Parameters
+        ----------
+        path : str or Path
+            Path of the .npz file.
+        '''
+        arrays = self.graph.graph.to_arrays()
+        with open(path, 'wb') as file:
+            np.savez(
+                file,
+                key=np.array(self._input_key()),
+                street_active=self.street_active,
+                building_active=self.building_active,
+                building_node=self.building_node,
+                building_point=self.building_point,
+                building_street=self.building_street,
+                source_node=self.source_node,
+                source_point=self.source_point,
+                source_street=self.source_street,
+                **arrays
+            )
+
+    def _input_key(self):
+        '''
+        Returns the input_hash of the geometries of the net.
+        '''
+        if self._key is None:
+            self._key = input_hash(self.streets, self.buildings, self.sources, self.graph.node_index.tolerance)
+        return self._key
+
+    def _load(self, path):
+        '''
+        Restores the street graph, the masks and the connections from an .npz file written by save.
+
+        Returns
+        -------
+        bool
+            True if the file exists and was saved from the same geometries, otherwise the net is left unchanged.
+        '''
+        if not os.path.exists(path):
+            return False
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                if str(data['key']) != self._input_key():
+                    return False
+                arrays = {name: data[name] for name in data.files}
+        except (OSError, ValueError, KeyError) as e:
+            print(f'The cached graph {path} could not be read: {e}')
+            return False
+
+        self.graph.graph = StreetGraph.from_arrays(arrays, crs=self.crs)
+        self.graph.node_index = self.graph.graph.node_index
+        self.street_active = arrays['street_active']
+        self.building_active = arrays['building_active']
+        for name in ('building_node', 'building_point', 'building_street', 'source_node', 'source_point', 'source_street'):
+            setattr(self, name, arrays[name].astype(np.int64))
+        return True
+
+    def update(self, street_active=None, building_active=None, power=None):
+        '''
+        Applies changed masks and powers to the network.
+
+        Parameters
+        ----------
+        street_active : array_like, optional
+            New boolean mask of the streets which are possible routes (default is None, unchanged).
+        building_active : array_like, optional
+            New boolean mask of the connected buildings (default is None, unchanged).
+        power : array_like, optional
+            New power of each building in kW (default is None, unchanged).
+        '''
+        G = self.graph.graph
+        old_pred = self.pred.copy()
+
+        street_active = self.street_active if street_active is None else self._mask(street_active, len(self.streets))
+        street_ids = self.streets.index.to_numpy()
+        turned_off = street_ids[self.street_active & ~street_active]
+        turned_on = np.flatnonzero(~self.street_active & street_active)
+
+        # Buildings and sources on removed streets have to be snapped again
+        building_snapped = self.building_node >= 0
+        reconnect_buildings = building_snapped & np.isin(self.building_street, turned_off)
+        reconnect_sources = np.isin(self.source_street, turned_off)
+
+        # Buildings and sources which are closer to a new street than to their current connection point
+        if len(turned_on) > 0:
+            new_streets = StreetSegmentIndex(self.streets.iloc[turned_on])
+            for snapped, node, point, reconnect in (
+                (building_snapped, self.building_node, self.building_point, reconnect_buildings),
+                (self.source_node >= 0, self.source_node, self.source_point, reconnect_sources)
+            ):
+                ids = np.flatnonzero(snapped)
+                if len(ids) == 0:
+                    continue
+                xy = G.coords[node[ids]]
+                segment, closest, distance = new_streets.nearest(shapely.points(xy))
+                current = np.hypot(*(xy - G.coords[point[ids]]).T)
+                reconnect[ids[distance < current]] = True
+
+        # Buildings which are switched off lose their connection, like in a net built without them
+        if building_active is not None:
+            self.building_active = self._mask(building_active, len(self.buildings))
+        reconnect_buildings |= building_snapped & ~self.building_active
+
+        # Remove the old connections, house connections shared with a remaining building are kept
+        points = np.concatenate([self.building_point[reconnect_buildings], self.source_point[reconnect_sources]])
+        staying = building_snapped & ~reconnect_buildings
+        house = reconnect_buildings & ~np.isin(self.building_node, self.building_node[staying])
+        self._remove(G.edge_index(self.building_node[house], self.building_point[house]))
+        self._remove(G.edge_index(self.source_node[reconnect_sources], self.source_point[reconnect_sources]))
+        for node, point, street, reconnect in (
+            (self.building_node, self.building_point, self.building_street, reconnect_buildings),
+            (self.source_node, self.source_point, self.source_street, reconnect_sources)
+        ):
+            node[reconnect] = -1
+            point[reconnect] = -1
+            street[reconnect] = -1
+
+        # Join the street edges at connection points without connection, then remove the streets which are switched off
+        self._merge(points)
+        self._remove(np.flatnonzero(np.isin(G.street_id, turned_off)))
+
+        # Add the new streets and connect buildings and sources which are not snapped
+        if len(turned_on) > 0:
+            self.graph.create_street_network(self.streets.iloc[turned_on])
+        self.street_active = street_active
+        if power is not None:
+            self.power = np.asarray(power, dtype=np.float64).copy()
+        n_old = len(self.pred)
+        self._connect(np.flatnonzero(self.building_active & (self.building_node < 0)), np.flatnonzero(self.source_node < 0))
+        self._resize()
+
+        # Repair the subtrees below removed edges and the new nodes, then propagate shorter distances from new edges
+        invalid = self._descendants(np.concatenate(self._invalid_roots + [np.empty(0, dtype=np.int64)]))
+        invalid[n_old:] = True
+        self._invalid_roots = []
+        self._repair(invalid)
+        self._relax()
+
+        # Re-accumulate along the root paths of all nodes with a new predecessor or new values
+        values = self._node_values()
+        old_pred = np.concatenate([old_pred, np.full(len(self.pred) - len(old_pred), -1, dtype=np.int64)])
+        changed = np.flatnonzero((self.pred != old_pred) | (values != self.values).any(axis=1))
+        self.values = values
+        self._size(self._accumulate(changed, old_pred))
+
+    def unreachable(self):
+        '''
+        Returns the active buildings which are not connected to any source.
+
+        Returns
+        -------
+        ndarray
+            Positions of the buildings in the buildings GeoDataFrame.
+        '''
+        node = self.building_node
+        reachable = node >= 0
+        reachable[reachable] = np.isfinite(self.dist[node[reachable]])
+        return np.flatnonzero(self.building_active & ~reachable)
+
+    def to_net(self):
+        '''
+        Converts the current tree to a Net with the same edge attributes as Net.network_analysis.
+
+        Returns
+        -------
+        Net
+            The network with all tree edges which lead to at least one active building.
+        '''
+        G = self.graph.graph
+        net = Net(self.htemp, self.ltemp, crs=self.crs)
+
+        child = np.flatnonzero((self.sums[:, 1] > 0) & (self.pred >= 0))
+        parent = self.pred[child]
+        edge = G.edge_index(parent, child)
+
+        columns = {
+            'type': G.edge_type[edge],
+            'length [m]': G.length[edge],
+            'power [kW]': self.sums[child, 0],
+            'n_building': self.sums[child, 1].astype(np.int64)
+        }
+        if len(self.sources) > 1:
+            # Position of the closest source in the sources GeoDataFrame
+            source_position = np.full(G.n_nodes, -1, dtype=np.int64)
+            snapped = self.source_node >= 0
+            source_position[self.source_node[snapped]] = np.flatnonzero(snapped)
+            columns['source_id'] = source_position[self.origin[child]]
+        for name, values in self.edge_data.items():
+            columns[name] = values[child]
+
+        net.edges.append(G.coords[parent], G.coords[child], columns)
+        return net
+
+    def check(self):
+        '''
+        Compares the network with a network which is built again from the current masks and powers, so that a
+        sequence of updates can be checked against a fresh calculation.
+
+        Only values which do not depend on the choice between routes of equal length are compared: the street graph
+        with all connections, the distance of every active building to its source and the total power and number of
+        buildings at the sources. The trees themselves can differ, e.g. on a regular street grid.
+
+        Returns
+        -------
+        bool
+            True if both networks agree.
+        '''
+        fresh = IncrementalNet(
+            self.streets, self.buildings, self.sources, self.power, self.catalog, self.htemp, self.ltemp,
+            self.street_active, self.building_active, self.graph.graph.node_index.tolerance
+        )
+        graphs, distances, totals = [], [], []
+        for net in (self, fresh):
+            arrays = net.graph.graph.to_arrays()
+            # Edges with sorted end points in sorted order
+            coords = arrays['coords'][arrays['edges']]
+            swap = (coords[:, 0, 0] > coords[:, 1, 0]) | ((coords[:, 0, 0] == coords[:, 1, 0]) & (coords[:, 0, 1] > coords[:, 1, 1]))
+            coords[swap] = coords[swap, ::-1]
+            order = np.lexsort(coords.reshape(-1, 4).T[::-1])
+            graphs.append((coords[order], arrays['length'][order]))
+
+            node = net.building_node[net.building_active]
+            distance = np.full(len(node), np.inf)
+            distance[node >= 0] = net.dist[node[node >= 0]]
+            distances.append(distance)
+            source = net.source_node[net.source_node >= 0]
+            totals.append(net.sums[source].sum(axis=0))
+
+        (coords, length), (fresh_coords, fresh_length) = graphs
+        if coords.shape != fresh_coords.shape or not (np.allclose(coords, fresh_coords) and np.allclose(length, fresh_length)):
+            return False
+        return np.allclose(distances[0], distances[1]) and np.allclose(totals[0], totals[1])
+
+    def _connect(self, building_ids, source_ids):
+        '''
+        Snaps buildings and sources to the closest active street edge and adds their connections to the graph.
+        '''
+        G = self.graph.graph
+        xy = np.concatenate([
+            shapely.get_coordinates(self.buildings['centroid'].values[building_ids]),
+            shapely.get_coordinates(self.sources.geometry.values[source_ids])
+        ]).reshape(-1, 2)
+        n_buildings = len(building_ids)
+        if len(xy) == 0:
+            return
+
+        G.n_edges  # removes duplicate edges, so the edge ids below stay valid
+        street_edges = np.flatnonzero(G.street_id >= 0)
+        if len(street_edges) == 0:
+            print('No street to connect buildings and sources to.')
+            return
+
+        # Closest street edge of every point, the index of the segments are the edge ids
+        segments = gpd.GeoDataFrame(geometry=shapely.linestrings(G.coords[G.edges[street_edges]]), index=street_edges)
+        segment_index = StreetSegmentIndex(segments)
+        segment, closest, distance = segment_index.nearest(shapely.points(xy))
+        edge = segment_index.street_id[segment]
+        street = G.street_id[edge]
+
+        self._split(edge, closest)
+        edge_type = np.array(['Hausanschluss'] * n_buildings + ['Quellenanschluss'] * (len(xy) - n_buildings), dtype=object)
+        G.add_edges(xy, closest, edge_type)
+
+        node = G.node_ids(xy)
+        point = G.node_ids(closest)
+        self.building_node[building_ids] = node[:n_buildings]
+        self.building_point[building_ids] = point[:n_buildings]
+        self.building_street[building_ids] = street[:n_buildings]
+        self.source_node[source_ids] = node[n_buildings:]
+        self.source_point[source_ids] = point[n_buildings:]
+        self.source_street[source_ids] = street[n_buildings:]
+
+    def _split(self, edge, points):
+        '''
+        Splits street edges at points on them, several points on one edge are chained along the edge.
+        '''
+        G = self.graph.graph
+        a = G.edges[edge, 0]
+        b = G.edges[edge, 1]
+
+        # Order the points along each edge
+        order = np.lexsort((np.hypot(*(points - G.coords[a]).T), edge))
+        edge, points, a, b = edge[order], points[order], a[order], b[order]
+        first = np.ones(len(edge), dtype=bool)
+        first[1:] = edge[1:] != edge[:-1]
+        last = np.ones(len(edge), dtype=bool)
+        last[:-1] = edge[1:] != edge[:-1]
+
+        previous = np.where(first[:, None], G.coords[a], np.roll(points, 1, axis=0))
+        xy_u = np.concatenate([previous, points[last]])
+        xy_v = np.concatenate([points, G.coords[b[last]]])
+        edge_type = np.concatenate([G.edge_type[edge], G.edge_type[edge[last]]])
+        street = np.concatenate([G.street_id[edge], G.street_id[edge[last]]])
+
+        self._remove(np.unique(edge))
+        G.add_edges(xy_u, xy_v, edge_type, street)
+
+    def _merge(self, points):
+        '''
+        Joins the street edges at connection points which are left without any connection.
+
+        Every chain of such points between two other nodes becomes one edge again, so the graph equals a graph which
+        was built without the connections. Points which are vertices of a street geometry are kept, as well as chains
+        over several streets.
+        '''
+        G = self.graph.graph
+        points = np.unique(np.asarray(points, dtype=np.int64))
+        points = points[points >= 0]
+        if len(points) == 0:
+            return
+        points = points[G.degree()[points] == 2]
+        if len(points) > 0:
+            points = points[~np.isin(points, G.node_ids(shapely.get_coordinates(self.streets.geometry.values)))]
+        if len(points) == 0:
+            return
+
+        n = G.n_nodes
+        dead = np.zeros(n, dtype=bool)
+        dead[points] = True
+        u = G.edges[:, 0].astype(np.int64)
+        v = G.edges[:, 1].astype(np.int64)
+        edge_ids = np.flatnonzero(dead[u] | dead[v])
+        u, v = u[edge_ids], v[edge_ids]
+
+        # Every chain is a component of the points, its two ends are the other nodes of its edges
+        inner = dead[u] & dead[v]
+        adjacency = coo_matrix((np.ones(inner.sum()), (u[inner], v[inner])), shape=(n, n))
+        n_components, label = connected_components(adjacency, directed=False)
+        chain = label[np.where(dead[u], u, v)]
+        end = np.where(dead[u], v, u)[~inner]
+        end_chain = chain[~inner]
+        order = np.argsort(end_chain, kind='stable')
+        end, end_chain = end[order], end_chain[order]
+        n_ends = np.bincount(end_chain, minlength=n_components)
+        streets = G.street_id[edge_ids]
+        first_street = np.full(n_components, -1, dtype=np.int64)
+        first_street[chain] = streets
+        one_street = np.ones(n_components, dtype=bool)
+        one_street[chain[streets != first_street[chain]]] = False
+
+        valid = (n_ends == 2) & one_street
+        pairs = end[valid[end_chain]].reshape(-1, 2)
+        keep = pairs[:, 0] != pairs[:, 1]
+        pairs = pairs[keep]
+        if len(pairs) == 0:
+            return
+        chains = np.unique(end_chain[valid[end_chain]])[keep]
+        first_edge = np.full(n_components, -1, dtype=np.int64)
+        first_edge[chain[::-1]] = edge_ids[::-1]
+        first_edge = first_edge[chains]
+
+        edge_type = G.edge_type[first_edge]
+        street = G.street_id[first_edge]
+        self._remove(edge_ids[np.isin(chain, chains)])
+        G.add_edges(G.coords[pairs[:, 0]], G.coords[pairs[:, 1]], edge_type, street)
+
+    def _remove(self, edge_ids):
+        '''
+        Removes edges from the graph and remembers the tree nodes below removed tree edges.
+        '''
+        G = self.graph.graph
+        edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        edge_ids = edge_ids[edge_ids >= 0]
+        if len(edge_ids) == 0:
+            return
+
+        u = G.edges[edge_ids, 0].astype(np.int64)
+        v = G.edges[edge_ids, 1].astype(np.int64)
+        n = len(self.pred)
+        for child, parent in ((v, u), (u, v)):
+            in_tree = child < n
+            child, parent = child[in_tree], parent[in_tree]
+            self._invalid_roots.append(child[self.pred[child] == parent])
+        G.remove_edges(edge_ids)
+
+    def _resize(self):
+        '''
+        Extends the node arrays to the current number of nodes.
+        '''
+        k = self.graph.graph.n_nodes - len(self.dist)
+        if k <= 0:
+            return
+        self.dist = np.concatenate([self.dist, np.full(k, np.inf)])
+        self.pred = np.concatenate([self.pred, np.full(k, -1, dtype=np.int64)])
+        self.origin = np.concatenate([self.origin, np.full(k, -1, dtype=np.int64)])
+        self.values = np.concatenate([self.values, np.zeros((k, 2))])
+        self.sums = np.concatenate([self.sums, np.zeros((k, 2))])
+        for name, values in self.edge_data.items():
+            self.edge_data[name] = np.concatenate([values, np.full(k, None if values.dtype == object else np.nan, dtype=values.dtype)])
+
+    def _node_values(self):
+        '''
+        Sums the power and the number of active buildings per node.
+        '''
+        values = np.zeros((len(self.pred), 2))
+        active = self.building_active & (self.building_node >= 0)
+        np.add.at(values, self.building_node[active], np.column_stack([self.power[active], np.ones(active.sum())]))
+        return values
+
+    def _descendants(self, roots):
+        '''
+        Marks the roots and all nodes below them in the current tree.
+        '''
+        flag = np.zeros(len(self.pred), dtype=bool)
+        flag[roots] = True
+
+        # Pointer jumping, after k steps every node knows the flags of its 2^k closest ancestors
+        ancestor = self.pred.copy()
+        has_ancestor = ancestor >= 0
+        while has_ancestor.any():
+            flag[has_ancestor] |= flag[ancestor[has_ancestor]]
+            ancestor[has_ancestor] = ancestor[ancestor[has_ancestor]]
+            has_ancestor = ancestor >= 0
+        return flag
+
+    def _repair(self, invalid):
+        '''
+        Calculates distances and predecessors of invalid nodes from their valid neighbours.
+
+        The valid nodes keep their distances, so one Dijkstra run on the subgraph of the invalid nodes with an extra
+        entry node, which is connected to every invalid node with its shortest distance over a valid neighbour, yields
+        the new tree.
+        '''
+        invalid[self.source_node[self.source_node >= 0]] = False
+        sub = np.flatnonzero(invalid)
+        if len(sub) == 0:
+            return
+        self.dist[sub] = np.inf
+        self.pred[sub] = -1
+        self.origin[sub] = -1
+
+        adjacency = self.graph.graph.csr.tocoo()
+        rows, cols, weights = adjacency.row, adjacency.col, adjacency.data
+        k = len(sub)
+        position = np.full(len(invalid), -1, dtype=np.int64)
+        position[sub] = np.arange(k)
+
+        # Shortest distance of every invalid node over a valid neighbour
+        boundary = invalid[cols] & ~invalid[rows] & np.isfinite(self.dist[rows])
+        candidate = self.dist[rows[boundary]] + weights[boundary]
+        target = position[cols[boundary]]
+        neighbour = rows[boundary]
+        order = np.lexsort((candidate, target))
+        entries, first = np.unique(target[order], return_index=True)
+        entry_neighbour = np.full(k, -1, dtype=np.int64)
+        entry_neighbour[entries] = neighbour[order][first]
+
+        inner = invalid[rows] & invalid[cols]
+        subgraph = csr_matrix(
+            (np.concatenate([weights[inner], candidate[order][first]]),
+             (np.concatenate([position[rows[inner]], np.full(len(entries), k)]), np.concatenate([position[cols[inner]], entries]))),
+            shape=(k + 1, k + 1)
+        )
+        dist, pred = dijkstra(subgraph, directed=True, indices=k, return_predecessors=True)
+        dist, pred = dist[:k], pred[:k]
+        reached = np.isfinite(dist)
+
+        via_entry = pred == k
+        local_pred = np.where(reached & ~via_entry, pred, -1)
+        self.dist[sub[reached]] = dist[reached]
+        self.pred[sub] = np.where(via_entry, entry_neighbour, np.where(local_pred >= 0, sub[local_pred], -1))
+
+        # Every reached node gets the source of the valid neighbour where its path enters the subgraph
+        root = np.where(via_entry | ~reached, np.arange(k), local_pred)
+        while True:
+            next_root = root[root]
+            if np.array_equal(next_root, root):
+                break
+            root = next_root
+        self.origin[sub[reached]] = self.origin[entry_neighbour[root[reached]]]
+
+    def _relax(self):
+        '''
+        Propagates shorter distances over new edges through the tree.
+        '''
+        csr = self.graph.graph.csr
+        adjacency = csr.tocoo()
+        rows, cols, weights = adjacency.row, adjacency.col, adjacency.data
+        candidate = self.dist[rows] + weights
+        improved = candidate < self.dist[cols] - 1e-9
+        if not improved.any():
+            return
+
+        heap = list(zip(candidate[improved].tolist(), cols[improved].tolist(), rows[improved].tolist()))
+        heapq.heapify(heap)
+        indptr, indices, data = csr.indptr, csr.indices, csr.data
+        while heap:
+            d, node, parent = heapq.heappop(heap)
+            if d >= self.dist[node] - 1e-9:
+                continue
+            self.dist[node] = d
+            self.pred[node] = parent
+            self.origin[node] = self.origin[parent]
+            for j in range(indptr[node], indptr[node + 1]):
+                neighbour = indices[j]
+                if d + data[j] < self.dist[neighbour] - 1e-9:
+                    heapq.heappush(heap, (d + data[j], int(neighbour), node))
+
+    def _accumulate(self, changed, old_pred):
+        '''
+        Updates the subtree sums of the changed nodes and of all their old and new ancestors.
+
+        Returns
+        -------
+        ndarray
+            The nodes with updated sums.
+        '''
+        n = len(self.pred)
+        affected = np.zeros(n, dtype=bool)
+        for pred in (old_pred, self.pred):
+            visited = np.zeros(n, dtype=bool)
+            frontier = np.unique(changed)
+            while len(frontier) > 0:
+                frontier = frontier[~visited[frontier]]
+                visited[frontier] = True
+                frontier = pred[frontier]
+                frontier = frontier[frontier >= 0]
+            affected |= visited
+
+        nodes = np.flatnonzero(affected)
+        if len(nodes) == 0:
+            return nodes
+        position = np.full(n, -1, dtype=np.int64)
+        position[nodes] = np.arange(len(nodes))
+
+        # Children outside the affected nodes keep their sums
+        values = self.values[nodes].copy()
+        outside = np.flatnonzero(~affected & (self.pred >= 0))
+        outside = outside[affected[self.pred[outside]]]
+        np.add.at(values, position[self.pred[outside]], self.sums[outside])
+
+        parent = self.pred[nodes]
+        self.sums[nodes] = subtree_sums(np.where(parent >= 0, position[parent], -1), values)
+        return nodes
+
+    def _size(self, nodes):
+        '''
+        Sizes the tree edges from the predecessors to the given nodes.
+        '''
+        G = self.graph.graph
+        nodes = nodes[(self.pred[nodes] >= 0) & (self.sums[nodes, 1] > 0)]
+        if len(nodes) == 0:
+            return
+
+        edge = G.edge_index(self.pred[nodes], nodes)
+        attributes = size_pipes(self.sums[nodes, 1], self.sums[nodes, 0], G.length[edge], G.edge_type[edge], self.htemp, self.ltemp, self.catalog)
+        for name, values in attributes.items():
+            if name not in self.edge_data:
+                self.edge_data[name] = np.full(len(self.pred), None if values.dtype == object else np.nan, dtype=values.dtype)
+            self.edge_data[name][nodes] = values
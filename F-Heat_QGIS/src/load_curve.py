@@ -252,7 +252,7 @@ class LoadProfile:
         Creates a DataFrame for collecting generated profiles with the specified resolution and frequency.
     sort_columns_by_sum(df):
         Sorts the columns of a dataframe in ascending order based on their sum and returns the sorted dataframe.
-    add_loss(demand_df, df, resolution=8760):
+    add_loss(demand_df, df, resolution=8760, hourly_loss=None, hourly_loss_extra=None):
         Adds a loss column to the demand dataframe based on the maximum annual loss in another dataframe.
     add_sum_buildings(df):
         Adds a column for the sum of all building types in a dataframe and returns the modified dataframe.
@@ -366,10 +366,12 @@ class LoadProfile:
         return sorted_df
     
     @staticmethod
-    def add_loss(demand_df, df, resolution = 8760):
+    def add_loss(demand_df, df, resolution = 8760, hourly_loss = None, hourly_loss_extra = None):
         '''
         Adds a loss column to the demand dataframe based on the maximum annual loss in another dataframe.
 
+        Without hourly losses the annual loss is spread evenly over the year.
+
         Parameters
         ----------
         demand_df : pd.DataFrame
@@ -378,18 +380,22 @@ class LoadProfile:
             The dataframe containing loss information.
         resolution : int, optional
             The time resolution in hours (default is 8760 for an hourly resolution over a year).
+        hourly_loss : array_like, optional
+            The loss of every hour in MW, e.g. from Net.thermal_simulation (default is None).
+        hourly_loss_extra : array_like, optional
+            The loss of every hour in MW with extra insulation (default is None).
 
         Returns
         -------
         pd.DataFrame
             The modified demand dataframe with the added loss column.
         '''
-        loss_sum = df['Verlust [MWh/a]'].max()
-        loss_extra_sum = df['Verlust bei extra Daemmung [MWh/a]'].max() # extra insulation
-        loss_hourly = loss_sum/resolution
-        loss_extra_hourly = loss_extra_sum/resolution
-        demand_df['Verlust'] = loss_hourly
-        demand_df['Verlust bei extra Dämmung'] = loss_extra_hourly
+        if hourly_loss is None:
+            hourly_loss = df['Verlust [MWh/a]'].max()/resolution
+        if hourly_loss_extra is None:
+            hourly_loss_extra = df['Verlust bei extra Daemmung [MWh/a]'].max()/resolution # extra insulation
+        demand_df['Verlust'] = hourly_loss
+        demand_df['Verlust bei extra Dämmung'] = hourly_loss_extra
         return demand_df
     
     @staticmethod
@@ -2,11 +2,24 @@ import geopandas as gpd
 import pandas as pd
 import numpy as np
 from shapely.geometry import Point, LineString
+import shapely
 import networkx as nx
-import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
 from openpyxl import load_workbook
 import sys
 import os
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components, dijkstra
+
+from .street_graph import NodeIndex, StreetGraph, path_sums, subtree_sums
+from .hydraulics import critical_path, pressure_gradient, solve_network
+from . import water_properties
+from .pipe_sizing import monotone_sizes
+from .thermal import simulate_tree
+from .edge_table import EdgeTable
 
 def get_closest_point(line, point):
     '''
@@ -53,27 +66,19 @@ def calculate_volumeflow(kW_GLF, htemp, ltemp):
 
     Parameters
     ----------
-    kW_GLF : float
+    kW_GLF : float or array_like
         Power with simultaneity factor applied.
-    htemp : float
+    htemp : float or array_like
         Supply temperature.
-    ltemp : float
+    ltemp : float or array_like
         Return temperature.
 
     Returns
     -------
-    float
-        Volumetric flow rate in liters per second.
+    float or ndarray
+        Volumetric flow rate in liters per second, see water_properties.volumeflow.
     '''
-    #piecewise linear interpolation
-    t = [0, 10, 20, 30, 40, 50, 60, 70, 80 , 90, 100] 
-    d = [0.99984, 0.9997, 0.99821, 0.99565, 0.99222, 0.98803, 0.9832, 0.97778, 0.97182, 0.96535, 0.9584]
-    c = [4.2176, 4.1921, 4.1818, 4.1784, 4.1785, 4.1806, 4.1843, 4.1895, 4.1963, 4.205, 4.2159]
-    density = np.interp(int(htemp), t, d)
-    cp = np.interp(int(htemp), t, c)
-
-    volumeflow = kW_GLF / (density * cp * (int(htemp) - int(ltemp))) # liter/s
-    return volumeflow
+    return water_properties.volumeflow(kW_GLF, htemp, ltemp) # liter/s
 
 def calculate_diameter_velocity_loss(volumeflow, htemp, ltemp, length, pipe_info, edge_type):
     '''
@@ -133,6 +138,513 @@ def calculate_diameter_velocity_loss(volumeflow, htemp, ltemp, length, pipe_info
     loss_extra = 8760 * 2 * (u_plus * K * length) / 1000
     return DN, velocity, loss, loss_extra
 
+class PipeCatalog:
+    '''
+    The pipe information compiled into numpy arrays for sizing many pipes at once.
+
+    Attributes
+    ----------
+    dn : ndarray
+        Nominal diameter of each pipe type.
+    di : ndarray
+        Inner diameter in mm.
+    u : ndarray
+        U-Value with standard insulation.
+    u_plus : ndarray
+        U-Value with extra insulation.
+    max_volumeflow : ndarray
+        Maximum volume flow in l/s.
+    min_index : int
+        Index of the smallest pipe type for edges that are not house connections.
+
+    Methods
+    -------
+    select(volumeflow, house_connection):
+        Returns the index of the smallest suitable pipe type for each volume flow.
+    '''
+
+    def __init__(self, pipe_info, min_index=2):
+        '''
+        Initializes the PipeCatalog from the pipe information.
+
+        Parameters
+        ----------
+        pipe_info : DataFrame
+            DataFrame containing pipeline information with columns 'DN', 'di', 'U-Value', 'U-Value_extra_insulation' and
+            'max_volumeFlow'.
+        min_index : int, optional
+            Index of the smallest pipe type for edges that are not house connections (default is 2, i.e. DN 32).
+        '''
+        self.dn = pipe_info['DN'].to_numpy()
+        self.di = pipe_info['di'].to_numpy(dtype=float)
+        self.u = pipe_info['U-Value'].to_numpy(dtype=float)
+        self.u_plus = pipe_info['U-Value_extra_insulation'].to_numpy(dtype=float)
+        self.max_volumeflow = pipe_info['max_volumeFlow'].to_numpy(dtype=float)
+        self.min_index = min_index
+
+    def select(self, volumeflow, house_connection):
+        '''
+        Returns the index of the smallest suitable pipe type for each volume flow.
+
+        Parameters
+        ----------
+        volumeflow : ndarray
+            Volume flow of each edge in l/s.
+        house_connection : ndarray
+            Boolean mask of the house connections, which may use all pipe types.
+
+        Returns
+        -------
+        ndarray
+            Index of the pipe type of each edge. If the volume flow is too high the largest pipe type is taken.
+        '''
+        volumeflow = np.asarray(volumeflow, dtype=float)
+        idx = np.searchsorted(self.max_volumeflow[self.min_index:], volumeflow, side='right') + self.min_index
+        idx_house = np.searchsorted(self.max_volumeflow, volumeflow, side='right')
+        idx = np.where(house_connection, idx_house, idx)
+        return np.minimum(idx, len(self.max_volumeflow) - 1)
+
+def size_pipes(n_building, power, length, edge_type, htemp, ltemp, catalog, idx=None):
+    '''
+    Calculate GLF, volume flow, diameter, velocity and losses of many pipes at once.
+
+    Parameters
+    ----------
+    n_building : ndarray
+        Number of buildings supplied by each edge.
+    power : ndarray
+        Power of each edge in kW.
+    length : ndarray
+        Length of each edge in m.
+    edge_type : ndarray
+        Type of each edge e.g. 'Hausanschluss'.
+    htemp : float
+        Supply temperature.
+    ltemp : float
+        Return temperature.
+    catalog : PipeCatalog
+        The compiled pipe information.
+    idx : ndarray, optional
+        Index of the pipe type of each edge in the catalog (default is None, the smallest suitable type, see
+        PipeCatalog.select).
+
+    Returns
+    -------
+    dict
+        Arrays of the edge attributes 'GLF', 'power_GLF [kW]', 'Volumeflow [l/s]', 'DN [mm]', 'velocity [m/s]',
+        'loss [kWh/a]' and 'loss_extra_insulation [kWh/a]'.
+    '''
+    n_building = np.asarray(n_building, dtype=float)
+    length = np.asarray(length, dtype=float)
+
+    GLF = calculate_GLF(n_building)
+    power_GLF = np.asarray(power, dtype=float) * GLF
+    volumeflow = calculate_volumeflow(power_GLF, htemp, ltemp)
+
+    if idx is None:
+        idx = catalog.select(volumeflow, np.asarray(edge_type) == 'Hausanschluss')
+
+    # calculate velocity and loss, see calculate_diameter_velocity_loss
+    K = (htemp + ltemp) / 2 - 10
+    r = catalog.di[idx] / 2
+    velocity = volumeflow * 1000 / (np.pi * r ** 2)
+    loss = 8760 * 2 * (catalog.u[idx] * K * length) / 1000
+    loss_extra = 8760 * 2 * (catalog.u_plus[idx] * K * length) / 1000
+
+    return {
+        'GLF': GLF,
+        'power_GLF [kW]': power_GLF,
+        'Volumeflow [l/s]': volumeflow,
+        'DN [mm]': catalog.dn[idx],
+        'velocity [m/s]': velocity,
+        'loss [kWh/a]': loss,
+        'loss_extra_insulation [kWh/a]': loss_extra
+    }
+
+def size_scenarios(n_building, power, length, edge_type, temperatures, catalog):
+    '''
+    Calculate volume flow, diameter, velocity and losses of many pipes for several temperature scenarios at once.
+
+    The routing, power and simultaneity factor do not depend on the temperatures, so every scenario only scales the
+    volume flow and the temperature difference to the ground. The results are matrices with one row per edge and one
+    column per scenario.
+
+    Parameters
+    ----------
+    n_building : ndarray
+        Number of buildings supplied by each edge.
+    power : ndarray
+        Power of each edge in kW.
+    length : ndarray
+        Length of each edge in m.
+    edge_type : ndarray
+        Type of each edge e.g. 'Hausanschluss'.
+    temperatures : list of tuple
+        Supply and return temperature of each scenario, e.g. [(90, 60), (80, 50), (70, 40)].
+    catalog : PipeCatalog
+        The compiled pipe information.
+
+    Returns
+    -------
+    dict
+        Arrays of shape (edges, scenarios) of the edge attributes 'Volumeflow [l/s]', 'DN [mm]', 'velocity [m/s]',
+        'loss [kWh/a]' and 'loss_extra_insulation [kWh/a]', see size_pipes.
+    '''
+    htemp, ltemp = np.asarray(temperatures, dtype=float).reshape(-1, 2).T
+    length = np.asarray(length, dtype=float)[:, None]
+    power_GLF = np.asarray(power, dtype=float) * calculate_GLF(np.asarray(n_building, dtype=float))
+
+    # The volume flow is proportional to the power, so one factor per scenario is enough
+    flow_per_kW = calculate_volumeflow(1.0, htemp, ltemp)
+    volumeflow = power_GLF[:, None] * flow_per_kW[None, :]
+
+    idx = catalog.select(volumeflow, (np.asarray(edge_type) == 'Hausanschluss')[:, None])
+
+    K = (htemp + ltemp)[None, :] / 2 - 10
+    r = catalog.di[idx] / 2
+    return {
+        'Volumeflow [l/s]': volumeflow,
+        'DN [mm]': catalog.dn[idx],
+        'velocity [m/s]': volumeflow * 1000 / (np.pi * r ** 2),
+        'loss [kWh/a]': 8760 * 2 * (catalog.u[idx] * K * length) / 1000,
+        'loss_extra_insulation [kWh/a]': 8760 * 2 * (catalog.u_plus[idx] * K * length) / 1000
+    }
+
+def scenario_name(htemp, ltemp):
+    '''
+    Returns the suffix of a temperature scenario, e.g. '90/60'.
+    '''
+    return f'{htemp:g}/{ltemp:g}'
+
+# Edge attributes of a calculated net
+NET_ATTRIBUTES = (
+    'type', 'length [m]', 'power [kW]', 'n_building', 'source_id', 'GLF', 'power_GLF [kW]', 'Volumeflow [l/s]',
+    'DN [mm]', 'velocity [m/s]', 'loss [kWh/a]', 'loss_extra_insulation [kWh/a]', 'pressure_gradient [Pa/m]',
+    'pressure_loss [bar]', 'critical_path', 'loop_flow [l/s]', 'loop_velocity [m/s]', 'loop_loss [bar]',
+    'min_supply_temp [°C]'
+)
+
+def restore_field_names(gdf, names=NET_ATTRIBUTES):
+    '''
+    Renames the columns which were cut to 10 characters in a shapefile back to the full attribute names.
+
+    Parameters
+    ----------
+    gdf : GeoDataFrame
+        GeoDataFrame read from a file, e.g. a saved net.
+    names : iterable of str, optional
+        The full attribute names (default is NET_ATTRIBUTES).
+
+    Returns
+    -------
+    GeoDataFrame
+        The GeoDataFrame with the full names, columns which match no name or several names are unchanged.
+    '''
+    short = {}
+    for name in names:
+        short.setdefault(name[:10].rstrip(), []).append(name)
+    mapping = {}
+    for column in gdf.columns:
+        full = short.get(column, [])
+        if len(full) == 1 and full[0] != column and full[0] not in gdf.columns:
+            mapping[column] = full[0]
+    return gdf.rename(columns=mapping)
+
+def edges_to_gdf(edges, crs, defaults=None):
+    '''
+    Converts graph edges with coordinate tuples as nodes to a GeoDataFrame.
+
+    All geometries are created at once from the coordinate arrays. Every attribute of any edge becomes a column,
+    edges without the attribute get its default value.
+
+    Parameters
+    ----------
+    edges : list of tuple
+        Edges as (u, v, data).
+    crs : string
+        coordinate reference system
+    defaults : dict, optional
+        Default value per attribute for edges which lack the attribute. These columns are always created, other
+        attributes default to NaN.
+
+    Returns
+    -------
+    GeoDataFrame
+        A GeoDataFrame with one straight line per edge.
+    '''
+    defaults = defaults or {}
+    n = len(edges)
+
+    coords = np.empty((n, 2, 2), dtype=float)
+    if n > 0:
+        coords[:, 0] = [u for u, v, data in edges]
+        coords[:, 1] = [v for u, v, data in edges]
+
+    # Columns in the order of their first appearance, columns with a default always exist
+    edge_data = [data for u, v, data in edges]
+    columns = dict.fromkeys(key for data in edge_data for key in data)
+    columns.update(dict.fromkeys(defaults))
+
+    attributes = {}
+    for key in columns:
+        default = defaults.get(key, np.nan)
+        attributes[key] = [data.get(key, default) for data in edge_data]
+
+    return gpd.GeoDataFrame(attributes, geometry=shapely.linestrings(coords), crs=crs)
+
+def line_segments(geometry):
+    '''
+    Splits lines into their straight segments.
+
+    Parameters
+    ----------
+    geometry : array_like
+        Line geometries, e.g. the geometry column of a GeoDataFrame.
+
+    Returns
+    -------
+    ndarray
+        Start and end of every segment with shape (m, 2, 2).
+    '''
+    coords, line_index = shapely.get_coordinates(np.asarray(geometry), return_index=True)
+    same_line = line_index[1:] == line_index[:-1]
+    return np.stack([coords[:-1][same_line], coords[1:][same_line]], axis=1)
+
+def map_figure(title, figsize=(15, 15), dpi=100):
+    '''
+    Creates a figure with one axis for a map, without pyplot.
+
+    The figure is not shown in a window, so saving it does not block the calling program, e.g. QGIS.
+
+    Parameters
+    ----------
+    title : str
+        Title of the axis.
+    figsize : tuple, optional
+        Size of the figure in inches (default is (15, 15)).
+    dpi : int, optional
+        Resolution of the figure (default is 100).
+
+    Returns
+    -------
+    tuple
+        The figure and the axis.
+    '''
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.add_subplot()
+    ax.set_aspect('equal')
+    ax.set_title(title)
+    return fig, ax
+
+def draw_segments(ax, segments, colors, linewidth=1.0, max_segments=200000, zorder=1):
+    '''
+    Draws line segments as one LineCollection.
+
+    If there are more than max_segments segments, their ends are snapped to a grid of one pixel of the figure and
+    segments within one pixel or drawn twice are left out, which does not change the image. If there are still
+    more, every k-th segment is drawn.
+
+    Parameters
+    ----------
+    ax : Axes
+        The axis to draw on.
+    segments : ndarray
+        Start and end of every segment with shape (m, 2, 2).
+    colors : color or list of colors
+        One color for all segments or one color per segment.
+    linewidth : float, optional
+        Width of the lines (default is 1.0).
+    max_segments : int, optional
+        Number of segments above which the segments are decimated (default is 200000, None draws all).
+    zorder : int, optional
+        Drawing order of the collection (default is 1).
+
+    Returns
+    -------
+    LineCollection
+        The collection added to the axis.
+    '''
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 2, 2)
+    colors = to_rgba_array(colors)
+    colors = np.broadcast_to(colors, (len(segments), 4)) if len(colors) == 1 else colors
+
+    if max_segments is not None and len(segments) > max_segments:
+        # Size of one pixel in map units for the extent of all segments
+        low = segments.reshape(-1, 2).min(axis=0)
+        extent = segments.reshape(-1, 2).max(axis=0) - low
+        width, height = ax.figure.get_size_inches() * ax.figure.dpi
+        pixel = max(extent[0] / width, extent[1] / height)
+
+        if pixel > 0:
+            cells = np.floor((segments - low) / pixel).astype(np.int64)
+            keys = cells[:, :, 0] * (int(extent[1] / pixel) + 1) + cells[:, :, 1]
+            a, b = keys.min(axis=1), keys.max(axis=1)
+            visible = np.flatnonzero(a != b)
+            _, first = np.unique(np.column_stack([a, b])[visible], axis=0, return_index=True)
+            visible = visible[np.sort(first)]
+            segments = (cells[visible] + 0.5) * pixel + low
+            colors = colors[visible]
+
+        if len(segments) > max_segments:
+            step = int(np.ceil(len(segments) / max_segments))
+            segments, colors = segments[::step], colors[::step]
+
+    collection = LineCollection(segments, colors=colors, linewidths=linewidth, zorder=zorder)
+    ax.add_collection(collection)
+    ax.autoscale_view()
+    return collection
+
+def graph_nodes(G, points):
+    '''
+    Maps coordinates to the nodes of a NetworkX street graph.
+
+    Parameters
+    ----------
+    G : nx.Graph
+        The street network graph. If it was built by Graph, its NodeIndex is stored in G.graph['node_index'].
+    points : list of tuple
+        Coordinates of the points.
+
+    Returns
+    -------
+    list of tuple
+        The node of each point. Points without a node within the tolerance are returned unchanged.
+    '''
+    node_index = G.graph.get('node_index')
+    if node_index is None or len(points) == 0:
+        return [tuple(point) for point in points]
+
+    ids = node_index.lookup(points)
+    coords = node_index.coords
+    return [tuple(coords[i].tolist()) if i >= 0 else tuple(point) for i, point in zip(ids, points)]
+
+class StreetSegmentIndex:
+    '''
+    A spatial index over the single segments of street lines to find the closest street segments for many points at once.
+
+    Attributes
+    ----------
+    street_id : ndarray
+        Index of the street in the streets GeoDataFrame for each segment.
+    position : ndarray
+        Position of the segment's end vertex in the coordinates of its street, i.e. the insertion position of a point
+        on the segment.
+    start : ndarray
+        Coordinates of the segment start points with shape (k, 2).
+    end : ndarray
+        Coordinates of the segment end points with shape (k, 2).
+    tree : shapely.STRtree
+        Spatial index of the segments.
+
+    Methods
+    -------
+    closest_points(points, segment):
+        Projects points on given segments.
+    nearest(points, street_ids=None):
+        Finds the closest segment and the closest point on it for each point.
+    '''
+
+    def __init__(self, streets):
+        '''
+        Initializes the StreetSegmentIndex class by exploding the streets into segments.
+
+        Parameters
+        ----------
+        streets : GeoDataFrame
+            A GeoDataFrame containing street geometries.
+        '''
+        coords, line_index = shapely.get_coordinates(streets.geometry.values, return_index=True)
+
+        # A segment starts at every vertex that is followed by a vertex of the same line
+        seg = np.flatnonzero(line_index[1:] == line_index[:-1])
+        first_vertex = np.searchsorted(line_index, line_index[seg])
+
+        self.start = coords[seg]
+        self.end = coords[seg + 1]
+        self.position = seg + 1 - first_vertex
+        self.street_id = streets.index.to_numpy()[line_index[seg]]
+        self.tree = shapely.STRtree(shapely.linestrings(np.stack([self.start, self.end], axis=1)))
+
+    def closest_points(self, points, segment):
+        '''
+        Projects points on given segments.
+
+        Parameters
+        ----------
+        points : ndarray
+            Coordinates of the points with shape (n, 2).
+        segment : ndarray
+            Index of the segment for each point.
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - closest (ndarray): Coordinates of the closest points on the segments with shape (n, 2).
+            - distance (ndarray): Distance between the points and the segments.
+        '''
+        start = self.start[segment]
+        direction = self.end[segment] - start
+        squared_length = (direction ** 2).sum(axis=1)
+
+        # Relative position of the projection on the segment, zero for segments without length
+        t = ((points - start) * direction).sum(axis=1) / np.where(squared_length > 0, squared_length, 1)
+        t = np.clip(t, 0, 1)
+
+        closest = start + t[:, None] * direction
+        distance = np.hypot(*(points - closest).T)
+        return closest, distance
+
+    def nearest(self, points, street_ids=None):
+        '''
+        Finds the closest segment and the closest point on it for each point.
+
+        Parameters
+        ----------
+        points : array_like
+            Point geometries.
+        street_ids : array_like, optional
+            Street of each point. If given, only segments of this street are taken into account (default is None).
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - segment (ndarray): Index of the closest segment for each point.
+            - closest (ndarray): Coordinates of the closest points on the segments with shape (n, 2).
+            - distance (ndarray): Distance between the points and the segments.
+        '''
+        points = np.asarray(points)
+        xy = shapely.get_coordinates(points)
+
+        if street_ids is None:
+            point_idx, segment_idx = self.tree.query_nearest(points, all_matches=False)
+            segment = np.empty(len(points), dtype=np.int64)
+            segment[point_idx] = segment_idx
+            closest, distance = self.closest_points(xy, segment)
+            return segment, closest, distance
+
+        street_ids = np.asarray(street_ids)
+
+        # All equally close segments, sorted by point and segment index, restricted to the street of each point
+        point_idx, segment_idx = self.tree.query_nearest(points, all_matches=True)
+        order = np.lexsort((segment_idx, point_idx))
+        point_idx, segment_idx = point_idx[order], segment_idx[order]
+        on_street = self.street_id[segment_idx] == street_ids[point_idx]
+        matched, first = np.unique(point_idx[on_street], return_index=True)
+
+        segment = np.full(len(points), -1, dtype=np.int64)
+        segment[matched] = segment_idx[on_street][first]
+
+        # Points closer to another street, e.g. due to rounding, are compared with all segments of their street
+        for i in np.flatnonzero(segment < 0):
+            candidates = np.flatnonzero(self.street_id == street_ids[i])
+            closest, distance = self.closest_points(np.repeat(xy[i:i+1], len(candidates), axis=0), candidates)
+            segment[i] = candidates[np.argmin(distance)]
+
+        closest, distance = self.closest_points(xy, segment)
+        return segment, closest, distance
+
 class Streets:
     '''
     A class to manage street geometries and to add connection points from buildings and energy sources to the streets.
@@ -168,6 +680,9 @@ class Streets:
         '''
         Inserts connection points from buildings and energy sources into the street lines.
 
+        The connection points are grouped by street, ordered along each line and deduplicated, so every street is
+        rebuilt exactly once.
+
         Parameters
         ----------
         buildings : GeoDataFrame
@@ -176,30 +691,48 @@ class Streets:
             A GeoDataFrame containing energy source geometries and attributes, including 'street_id' and 'Anschlusspunkt'.
         '''
 
-        for df in [buildings, sources]:
-            for index, row in df.iterrows():
-                street_id = row['street_id']
-                if not pd.isna(street_id):
-                    anschlusspunkt = row['Anschlusspunkt']
-                    line = self.gdf['geometry'][street_id]
-                    line_coords = list(line.coords)
-
-                    insertion_position = None
-                    min_distance = float('inf')
-
-                    # Find insertion position in the line
-                    for i in range(1, len(line_coords)):
-                        segment = LineString([line_coords[i-1], line_coords[i]])
-                        distance = segment.distance(anschlusspunkt)
-
-                        if distance < min_distance:
-                            min_distance = distance
-                            insertion_position = i
-
-                    # Insert the connection point into the line coordinates
-                    if (anschlusspunkt.x, anschlusspunkt.y) not in line_coords:
-                        line_coords.insert(insertion_position, (anschlusspunkt.x, anschlusspunkt.y))
-                        self.gdf.at[street_id, 'geometry'] = LineString(line_coords)
+        points = pd.concat([buildings[['Anschlusspunkt', 'street_id']], sources[['Anschlusspunkt', 'street_id']]])
+        points = points[points['street_id'].notna()]
+        if len(points) == 0:
+            return
+
+        # Insertion positions of all connection points in the original street lines
+        segment_index = StreetSegmentIndex(self.gdf)
+        segment, closest, distance = segment_index.nearest(points['Anschlusspunkt'].values, points['street_id'].to_numpy())
+        line = self.gdf.index.get_indexer(points['street_id'])
+        position = segment_index.position[segment]
+        offset = np.hypot(*(closest - segment_index.start[segment]).T)
+        xy = shapely.get_coordinates(points['Anschlusspunkt'].values)
+
+        # Order the points along each line and drop points shared by several buildings
+        order = np.lexsort((offset, position, line))
+        line, position, offset, xy, segment = line[order], position[order], offset[order], xy[order], segment[order]
+        duplicate = np.zeros(len(line), dtype=bool)
+        duplicate[1:] = (line[1:] == line[:-1]) & (xy[1:] == xy[:-1]).all(axis=1)
+
+        # Points which are already vertices of the line are not inserted
+        vertex = (xy == segment_index.start[segment]).all(axis=1) | (xy == segment_index.end[segment]).all(axis=1)
+        insert = ~duplicate & ~vertex
+        line, position, offset, xy = line[insert], position[insert], offset[insert], xy[insert]
+
+        # Merge the vertices and the connection points of every affected line and rebuild each line once
+        affected = np.unique(line)
+        coords, line_index = shapely.get_coordinates(self.gdf.geometry.values[affected], return_index=True)
+        vertex_position = np.arange(len(coords)) - np.searchsorted(line_index, line_index)
+        local_line = np.searchsorted(affected, line)
+
+        all_coords = np.concatenate([coords, xy])
+        all_lines = np.concatenate([line_index, local_line])
+        # A point with insertion position i goes in front of vertex i, vertices sort behind points at the same position
+        all_positions = np.concatenate([vertex_position, position])
+        all_kinds = np.concatenate([np.ones(len(coords)), np.zeros(len(xy))])
+        all_offsets = np.concatenate([np.zeros(len(coords)), offset])
+        merged = np.lexsort((all_offsets, all_kinds, all_positions, all_lines))
+
+        new_lines = shapely.linestrings(all_coords[merged], indices=all_lines[merged])
+        geometry = self.gdf.geometry.values.copy()
+        geometry[affected] = new_lines
+        self.gdf['geometry'] = gpd.GeoSeries(geometry, index=self.gdf.index, crs=self.gdf.crs)
 
 class Source:
     '''
@@ -241,32 +774,13 @@ class Source:
         streets : GeoDataFrame
             A GeoDataFrame containing street geometries and attributes.
         '''
-        # Iteration over each source and finding the closest point on the street network
-        for index, row_s in self.gdf.iterrows():
-
-            # Initialize variables for minimum distance and closest point
-            min_distance = float('inf')
-            closest_point = None
-            source = row_s['geometry']
-
-            # Iterate over each line in the street network
-            for idx,row in streets.iterrows():
-                line_coords = list(row['geometry'].coords)  # List of points that make up the line
-                
-                # Iterate over each line segment to find the closest point
-                for i in range(1, len(line_coords)):
-                    start_point = Point(line_coords[i-1])
-                    end_point = Point(line_coords[i])
-                    line_segment = LineString([start_point, end_point])
-
-                    distance = line_segment.distance(source)
-
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_point = get_closest_point(LineString([start_point, end_point]), source)
-                        id = idx
-            self.gdf.at[index, 'Anschlusspunkt'] = closest_point
-            self.gdf.at[index, 'street_id'] = int(id)
+        segment_index = StreetSegmentIndex(streets)
+        segment, closest, distance = segment_index.nearest(self.gdf.geometry.values)
+
+        self.gdf['Anschlusspunkt_x'] = closest[:, 0]
+        self.gdf['Anschlusspunkt_y'] = closest[:, 1]
+        self.gdf['Anschlusspunkt'] = gpd.GeoSeries(gpd.points_from_xy(closest[:, 0], closest[:, 1]), index=self.gdf.index, crs=self.gdf.crs)
+        self.gdf['street_id'] = segment_index.street_id[segment]
 
 class Buildings:
     '''
@@ -336,38 +850,43 @@ class Buildings:
         Notes
         -----
         For each building, this method computes the closest point on the street network and adds it to the GeoDataFrame 
-        along with the ID of the closest street.
+        along with the ID of the closest street. All centroids are queried against the StreetSegmentIndex of the streets 
+        at once and the connection points are stored as the columns 'Anschlusspunkt_x' and 'Anschlusspunkt_y' and as the 
+        geometry column 'Anschlusspunkt'.
         '''
-        # Create spatial index for the streets
-        sindex = streets.sindex
-
-        # Iterate over each building centroid
-        for index, row_p in self.gdf.iterrows():
-            centroid = row_p['centroid']
-
-            # Use spatial index to get the nearest lines to the centroid
-            possible_matches_index = list(sindex.nearest(centroid))
-            possible_matches = streets.iloc[[i[0] for i in possible_matches_index]]
-
-            # Find the line closest to the centroid
-            closest_line = possible_matches.geometry.distance(centroid).idxmin()
-
-            # Compute the closest point on this line
-            closest_point = get_closest_point(streets.at[closest_line, 'geometry'], centroid)
-
-            self.gdf.loc[index, 'Anschlusspunkt'] = closest_point
-            self.gdf.loc[index, 'street_id'] = int(closest_line)
+        centroids = self.gdf['centroid'].values
+        x = np.full(len(self.gdf), np.nan)
+        y = np.full(len(self.gdf), np.nan)
+        street_id = np.full(len(self.gdf), np.nan)
+
+        # Nearest street segment for all centroids, buildings without a centroid keep NaN
+        valid = ~shapely.is_missing(centroids) & ~shapely.is_empty(centroids)
+        if valid.any():
+            segment_index = StreetSegmentIndex(streets)
+            segment, closest, distance = segment_index.nearest(centroids[valid])
+            x[valid] = closest[:, 0]
+            y[valid] = closest[:, 1]
+            street_id[valid] = segment_index.street_id[segment]
+
+        self.gdf['Anschlusspunkt_x'] = x
+        self.gdf['Anschlusspunkt_y'] = y
+        self.gdf['Anschlusspunkt'] = gpd.GeoSeries(gpd.points_from_xy(x, y), index=self.gdf.index, crs=self.gdf.crs).where(~np.isnan(x), None)
+        self.gdf['street_id'] = street_id
 
 class Graph:
     '''
-    A class to represent and manipulate a street network graph using NetworkX.
+    A class to represent and manipulate a street network graph using NetworkX or an array based StreetGraph.
 
     Attributes
     ----------
-    graph : nx.Graph
-        A NetworkX graph representing the street network.
+    graph : nx.Graph or StreetGraph
+        A graph representing the street network.
     crs : string
         coordinate reference system 
+    backend : str
+        'networkx' or 'array'
+    node_index : NodeIndex
+        Index of the nodes by quantized coordinates, vertices closer than its tolerance become one node.
 
     Methods
     -------
@@ -379,23 +898,48 @@ class Graph:
         Connects energy sources to the street network.
     add_attribute_length():
         Adds a 'length' attribute to each edge in the graph.
-    plot_G():
-        Plots the street network graph.
+    plot_G(filename, max_segments=200000):
+        Plots the street network graph and saves the image.
     get_connected_points(input_point):
         Returns the points connected to the given input point in the graph.
-    plot_graph(input_point, connected_points):
-        Plots the graph with connected points highlighted.
+    component_labels():
+        Labels the connected components of all nodes at once.
+    connected_mask(points):
+        Marks the nodes that are connected to at least one of the given points.
+    disconnected_components(points):
+        Returns the nodes and edges of all components which are not connected to any of the given points.
+    plot_graph(input_point, connected_points, filename, max_segments=200000):
+        Plots the graph with connected points highlighted and saves the image.
     graph_to_gdf():
         Converts the NetworkX graph to a GeoDataFrame.
     save_nodes_to_shapefile(filename):
         Saves the graph nodes as points in a shapefile, with node degree and coordinates annotated.
     '''
-    def __init__(self, crs):
+    def __init__(self, crs, backend='networkx', tolerance=0.001):
         '''
-        Initializes the Graph class with an empty NetworkX graph.
+        Initializes the Graph class with an empty graph.
+
+        Parameters
+        ----------
+        crs : string
+            coordinate reference system
+        backend : str, optional
+            'networkx' for a NetworkX graph with coordinate tuples as nodes or 'array' for a StreetGraph with integer
+            node ids and a CSR adjacency matrix (default is 'networkx').
+        tolerance : float, optional
+            Distance in the units of the crs up to which vertices are merged into one node (default is 0.001).
         '''
-        self.graph = nx.Graph()
+        if backend == 'array':
+            self.graph = StreetGraph(crs, tolerance)
+            self.node_index = self.graph.node_index
+        elif backend == 'networkx':
+            # Nodes are the coordinates of the first vertex added to each grid cell of the node index
+            self.node_index = NodeIndex(tolerance)
+            self.graph = nx.Graph(node_index=self.node_index)
+        else:
+            raise ValueError(f'Unknown graph backend: {backend}')
         self.crs = crs
+        self.backend = backend
         
     def create_street_network(self, streets):
         '''
@@ -406,23 +950,40 @@ class Graph:
         streets : GeoDataFrame
             A GeoDataFrame containing street geometries.
         '''
-        # Dictionary with attributes for the edges
-        edge_data = {'type': 'Straßenleitung'}  
+        # Coordinates of all lines at once, consecutive vertices of the same line form an edge
+        coords, line_index = shapely.get_coordinates(streets.geometry.values, return_index=True)
+        same_line = line_index[1:] == line_index[:-1]
 
-        # Add nodes and edges
-        for idx, row in streets.iterrows():
-            geom = row['geometry']
-            line_coords = list(geom.coords)
+        if self.backend == 'networkx':
+            self.graph.add_nodes_from(self._node_tuples(self.node_index.add(coords)))
+        street_id = streets.index.to_numpy()[line_index[1:][same_line]]
+        self._add_edges(coords[1:][same_line], coords[:-1][same_line], 'Straßenleitung', street_id)
 
-            # Iterate over each point on the line
-            for i in range(len(line_coords)):
-                node = line_coords[i]
-                self.graph.add_node(node)
+    def _node_tuples(self, ids):
+        '''
+        Returns the coordinate tuples of node ids, which are the nodes of the NetworkX graph.
+        '''
+        return list(map(tuple, self.node_index.coords[ids].tolist()))
+
+    def _add_edges(self, xy_u, xy_v, edge_type, street_id=-1):
+        '''
+        Adds edges between coordinate arrays to the graph in one call.
 
-                # Connect point to previous point
-                if i > 0:
-                    prev_node = line_coords[i-1]
-                    self.graph.add_edge(node, prev_node,**edge_data)
+        Parameters
+        ----------
+        xy_u, xy_v : ndarray
+            Coordinates of the edge ends with shape (m, 2).
+        edge_type : str
+            Type of the edges.
+        street_id : int or ndarray, optional
+            Index of the street of the edges, only stored by the StreetGraph (default is -1, no street).
+        '''
+        if self.backend == 'array':
+            self.graph.add_edges(xy_u, xy_v, edge_type, street_id)
+        else:
+            u = self._node_tuples(self.node_index.add(xy_u))
+            v = self._node_tuples(self.node_index.add(xy_v))
+            self.graph.add_edges_from(zip(u, v), type=edge_type)
     
     def connect_centroids(self, buildings):
         '''
@@ -433,12 +994,10 @@ class Graph:
         buildings : GeoDataFrame
             A GeoDataFrame containing building geometries and centroids.
         '''
-        for index, row in buildings.iterrows():
-            centroid = row['centroid']
-            closest_point = row['Anschlusspunkt']
-            if not pd.isna(closest_point):
-                edge_data = {'type': 'Hausanschluss'}  # Dictionary mit dem Attribut, das die edge haben soll
-                self.graph.add_edge(centroid.coords[0], (closest_point.x, closest_point.y), **edge_data)
+        connected = buildings['Anschlusspunkt'].notna().to_numpy()
+        centroids = shapely.get_coordinates(buildings['centroid'].values[connected])
+        closest_points = shapely.get_coordinates(buildings['Anschlusspunkt'].values[connected])
+        self._add_edges(centroids, closest_points, 'Hausanschluss')
 
     def connect_source(self, sources):
         '''
@@ -449,32 +1008,42 @@ class Graph:
         sources : GeoDataFrame
             A GeoDataFrame containing energy source geometries.
         '''
-        for index, row in sources.iterrows():
-            source = row['geometry']
-            closest_point = row['Anschlusspunkt']
-            if not pd.isna(source):
-                edge_data = {'type': 'Quellenanschluss'}  # Dictionary mit dem Attribut, das die edge haben soll
-                self.graph.add_edge(source.coords[0], (closest_point.x, closest_point.y), **edge_data)
+        connected = sources['geometry'].notna().to_numpy()
+        source_points = shapely.get_coordinates(sources['geometry'].values[connected])
+        closest_points = shapely.get_coordinates(sources['Anschlusspunkt'].values[connected])
+        self._add_edges(source_points, closest_points, 'Quellenanschluss')
 
     def add_attribute_length(self):
         '''
         Adds a 'length' attribute to each edge in the graph.
         '''
-        for node1, node2 in self.graph.edges():
-            geom = LineString([node1, node2])
-            self.graph.edges[node1, node2]['length [m]'] = geom.length
-
-    def plot_G(self):
+        # The StreetGraph stores the length of every edge when it is added
+        if self.backend == 'array':
+            return
+
+        edges = list(self.graph.edges())
+        if not edges:
+            return
+        ends = np.array(edges, dtype=np.float64)
+        length = np.hypot(ends[:, 0, 0] - ends[:, 1, 0], ends[:, 0, 1] - ends[:, 1, 1])
+        nx.set_edge_attributes(self.graph, dict(zip(edges, length.tolist())), 'length [m]')
+
+    def plot_G(self, filename, max_segments=200000):
         '''
-        Plots the street network graph.
+        Plots the street network graph and saves the image.
+
+        Parameters
+        ----------
+        filename : str
+            File name to save the image.
+        max_segments : int, optional
+            Number of edges above which the drawing is decimated, see draw_segments (default is 200000).
         '''
-        # set crs
-        pos = {node: (node[0], node[1]) for node in self.graph.nodes}
+        coords, edges = self._node_arrays()
 
-        plt.figure()
-        plt.title('Graph')
-        nx.draw_networkx(self.graph, pos=pos, with_labels=False, font_size=6, node_size=3, node_color='blue', edge_color='gray')
-        plt.show()
+        fig, ax = map_figure('Graph')
+        draw_segments(ax, coords[edges], 'gray', max_segments=max_segments)
+        fig.savefig(filename, bbox_inches='tight')
 
     
     def get_connected_points(self, input_point):
@@ -491,7 +1060,19 @@ class Graph:
         list
             A list of points connected to the input point.
         '''
+        if self.backend == 'array':
+            node = self.graph.node_ids([input_point])[0]
+            if node < 0:
+                print("Input point not in graph nodes.")
+                return []
+
+            n_components, labels = self.graph.connected_components()
+            component = np.flatnonzero(labels == labels[node])
+            component = component[component != node]
+            return list(map(tuple, self.graph.coords[component].tolist()))
+
         # Check input point
+        input_point = graph_nodes(self.graph, [input_point])[0]
         if input_point not in self.graph.nodes:
             print("Input point not in graph nodes.")
             return []
@@ -502,9 +1083,136 @@ class Graph:
                 return list(component - {input_point})
         return []
 
-    def plot_graph(self, input_point, connected_points):
+    def component_labels(self):
+        '''
+        Labels the connected components of all nodes at once.
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - coords (ndarray): Coordinates of the nodes, shape (n, 2).
+            - labels (ndarray): Component label of each node.
+        '''
+        if self.backend == 'array':
+            n_components, labels = self.graph.connected_components()
+            return self.graph.coords, labels
+
+        coords, edges = self._node_arrays()
+        adjacency = coo_matrix((np.ones(len(edges)), (edges[:, 0], edges[:, 1])), shape=(len(coords), len(coords)))
+        n_components, labels = connected_components(adjacency, directed=False)
+        return coords, labels
+
+    def _node_arrays(self):
         '''
-        Plots the graph with connected points highlighted.
+        Returns the coordinates of the nodes with shape (n, 2) and the node ids of the edges with shape (m, 2).
+        '''
+        if self.backend == 'array':
+            return self.graph.coords, self.graph.edges.astype(np.int64)
+
+        nodes = list(self.graph.nodes)
+        node_ids = {node: i for i, node in enumerate(nodes)}
+        edges = np.array([(node_ids[u], node_ids[v]) for u, v in self.graph.edges], dtype=np.int64).reshape(-1, 2)
+        return np.array(nodes, dtype=float).reshape(-1, 2), edges
+
+    def connected_mask(self, points):
+        '''
+        Marks the nodes that are connected to at least one of the given points.
+
+        Nodes without any edge, e.g. left over from removed streets, are not part of the network and are left out.
+
+        Parameters
+        ----------
+        points : list of tuple
+            Coordinates of the points, e.g. the sources.
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - coords (ndarray): Coordinates of the nodes, shape (n, 2).
+            - connected (ndarray): Boolean mask of the nodes connected to any of the points.
+        '''
+        coords, labels = self.component_labels()
+
+        # Nodes of the points, points that are not in the graph are ignored
+        ids = self._point_ids(points)
+        if self.backend == 'array':
+            has_edges = self.graph.degree() > 0
+        else:
+            has_edges = np.fromiter((d > 0 for node, d in self.graph.degree()), dtype=bool, count=len(coords))
+
+        return coords[has_edges], np.isin(labels, labels[ids])[has_edges]
+
+    def _point_ids(self, points):
+        '''
+        Returns the node ids of points in the order of _node_arrays, points that are not in the graph are left out.
+        '''
+        if len(points) == 0:
+            return np.empty(0, dtype=np.int64)
+        if self.backend == 'array':
+            ids = self.graph.node_ids(points)
+        else:
+            node_ids = {node: i for i, node in enumerate(self.graph.nodes)}
+            ids = np.array([node_ids.get(node, -1) for node in graph_nodes(self.graph, points)], dtype=np.int64)
+        return ids[ids >= 0]
+
+    def disconnected_components(self, points):
+        '''
+        Returns the nodes and edges of all components which are not connected to any of the given points.
+
+        All components are labeled at once. The components are numbered by size, the largest disconnected component
+        is 0, so the gaps in a street layer can be found and fixed in GIS, e.g. by snapping.
+
+        Parameters
+        ----------
+        points : list of tuple
+            Coordinates of the points, e.g. the sources.
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - nodes (GeoDataFrame): Disconnected nodes with 'component' and 'size', the number of nodes of the component.
+            - edges (GeoDataFrame): Edges of the disconnected components with 'component', 'size' and 'length [m]'.
+        '''
+        coords, labels = self.component_labels()
+        coords, edges = self._node_arrays()
+
+        # Nodes with edges in components without any of the points
+        has_edges = np.bincount(edges.ravel(), minlength=len(coords)) > 0
+        disconnected = has_edges & ~np.isin(labels, labels[self._point_ids(points)])
+        size = np.bincount(labels, minlength=labels.max(initial=-1) + 1)
+
+        # Number the disconnected components from the largest to the smallest
+        components = np.unique(labels[disconnected])
+        components = components[np.argsort(-size[components], kind='stable')]
+        component = np.full(len(size), -1, dtype=np.int64)
+        component[components] = np.arange(len(components))
+
+        nodes = np.flatnonzero(disconnected)
+        edges = edges[disconnected[edges[:, 0]]]
+        segments = coords[edges]
+        node_gdf = gpd.GeoDataFrame(
+            {'component': component[labels[nodes]], 'size': size[labels[nodes]]},
+            geometry=shapely.points(coords[nodes]), crs=self.crs
+        )
+        edge_gdf = gpd.GeoDataFrame(
+            {
+                'component': component[labels[edges[:, 0]]],
+                'size': size[labels[edges[:, 0]]],
+                'length [m]': np.hypot(*(segments[:, 0] - segments[:, 1]).T)
+            },
+            geometry=shapely.linestrings(segments), crs=self.crs
+        )
+        return node_gdf, edge_gdf
+
+    def plot_graph(self, input_point, connected_points, filename, max_segments=200000):
+        '''
+        Plots the graph with connected points highlighted and saves the image.
+
+        Edges between connected points are drawn green, all other edges red. The disconnected points are marked, the
+        connected points are only drawn by their edges.
 
         Parameters
         ----------
@@ -512,24 +1220,31 @@ class Graph:
             The input point coordinates.
         connected_points : list
             A list of points connected to the input point.
+        filename : str
+            File name to save the image.
+        max_segments : int, optional
+            Number of edges above which the drawing is decimated, see draw_segments (default is 200000).
         '''
-        pos = {node: (node[0], node[1]) for node in self.graph.nodes}
-        node_colors = ['blue' if node == input_point else 'red' for node in self.graph.nodes]
+        coords, edges = self._node_arrays()
 
-        # Color connected points
-        for node in connected_points:
-            node_colors[list(self.graph.nodes).index(node)] = '#00ff33'
+        # Nodes of the connected points
+        connected = np.zeros(len(coords), dtype=bool)
+        connected[self._point_ids(connected_points)] = True
+        has_edges = np.bincount(edges.ravel(), minlength=len(coords)) > 0
+        disconnected = coords[has_edges & ~connected]
 
-        plt.figure(figsize=(20, 20))
-        plt.title('Graph Network with connected and disconnected Points')
+        fig, ax = map_figure('Graph Network with connected and disconnected Points', figsize=(20, 20))
+        colors = np.where(connected[edges].all(axis=1)[:, None], to_rgba_array('#00ff33'), to_rgba_array('red'))
+        draw_segments(ax, coords[edges], colors, max_segments=max_segments)
+        ax.scatter(disconnected[:, 0], disconnected[:, 1], s=10, color='red', zorder=2)
+        ax.scatter([input_point[0]], [input_point[1]], s=40, color='blue', zorder=3)
 
         # Legend
         legend_labels = {'Source': 'blue', 'Connected Points': '#00ff33', 'Disconnected Points': 'red'}
-        legend_handles = [plt.Line2D([0], [0], marker='o', color=color, label=label, linestyle='None') for label, color in legend_labels.items()]
-        plt.legend(handles=legend_handles, loc='upper right', fontsize=10)
+        legend_handles = [Line2D([0], [0], marker='o', color=color, label=label, linestyle='None') for label, color in legend_labels.items()]
+        ax.legend(handles=legend_handles, loc='upper right', fontsize=10)
 
-        nx.draw(self.graph, pos, node_color=node_colors, font_size=6, node_size=10, with_labels=False)
-        plt.show()
+        fig.savefig(filename, bbox_inches='tight')
 
         
     def graph_to_gdf(self): # Methode ist ebenfalls in Net. Klassen zusammenfügen? --> Wegen übersichtlichkeit erstmal nicht
@@ -541,20 +1256,11 @@ class Graph:
         GeoDataFrame
             A GeoDataFrame representing the graph edges.
         '''
-        geometries = []
-        attributes = {}
-
-        for u, v, data in self.graph.edges(data=True):
-            geometries.append(LineString([u, v]))
-
-            # Collect attributes for each edge
-            for key, value in data.items():
-                if key in attributes:
-                    attributes[key].append(value)
-                else:
-                    attributes[key] = [value]
+        if self.backend == 'array':
+            self.gdf = self.graph.to_gdf()
+            return
 
-        self.gdf = gpd.GeoDataFrame(attributes, geometry=geometries, crs=self.crs)
+        self.gdf = edges_to_gdf([edge for edge in self.graph.edges(data=True)], self.crs)
 
     def save_nodes_to_shapefile(self, filename):
         """
@@ -565,14 +1271,15 @@ class Graph:
         filename : str
             The file path to save the shapefile.
         """
-        nodes_data = {'geometry': [], 'degree': [], 'x_coord': [], 'y_coord': []}
-
-        for node in self.graph.nodes():
-            nodes_data['geometry'].append(Point(node))
-            nodes_data['degree'].append(self.graph.degree(node))
-            nodes_data['x_coord'].append(node[0])
-            nodes_data['y_coord'].append(node[1])
+        if self.backend == 'array':
+            coords = self.graph.coords
+            degree = self.graph.degree()
+        else:
+            n = self.graph.number_of_nodes()
+            coords = np.array(list(self.graph.nodes), dtype=float).reshape(n, 2)
+            degree = np.fromiter((d for node, d in self.graph.degree()), dtype=np.int64, count=n)
 
+        nodes_data = {'geometry': shapely.points(coords), 'degree': degree, 'x_coord': coords[:, 0], 'y_coord': coords[:, 1]}
         nodes_gdf = gpd.GeoDataFrame(nodes_data, crs=self.crs)
         nodes_gdf.to_file(filename,driver='GPKG')
 
@@ -582,57 +1289,150 @@ class Net:
 
     Attributes
     ----------
-    net : nx.Graph
-        A NetworkX graph representing the network.
+    edges : EdgeTable
+        The edges of the network with their attributes as NumPy columns.
     htemp : float
         Supply temperature.
     ltemp : float
         Return temperature.
     crs : string
         coordinate reference system
+    pump_head : float
+        Highest pressure loss of supply and return line between a source and a node in bar, set by add_pressure_loss
+        or solve_hydraulics.
 
     Methods
     -------
+    from_gdf(gdf, htemp, ltemp):
+        Creates a Net from a GeoDataFrame of the net, e.g. a saved result of network_analysis.
+    to_networkx():
+        Returns a copy of the net as a NetworkX graph.
     update_attribute(u, v, attribute, name):
-        Adds or updates an attribute to an edge in the network graph.
+        Adds or updates an attribute of one or several edges.
     add_edge_attributes(pipe_info):
         Adds attributes to the network edges such as GLF, power_GLF, volumeflow, DN, velocity, and loss.
-    network_analysis(G, buildings, sources, pipe_info, power_att, weight='length', progressBar=None):
+    shortest_path_tree(G, start_points, end_points, powers, weight='length [m]'):
+        Builds the network from a shortest path tree and accumulates power and building count bottom-up.
+    scenario_sweep(temperatures, pipe_info):
+        Sizes the routed network for several temperature scenarios and adds scenario-suffixed edge attributes.
+    optimize_pipes(pipe_info, costs, sources, max_gradient=300, extra_insulation=False, roughness=0.1):
+        Sizes the pipes with the lowest annual cost instead of the smallest suitable DN.
+    add_pressure_loss(pipe_info, sources, roughness=0.1):
+        Adds the pressure loss of every edge and the cumulative pressure loss from the sources to every node.
+    add_closures(lines):
+        Adds ring closures between nodes of the net.
+    solve_hydraulics(pipe_info, sources, roughness=0.1):
+        Calculates the flows and pressures of a net with loops, e.g. a tree with additional ring closures.
+    thermal_simulation(pipe_info, sources, load_factor, ground_temp=10, htemp=None, ltemp=None, extra_insulation=False, chunk_size=168):
+        Simulates the supply temperatures and heat losses of the routed tree for every hour of a load profile.
+    network_analysis(G, buildings, sources, pipe_info, power_att, weight='length', progressBar=None, routing='tree'):
         Calculates the network by finding the shortest path to each building.
-    plot_network(streets, buildings, sources, filename, title='Street network and calculated network'):
+    plot_network(streets, buildings, sources, filename, title='Street network and calculated network', max_segments=200000):
         Plots the street network, buildings, and calculated network, and saves the image.
     ensure_power_attribute():
         Ensures that each edge in the graph has the 'power' attribute.
     graph_to_gdf():
-        Converts a NetworkX graph to a GeoDataFrame, including edge attributes.
+        Converts the edge table to a GeoDataFrame, including edge attributes.
     '''
 
     def __init__(self, htemp, ltemp, crs):
         '''
-        Initializes the Net class with an empty NetworkX graph, supply temperature, and return temperature.
+        Initializes the Net class with an empty edge table, supply temperature, and return temperature.
         '''
-        self.net = nx.Graph()
+        self.edges = EdgeTable()
         self.htemp = htemp
         self.ltemp = ltemp
         self.crs = crs
+        self.pump_head = None
+
+    @classmethod
+    def from_gdf(cls, gdf, htemp, ltemp):
+        '''
+        Creates a Net from a GeoDataFrame of the net, e.g. a saved result of network_analysis.
+
+        The first and last point of every line become the nodes of an edge, all other columns become its attributes.
+        Attribute names which were cut to 10 characters in a shapefile get their full names again, see
+        restore_field_names.
+
+        Parameters
+        ----------
+        gdf : GeoDataFrame
+            GeoDataFrame with one line per edge.
+        htemp : float
+            Supply temperature.
+        ltemp : float
+            Return temperature.
+
+        Returns
+        -------
+        Net
+            The net with the edges of the GeoDataFrame.
+        '''
+        net = cls(htemp, ltemp, gdf.crs)
+        gdf = restore_field_names(gdf)
+        geometry = gdf.geometry.values
+        start = shapely.get_coordinates(shapely.get_point(geometry, 0))
+        end = shapely.get_coordinates(shapely.get_point(geometry, -1))
+        net.edges.append(start, end, {name: gdf[name].to_numpy() for name in gdf.columns if name != gdf.geometry.name})
+        return net
+
+    def to_networkx(self):
+        '''
+        Returns a copy of the net as a NetworkX graph with coordinate tuples as nodes, see EdgeTable.to_networkx.
+
+        The graph is built on every call and changes to it do not change the net. Edges are added and changed with
+        update_attribute or the methods of the edge table.
+
+        Returns
+        -------
+        nx.Graph
+            The edges of the net with all attributes.
+        '''
+        return self.edges.to_networkx()
 
     def update_attribute(self, u, v, attribute, name):
         '''
-        Adds or updates an attribute to an edge in the network graph.
+        Adds or updates an attribute of one or several edges.
+
+        Numeric values are added to the value the edge already has, other values as well. Edges which the net does
+        not have yet are added. Several edges should be passed at once, which looks them up and adds them in one pass.
 
         Parameters
         ----------
-        u, v : nodes
-            Nodes defining the edge.
-        attribute : any
-            Value of the attribute.
+        u, v : tuple or array_like
+            Nodes defining the edge, or coordinates of the nodes of several edges with shape (k, 2).
+        attribute : any or array_like
+            Value of the attribute, one value per edge for several edges.
         name : str
             Name of the attribute.
         '''
-        if name in self.net.edges[u, v]:
-            self.net.edges[u, v][name] += attribute
+        xy_u = np.asarray(u, dtype=np.float64).reshape(-1, 2)
+        xy_v = np.asarray(v, dtype=np.float64).reshape(-1, 2)
+        values = np.asarray(attribute if np.ndim(attribute) else [attribute] * len(xy_u))
+
+        # Add the missing edges once, even if they are passed several times or in both directions
+        ids = self.edges.find_all(xy_u, xy_v)
+        missing = np.flatnonzero(ids < 0)
+        if len(missing) > 0:
+            pairs = np.stack([xy_u[missing], xy_v[missing]], axis=1)
+            swap = (pairs[:, 0, 0] > pairs[:, 1, 0]) | ((pairs[:, 0, 0] == pairs[:, 1, 0]) & (pairs[:, 0, 1] > pairs[:, 1, 1]))
+            pairs[swap] = pairs[swap, ::-1]
+            first = np.sort(np.unique(pairs.reshape(-1, 4), axis=0, return_index=True)[1])
+            new = missing[first]
+            self.edges.append(xy_u[new], xy_v[new])
+            ids = self.edges.find_all(xy_u, xy_v)
+
+        old = self.edges.get(name) if name in self.edges.columns else np.full(len(self.edges), np.nan)
+        if values.dtype.kind in 'iufb':
+            # Sum of the values of every edge
+            unique, inverse = np.unique(ids, return_inverse=True)
+            total = np.zeros(len(unique), dtype=values.dtype)
+            np.add.at(total, inverse, values)
+            self.edges.set(name, np.where(pd.isna(old[unique]), total, old[unique] + total), unique)
         else:
-            self.net.edges[u, v][name] = attribute
+            for i, value in zip(ids.tolist(), values.tolist()):
+                current = self.edges.get(name)[i] if name in self.edges.columns else old[i]
+                self.edges.set(name, [value if pd.isna(current) else current + value], [i])
 
     def add_edge_attributes(self, pipe_info):
         '''
@@ -640,33 +1440,555 @@ class Net:
 
         Parameters
         ----------
-        pipe_info : DataFrame
-            DataFrame containing pipe information.
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+        '''
+        catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+        if len(self.edges) == 0:
+            return
+
+        attributes = size_pipes(
+            self.edges.get('n_building'),
+            self.edges.get('power [kW]'),
+            self.edges.get('length [m]'),
+            self.edges.get('type', None),
+            self.htemp, self.ltemp, catalog
+        )
+
+        # Add attributes to the edges
+        for name, values in attributes.items():
+            self.edges.set(name, values)
+
+    def shortest_path_tree(self, G, start_points, end_points, powers, weight='length [m]'):
         '''
-        for (u, v, data) in self.net.edges(data=True):
-            n_building = data['n_building']
-            power = data['power [kW]']
-            length = data['length [m]']
-            edge_type = data.get('type', None)
+        Builds the network from a shortest path tree and accumulates power and building count bottom-up.
 
-            GLF = calculate_GLF(n_building)
-            power_GLF = power * GLF
-            volumeflow = calculate_volumeflow(power_GLF, self.htemp, self.ltemp)
-            diameter, velocity, loss, loss_extra = calculate_diameter_velocity_loss(volumeflow, self.htemp, self.ltemp, length, pipe_info, edge_type)
-            
-            # Add attributes to the edges
-            data['GLF'] = GLF
-            data['power_GLF [kW]'] = power_GLF
-            data['Volumeflow [l/s]'] = volumeflow
-            data['DN [mm]'] = diameter
-            data['velocity [m/s]'] = velocity
-            data['loss [kWh/a]'] = loss
-            data['loss_extra_insulation [kWh/a]'] = loss_extra
+        One Dijkstra run from the sources yields a predecessor for every reachable node. The power and building count
+        of each end point are then pushed from the leaves towards the sources, so every edge of the tree is visited
+        exactly once. With several sources every building is supplied by its closest source and the edges get the
+        attribute 'source_id' with the position of that source in start_points.
+
+        Parameters
+        ----------
+        G : nx.Graph or StreetGraph
+            The street network graph.
+        start_points : list of tuple
+            Coordinates of the source nodes.
+        end_points : list of tuple
+            Coordinates of the building nodes.
+        powers : list of float
+            Power of each building.
+        weight : str, optional
+            Edge weight attribute for shortest path calculation (default is 'length [m]').
+
+        Returns
+        -------
+        list
+            Indices of the end points which are not connected to any source.
+        '''
+        if isinstance(G, StreetGraph):
+            return self._street_graph_tree(G, start_points, end_points, powers)
+
+        start_points = graph_nodes(G, start_points)
+        end_points = graph_nodes(G, end_points)
+        for start_point in start_points:
+            if start_point not in G:
+                raise nx.NodeNotFound(f'Source {start_point} not in graph')
+
+        if len(start_points) == 1:
+            pred, dist = nx.dijkstra_predecessor_and_distance(G, start_points[0], weight=weight)
+        else:
+            # Temporary node connected to all sources, one Dijkstra run from it finds the closest source of every node
+            super_source = object()
+            G.add_edges_from((super_source, start_point, {weight: 0}) for start_point in start_points)
+            try:
+                pred, dist = nx.dijkstra_predecessor_and_distance(G, super_source, weight=weight)
+            finally:
+                G.remove_node(super_source)
+
+        # Power and building count per node, several buildings may share one node
+        node_power = {}
+        node_count = {}
+        unreachable = []
+        for i, (end_point, power) in enumerate(zip(end_points, powers)):
+            if end_point not in dist:
+                unreachable.append(i)
+                continue
+            node_power[end_point] = node_power.get(end_point, 0) + power
+            node_count[end_point] = node_count.get(end_point, 0) + 1
+
+        # Collect the tree nodes on the way from the buildings to the sources
+        origin = {start_point: i for i, start_point in enumerate(start_points)}
+        parents = {}
+        for end_point in node_count:
+            path = []
+            node = end_point
+            while node not in origin:
+                parents[node] = pred[node][0]
+                path.append(node)
+                node = parents[node]
+            for path_node in path:
+                origin[path_node] = origin[node]
+
+        # Number of children per node which still have to be processed
+        pending = {}
+        for parent in parents.values():
+            pending[parent] = pending.get(parent, 0) + 1
+
+        # Visit nodes from the leaves to the sources and push the subtree sums to the predecessor
+        stack = [node for node in parents if node not in pending]
+        tree = []
+        while stack:
+            node = stack.pop()
+            parent = parents[node]
+
+            # Copy all edge attributes
+            data = dict(G.edges[parent, node])
+            data['power [kW]'] = node_power.get(node, 0)
+            data['n_building'] = node_count.get(node, 0)
+            if len(start_points) > 1:
+                data['source_id'] = origin[node]
+            tree.append((parent, node, data))
+
+            node_power[parent] = node_power.get(parent, 0) + node_power.get(node, 0)
+            node_count[parent] = node_count.get(parent, 0) + node_count.get(node, 0)
+
+            pending[parent] -= 1
+            if pending[parent] == 0 and parent in parents:
+                stack.append(parent)
+
+        self._append_edges(tree)
+        return unreachable
+
+    def _append_edges(self, edges):
+        '''
+        Appends edges as (u, v, data) to the edge table, see EdgeTable.from_edges.
+        '''
+        table = EdgeTable.from_edges(edges)
+        self.edges.append(table.coords[:, 0], table.coords[:, 1], table.columns)
+
+    def _street_graph_tree(self, G, start_points, end_points, powers):
+        '''
+        Builds the network from the shortest path tree of a StreetGraph, see shortest_path_tree.
+        '''
+        sources = G.node_ids(start_points)
+        if (sources < 0).any():
+            raise ValueError(f'Source {start_points[np.flatnonzero(sources < 0)[0]]} not in graph')
+
+        end_ids = G.node_ids(end_points)
+
+        # Routing on the graph without the inner nodes of street chains, the tree is expanded to all nodes
+        reduced = G.contract(np.concatenate([sources, end_ids[end_ids >= 0]]))
+        dist, pred, origin = reduced.shortest_path_tree(sources)
+
+        reachable = end_ids >= 0
+        reachable[reachable] = np.isfinite(dist[end_ids[reachable]])
+
+        # Power and building count per node, summed over the subtrees
+        values = np.zeros((G.n_nodes, 2))
+        np.add.at(values, end_ids[reachable], np.column_stack([np.asarray(powers, dtype=np.float64)[reachable], np.ones(reachable.sum())]))
+        sums = reduced.subtree_sums(pred, values)
+
+        # Every tree edge which leads to at least one building
+        child = np.flatnonzero((sums[:, 1] > 0) & (pred >= 0))
+        parent = pred[child]
+        edge = G.edge_index(parent, child)
+
+        columns = {
+            'type': G.edge_type[edge],
+            'length [m]': G.length[edge],
+            'power [kW]': sums[child, 0],
+            'n_building': sums[child, 1].astype(np.int64)
+        }
+        if len(start_points) > 1:
+            # Position of the closest source in start_points
+            source_position = np.empty(G.n_nodes, dtype=np.int64)
+            source_position[sources] = np.arange(len(sources))
+            columns['source_id'] = source_position[origin[child]]
+
+        self.edges.append(G.coords[parent], G.coords[child], columns)
+        return np.flatnonzero(~reachable).tolist()
+
+    def scenario_sweep(self, temperatures, pipe_info):
+        '''
+        Sizes the routed network for several temperature scenarios and adds scenario-suffixed edge attributes.
+
+        The network has to be routed before, e.g. by network_analysis. For every scenario the edges get the attributes
+        'DN [mm]', 'velocity [m/s]', 'Volumeflow [l/s]', 'loss [kWh/a]' and 'loss_extra_insulation [kWh/a]' with the
+        suffix of scenario_name, e.g. 'DN [mm] 90/60'. The attributes of the temperatures of the net are not changed.
+
+        Parameters
+        ----------
+        temperatures : list of tuple
+            Supply and return temperature of each scenario, e.g. [(90, 60), (80, 50), (70, 40)].
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+
+        Returns
+        -------
+        DataFrame
+            One row per scenario with the temperatures, the total losses, the maximum velocity and the length of the
+            pipes of each DN in the columns 'length <DN> [m]'.
+        '''
+        catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+        temperatures = [(float(h), float(l)) for h, l in temperatures]
+
+        length = np.asarray(self.edges.get('length [m]'), dtype=float)
+        attributes = size_scenarios(
+            self.edges.get('n_building', 0),
+            self.edges.get('power [kW]', 0),
+            length,
+            self.edges.get('type', None),
+            temperatures, catalog
+        )
+
+        # Add the attributes of all scenarios to the edges
+        for k, (h, l) in enumerate(temperatures):
+            for name in attributes:
+                self.edges.set(f'{name} {scenario_name(h, l)}', attributes[name][:, k])
+
+        # Summary per scenario
+        dn = attributes['DN [mm]']
+        table = pd.DataFrame({
+            'scenario': [scenario_name(h, l) for h, l in temperatures],
+            'supply temperature': [h for h, l in temperatures],
+            'return temperature': [l for h, l in temperatures],
+            'loss [kWh/a]': attributes['loss [kWh/a]'].sum(axis=0),
+            'loss_extra_insulation [kWh/a]': attributes['loss_extra_insulation [kWh/a]'].sum(axis=0),
+            'max velocity [m/s]': attributes['velocity [m/s]'].max(axis=0, initial=0)
+        })
+        for value in catalog.dn:
+            table[f'length {value} [m]'] = ((dn == value) * length[:, None]).sum(axis=0)
+        return table
+
+    def _pipe_arrays(self, catalog, sources, default_di=np.nan):
+        '''
+        Returns the nodes and pipes of the net as arrays.
+
+        Returns
+        -------
+        tuple
+            The node coordinates, the node ids u and v of the edges, the length and the inner diameter of the edges and
+            the node ids of the sources, which are found within the tolerance of a NodeIndex. Edges without a DN of the
+            catalog get default_di.
+        '''
+        coords, u, v = self.edges.node_arrays()
+        length = np.asarray(self.edges.get('length [m]'), dtype=np.float64)
+        di = dict(zip(catalog.dn, catalog.di))
+        di = np.array([di.get(value, default_di) for value in self.edges.get('DN [mm]').tolist()], dtype=np.float64)
+
+        source_nodes = NodeIndex.from_coords(coords).lookup(shapely.get_coordinates(sources.geometry.values))
+        return coords, u, v, length, di, source_nodes[source_nodes >= 0]
+
+    @staticmethod
+    def _source_tree(u, v, length, n_nodes, source_nodes):
+        '''
+        Returns the shortest path tree of the net from the sources.
+
+        Returns
+        -------
+        tuple
+            The predecessor of every node, -1 for sources and unreachable nodes, and the index of the edge from the
+            predecessor to every node, -1 if there is none.
+        '''
+        pred = np.full(n_nodes, -1, dtype=np.int64)
+        if len(source_nodes) > 0 and len(u) > 0:
+            adjacency = coo_matrix((np.concatenate([length, length]), (np.concatenate([u, v]), np.concatenate([v, u]))), shape=(n_nodes, n_nodes)).tocsr()
+            _, pred, _ = dijkstra(adjacency, indices=source_nodes, return_predecessors=True, min_only=True)
+            pred = np.where(pred < 0, -1, pred).astype(np.int64)
+
+        edge_of = np.full(n_nodes, -1, dtype=np.int64)
+        for parent, child in ((u, v), (v, u)):
+            tree_edge = pred[child] == parent
+            edge_of[child[tree_edge]] = np.flatnonzero(tree_edge)
+        return pred, edge_of
+
+    def optimize_pipes(self, pipe_info, costs, sources, max_gradient=300, extra_insulation=False, roughness=0.1):
+        '''
+        Sizes the pipes with the lowest annual cost instead of the smallest suitable DN.
+
+        Every edge is evaluated for every pipe type of the catalog at once: annuity of the investment from costs.xlsx,
+        heat losses from the U-values and pump energy from the pressure loss. Allowed are the types whose maximum volume
+        flow and pressure gradient are not exceeded, and the DN must not increase downstream. Edges without an allowed
+        type keep the type of PipeCatalog.select. The edges get the attributes of size_pipes and 'investment [EUR]'
+        and 'annual_cost [EUR/a]'.
+
+        Parameters
+        ----------
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+        costs : PipeCosts
+            The pipe prices and economic assumptions.
+        sources : GeoDataFrame
+            GeoDataFrame of energy sources.
+        max_gradient : float, optional
+            Highest pressure gradient of the supply line in Pa/m (default is 300).
+        extra_insulation : bool, optional
+            Use the prices and U-values of the pipes with extra insulation (default is False).
+        roughness : float, optional
+            Absolute roughness of the pipe walls in mm (default is 0.1).
+        '''
+        catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+        coords, u, v, length, di, source_nodes = self._pipe_arrays(catalog, sources)
+        if len(self.edges) == 0:
+            return
+
+        # Upstream edge of every tree edge
+        pred, edge_of = self._source_tree(u, v, length, len(coords), source_nodes)
+        child = np.where(pred[v] == u, v, u)
+        parent = np.where(pred[child] >= 0, edge_of[pred[child]], -1)
+        parent[(pred[v] != u) & (pred[u] != v)] = -1
+
+        n_building = self.edges.get('n_building', 0)
+        power = self.edges.get('power [kW]', 0)
+        edge_type = self.edges.get('type', None)
+        house = edge_type == 'Hausanschluss'
+        volumeflow = size_pipes(n_building, power, length, edge_type, self.htemp, self.ltemp, catalog)['Volumeflow [l/s]']
+
+        # Annual cost of every edge for every pipe type and the allowed types
+        cost, gradient = costs.annual_cost(volumeflow, length, house, catalog, self.htemp, self.ltemp, extra_insulation, roughness)
+        allowed = (volumeflow[:, None] <= catalog.max_volumeflow[None, :]) & (gradient <= max_gradient) & np.isfinite(cost)
+        allowed[~house, :catalog.min_index] = False
+        fallback = np.flatnonzero(~allowed.any(axis=1))
+        default = catalog.select(volumeflow[fallback], house[fallback])
+        allowed[fallback, default] = True
+        cost[fallback, default] = np.nan_to_num(cost[fallback, default])
+
+        idx = monotone_sizes(parent, np.where(allowed, cost, np.inf))
+        attributes = size_pipes(n_building, power, length, edge_type, self.htemp, self.ltemp, catalog, idx=idx)
+        rows = np.arange(len(self.edges))
+        attributes['investment [EUR]'] = costs.investment(length, house, extra_insulation)[rows, idx]
+        attributes['annual_cost [EUR/a]'] = cost[rows, idx]
+
+        for name, values in attributes.items():
+            self.edges.set(name, values)
+
+    def add_pressure_loss(self, pipe_info, sources, roughness=0.1):
+        '''
+        Adds the pressure loss of every edge and the cumulative pressure loss from the sources to every node.
+
+        The pressure loss of the sized pipes is calculated with the Darcy-Weisbach equation for the supply line at the
+        supply temperature and the return line at the return temperature. The edges get the attributes
+        'pressure_gradient [Pa/m]' of the supply line, 'pressure_loss [bar]' of supply and return line and
+        'critical_path', which is 1 on the path from the source to the node with the highest cumulative pressure loss.
+        This highest pressure loss is stored in pump_head.
+
+        Parameters
+        ----------
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+        sources : GeoDataFrame
+            GeoDataFrame of energy sources.
+        roughness : float, optional
+            Absolute roughness of the pipe walls in mm (default is 0.1).
+
+        Returns
+        -------
+        GeoDataFrame
+            The nodes of the net with the cumulative 'pressure_loss [bar]' from their source and 'critical_path'.
+        '''
+        catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+        coords, u, v, length, di, source_nodes = self._pipe_arrays(catalog, sources)
+        velocity = np.asarray(self.edges.get('velocity [m/s]', 0), dtype=np.float64)
+        self.pump_head = 0.0
+
+        # Pressure loss of supply and return line
+        gradient = pressure_gradient(velocity, di, self.htemp, roughness)
+        loss = (gradient + pressure_gradient(velocity, di, self.ltemp, roughness)) * length / 1e5
+
+        # Cumulative pressure loss, every tree edge belongs to its child node
+        pred, edge_of = self._source_tree(u, v, length, len(coords), source_nodes)
+        reached = np.flatnonzero(pred >= 0)
+        edge_loss = np.zeros(len(coords))
+        edge_loss[reached] = np.nan_to_num(loss[edge_of[reached]])
+        pressure = path_sums(pred, edge_loss)
+
+        # Critical path to the node with the highest pressure loss
+        path = critical_path(pred, pressure, reached)
+        on_path = np.zeros(len(coords), dtype=np.int64)
+        on_path[path] = 1
+        critical = np.zeros(len(self.edges), dtype=np.int64)
+        critical[edge_of[path[1:]]] = 1
+        if len(path) > 0:
+            self.pump_head = float(pressure[path[-1]])
+
+        self.edges.set('pressure_gradient [Pa/m]', gradient)
+        self.edges.set('pressure_loss [bar]', loss)
+        self.edges.set('critical_path', critical)
+
+        connected = pred >= 0
+        connected[source_nodes] = True
+        return gpd.GeoDataFrame(
+            {'pressure_loss [bar]': np.where(connected, pressure, np.nan), 'critical_path': on_path},
+            geometry=shapely.points(coords), crs=self.crs
+        )
+
+    def add_closures(self, lines):
+        '''
+        Adds ring closures between nodes of the net, which turn the routed tree into a net with loops.
+
+        The first and last point of every line are snapped to the closest node of the net, so the lines can be drawn
+        in a line layer between junctions of the net. Lines whose ends are snapped to the same node or to the nodes of
+        an existing edge are skipped. The closures get the type 'Ringschluss' and the length of their line, but no
+        pipe sizes. They are only calculated by solve_hydraulics, which gives them the smallest DN for streets.
+
+        Parameters
+        ----------
+        lines : GeoSeries
+            Line geometries of the closures.
 
-    def network_analysis(self, G, buildings, sources, pipe_info, power_att, weight='length [m]', progressBar=None):
+        Returns
+        -------
+        ndarray
+            Ids of the new edges.
+        '''
+        coords = self.edges.node_arrays()[0]
+        if len(coords) == 0 or len(lines) == 0:
+            return np.empty(0, dtype=np.int64)
+        nodes = shapely.STRtree(shapely.points(coords))
+        geometry = lines.values
+        start = nodes.nearest(shapely.get_point(geometry, 0))
+        end = nodes.nearest(shapely.get_point(geometry, -1))
+
+        # One closure per pair of nodes which are not connected by an edge yet
+        new = (start != end) & (self.edges.find_all(coords[start], coords[end]) < 0)
+        pairs = np.sort(np.column_stack([start, end]), axis=1)
+        first = np.flatnonzero(new)
+        first = first[np.sort(np.unique(pairs[first], axis=0, return_index=True)[1])]
+
+        return self.edges.append(coords[start[first]], coords[end[first]], {
+            'type': np.full(len(first), 'Ringschluss', dtype=object),
+            'length [m]': shapely.length(geometry[first])
+        })
+
+    def solve_hydraulics(self, pipe_info, sources, roughness=0.1):
+        '''
+        Calculates the flows and pressures of a net with loops, e.g. a tree with ring closures of add_closures.
+
+        The demand of the nodes is taken from the sized tree: every sized edge carries its 'Volumeflow [l/s]' from its
+        parent to its child node, and every node draws the difference between the flows which enter and leave it. On a
+        tree the flows and pressure losses therefore equal those of add_pressure_loss, which include the simultaneity
+        factor of every edge. Junctions can get a negative demand, because the simultaneity factor decreases with the
+        number of buildings. The flows are distributed over the loops by solve_network with the pressure losses of
+        supply and return line. Edges without DN, e.g. ring closures, get the smallest DN for streets of the catalog.
+        The edges get the attributes 'loop_flow [l/s]', 'loop_velocity [m/s]' and 'loop_loss [bar]' of supply and
+        return line, the flows are absolute values.
+
+        Parameters
+        ----------
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+        sources : GeoDataFrame
+            GeoDataFrame of energy sources.
+        roughness : float, optional
+            Absolute roughness of the pipe walls in mm (default is 0.1).
+
+        Returns
+        -------
+        GeoDataFrame
+            The nodes of the net with the 'pressure_loss [bar]' from the sources.
+        '''
+        catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+        coords, u, v, length, di, source_nodes = self._pipe_arrays(catalog, sources, catalog.di[catalog.min_index])
+
+        # Design flows of the sized tree edges, closures carry no flow in the tree
+        design_flow = np.asarray(self.edges.get('Volumeflow [l/s]'), dtype=np.float64)
+        sized = np.flatnonzero(np.isfinite(design_flow))
+        pred, edge_of = self._source_tree(u[sized], v[sized], length[sized], len(coords), source_nodes)
+        child = np.flatnonzero(pred >= 0)
+        tree_flow = design_flow[sized[edge_of[child]]]
+        demand = np.zeros(len(coords))
+        np.add.at(demand, child, tree_flow)
+        np.add.at(demand, pred[child], -tree_flow)
+
+        flow, pressure_loss, iterations = solve_network(np.column_stack([u, v]), length, di, demand, source_nodes, (self.htemp, self.ltemp), roughness)
+        velocity = np.abs(flow) / 1000 / (np.pi * (di / 1000) ** 2 / 4)
+        loss = np.zeros(len(self.edges))
+        if len(self.edges) > 0:
+            loss = np.abs(pressure_loss[u] - pressure_loss[v])
+        self.pump_head = float(np.nanmax(pressure_loss, initial=0))
+
+        self.edges.set('loop_flow [l/s]', np.abs(flow))
+        self.edges.set('loop_velocity [m/s]', velocity)
+        self.edges.set('loop_loss [bar]', loss)
+
+        return gpd.GeoDataFrame({'pressure_loss [bar]': pressure_loss}, geometry=shapely.points(coords), crs=self.crs)
+
+    def thermal_simulation(self, pipe_info, sources, load_factor, ground_temp=10, htemp=None, ltemp=None, extra_insulation=False, chunk_size=168):
+        '''
+        Simulates the supply temperatures and heat losses of the routed tree for every hour of a load profile.
+
+        The volume flow of every edge is its 'power_GLF [kW]' times the load factor of the hour. The supply temperature
+        drops along every pipe depending on flow, U-value and ground temperature and is propagated from the sources to
+        the buildings, see thermal.simulate_tree. The edges get the attribute 'min_supply_temp [°C]' with the lowest
+        supply temperature of the year at their downstream end.
+
+        Parameters
+        ----------
+        pipe_info : DataFrame or PipeCatalog
+            DataFrame containing pipe information or the already compiled PipeCatalog.
+        sources : GeoDataFrame
+            GeoDataFrame of energy sources.
+        load_factor : array_like
+            Share of the design power in each hour, e.g. the hourly demand of all buildings divided by its maximum.
+        ground_temp : float or array_like, optional
+            Temperature of the ground, constant or one value per hour (default is 10).
+        htemp : float or array_like, optional
+            Supply temperature, constant or one value per hour (default is None, the supply temperature of the net).
+        ltemp : float or array_like, optional
+            Return temperature, constant or one value per hour (default is None, the return temperature of the net).
+        extra_insulation : bool, optional
+            Use the U-values of the pipes with extra insulation (default is False).
+        chunk_size : int, optional
+            Number of hours which are calculated at once (default is 168, one week).
+
+        Returns
+        -------
+        DataFrame
+            One row per hour with 'loss [kW]', 'supply_loss [kW]', 'return_loss [kW]' and 'min_supply_temperature [°C]'
+            of the buildings.
+        '''
+        missing = [name for name in ('type', 'DN [mm]', 'power_GLF [kW]') if name not in self.edges.columns]
+        if missing:
+            raise ValueError(f'The net has no attribute {", ".join(missing)}, it has to be sized before the simulation.')
+        catalog = pipe_info if isinstance(pipe_info, PipeCatalog) else PipeCatalog(pipe_info)
+        htemp = self.htemp if htemp is None else htemp
+        ltemp = self.ltemp if ltemp is None else ltemp
+        coords, u, v, length, di, source_nodes = self._pipe_arrays(catalog, sources)
+
+        # Values of the tree edge to every node, edges without power like ring closures are not part of the tree
+        power = np.asarray(self.edges.get('power_GLF [kW]'), dtype=np.float64)
+        sized = np.flatnonzero(np.isfinite(power))
+        pred, edge_of = self._source_tree(u[sized], v[sized], length[sized], len(coords), source_nodes)
+        edge_of = np.where(edge_of >= 0, sized[np.maximum(edge_of, 0)], -1)
+        u_value = dict(zip(catalog.dn, catalog.u_plus if extra_insulation else catalog.u))
+        ua = np.array([u_value.get(value, 0) for value in self.edges.get('DN [mm]').tolist()], dtype=np.float64) * length
+        tree = edge_of >= 0
+        node_ua = np.zeros(len(coords))
+        node_ua[tree] = ua[edge_of[tree]]
+        node_power = np.zeros(len(coords))
+        node_power[tree] = power[edge_of[tree]]
+
+        # Buildings are the ends of house connections
+        degree = np.bincount(np.concatenate([u, v]), minlength=len(coords))
+        house = self.edges.get('type', None) == 'Hausanschluss'
+        buildings = np.where(degree[v] == 1, v, u)[house]
+
+        result = simulate_tree(pred, node_ua, node_power, load_factor, htemp, ltemp, ground_temp, buildings, chunk_size)
+
+        child = np.where(pred[v] == u, v, u)
+        self.edges.set('min_supply_temp [°C]', result['min_temperature [°C]'][child])
+
+        return pd.DataFrame({name: result[name] for name in ['loss [kW]', 'supply_loss [kW]', 'return_loss [kW]', 'min_supply_temperature [°C]']})
+
+    def network_analysis(self, G, buildings, sources, pipe_info, power_att, weight='length [m]', progressBar=None, routing='tree'):
         '''
         Calculates the network by finding the shortest path to each building.
 
+        With several sources and tree routing, every building is connected to its closest source. The edges get the
+        attribute 'source_id' with the position of their source in the sources GeoDataFrame. All edges are sized at
+        once, the simultaneity factor of every edge only depends on its own building count.
+
         Parameters
         ----------
         G : nx.Graph
@@ -683,12 +2005,28 @@ class Net:
             Edge weight attribute for shortest path calculation (default is 'length [m]').
         progressBar : callable, optional
             Progress bar function (default is None).
+        routing : str, optional
+            'tree' computes one shortest path tree from the source for all buildings, 'paths' runs a separate
+            shortest path search for every building from the first source (default is 'tree').
         '''
 
-        start_point = (sources['geometry'][0].x, sources['geometry'][0].y)
+        if routing == 'tree':
+            start_points = [(source.x, source.y) for source in sources['geometry']]
+            end_points = [(centroid.x, centroid.y) for centroid in buildings['centroid']]
+            unreachable = self.shortest_path_tree(G, start_points, end_points, buildings[power_att].tolist(), weight=weight)
+            for i in unreachable:
+                print(f'No connection for:\n{buildings.iloc[i]}')
 
+            # Add GLF, diameter, velocity, and loss attributes
+            self.add_edge_attributes(pipe_info)
+            return
+
+        start_point = graph_nodes(G, [(sources['geometry'][0].x, sources['geometry'][0].y)])[0]
+
+        # Edges of all paths, the power and building count are summed up before the edges are added to the table
+        path_edges = {}
         for idx, row in buildings.iterrows():
-            end_point = (row['centroid'].x, row['centroid'].y)
+            end_point = graph_nodes(G, [(row['centroid'].x, row['centroid'].y)])[0]
             power = row[power_att]
             buildings_count = 1
             try:
@@ -700,23 +2038,31 @@ class Net:
                     u, v = path[i], path[i+1]
 
                     # Copy all edge attributes
-                    self.net.add_edge(u, v, **G.edges[u, v])
+                    key = frozenset([u, v])
+                    if key not in path_edges:
+                        path_edges[key] = (u, v, dict(G.edges[u, v], **{'power [kW]': 0, 'n_building': 0}))
 
                     # Update attributes
-                    self.update_attribute(u, v, power, 'power [kW]')    
-                    self.update_attribute(u, v, buildings_count, 'n_building')
+                    data = path_edges[key][2]
+                    data['power [kW]'] += power
+                    data['n_building'] += buildings_count
             except Exception as e: 
                 print(f'No connection for:\n{row}')
                 print(f'Error {e}')
                 #sys.exit()
+
+        self._append_edges(path_edges.values())
             
         # Add GLF, diameter, velocity, and loss attributes
         self.add_edge_attributes(pipe_info)      
 
-    def plot_network(self, streets, buildings, sources, filename, title='Straßennetzwerk und berechnetes Netz'):
+    def plot_network(self, streets, buildings, sources, filename, title='Straßennetzwerk und berechnetes Netz', max_segments=200000):
         '''
         Plots the street network, buildings, and calculated network, and saves the image.
 
+        Streets and net are drawn as line collections, which are decimated for very large networks, see draw_segments.
+        The image is only saved, not shown, so the call does not block.
+
         Parameters
         ----------
         streets : GeoDataFrame
@@ -729,15 +2075,14 @@ class Net:
             File name to save the image.
         title : str, optional
             Title of the plot (default is 'Street network and calculated network').
+        max_segments : int, optional
+            Number of segments of the streets and of the net above which they are decimated (default is 200000).
         '''
-        # Node positions
-        pos = {node: (node[0], node[1]) for node in self.net.nodes}
-
         # Create figure and axes
-        fig, ax = plt.subplots(figsize=(15, 15))
+        fig, ax = map_figure(title)
 
         # Plot streets
-        streets.plot(ax=ax, edgecolor='gray', zorder=1)
+        draw_segments(ax, line_segments(streets.geometry.values), 'gray', max_segments=max_segments, zorder=1)
 
         # Plot buildings
         buildings.plot(ax=ax, facecolor='#ff8888', edgecolor='black', zorder=2)
@@ -746,46 +2091,29 @@ class Net:
         sources.plot(ax=ax, marker='o', markersize=15, color='green', zorder=3)
 
         # Plot network
-        nx.draw_networkx_edges(self.net, pos=pos, ax=ax, edge_color='blue', width=1.0)
+        draw_segments(ax, self.edges.coords, 'blue', max_segments=max_segments, zorder=2)
 
-        # Enable grid and axis title
+        # Enable grid
         #ax.grid(True)
-        ax.set_title(title)
 
         # Save plot
-        plt.savefig(filename, bbox_inches='tight')
-
-        # Show plot
-        plt.show()
+        fig.savefig(filename, bbox_inches='tight')
 
     def ensure_power_attribute(self):
         """
         Ensures that each edge in the graph has the 'power' attribute.
         If an edge does not have the attribute, it is initialized with a value of 0.
         """
-        for u, v in self.net.edges():
-            if 'power [kW]' not in self.net[u][v]:
-                self.net[u][v]['power [kW]'] = 0
+        self.edges.set('power [kW]', self.edges.get('power [kW]', 0))
 
     def graph_to_gdf(self):
         '''
-        Converts a NetworkX graph to a GeoDataFrame, including edge attributes.
-        '''
-        geometries = []
-        attributes = {}
-
-        for u, v, data in self.net.edges(data=True):
-            geometries.append(LineString([u, v]))
+        Converts the edge table to a GeoDataFrame, including edge attributes.
 
-            # Collect attributes for each edge
-            for key, value in data.items():
-                if key in attributes:
-                    attributes[key].append(value)
-                else:
-                    attributes[key] = [value]
-
-        # Create a GeoDataFrame from LineString objects and attributes
-        self.gdf = gpd.GeoDataFrame(attributes, geometry=geometries, crs=self.crs)
+        Edges without power or building count get 0, so ensure_power_attribute is not needed before the export. The
+        columns of the GeoDataFrame share the memory of the edge table where possible.
+        '''
+        self.gdf = self.edges.to_gdf(self.crs, defaults={'power [kW]': 0, 'n_building': 0})
 
 class Result:
     '''
@@ -804,6 +2132,8 @@ class Result:
         Creates a dictionary for the results to be used in Excel.
     create_df_from_dataDict(net_name='Netz'):
         Converts the dictionary to a result DataFrame.
+    set_annual_loss(hourly_loss, hourly_loss_extra):
+        Replaces the static losses per diameter with the annual loss of an hourly simulation.
     save_in_excel(col=0, index_bool=False, sheet_option='replace', sheet='Zusammenfassung'):
         Saves the DataFrame to an Excel sheet.
     '''
@@ -827,8 +2157,8 @@ class Result:
         ----------
         buildings : DataFrame
             DataFrame of buildings.
-        net : DataFrame
-            DataFrame of the network.
+        net : DataFrame, EdgeTable or Net
+            DataFrame of the network or the network itself, whose edge table is used without copying the columns.
         types : list
             List of building types.
         dn_list : list
@@ -900,8 +2230,10 @@ class Result:
         # Sort
         df_sorted = df.sort_values(by='Lastprofil', key=lambda x: x.map({val: i for i, val in enumerate(types)}))
 
-        # kW in MW
-        gdf = net.copy()
+        # kW in MW, the new columns do not change the edges of the net
+        if isinstance(net, Net):
+            net = net.edges
+        gdf = net.to_frame() if isinstance(net, EdgeTable) else net.copy(deep=False)
         gdf['power_GLF [MW]'] = gdf['power_GLF [kW]']/1000 
         gdf['loss [MWh/a]'] = gdf['loss [kWh/a]']/1000 
         gdf['loss_extra_insulation [MWh/a]'] = gdf['loss_extra_insulation [kWh/a]']/1000 
@@ -947,7 +2279,30 @@ class Result:
         df = pd.concat([df, df_sum])
 
         self.gdf = df
-    
+
+    def set_annual_loss(self, hourly_loss, hourly_loss_extra):
+        '''
+        Replaces the static losses per diameter with the annual loss of an hourly simulation.
+
+        The static losses assume the mean temperature in every hour of the year. The simulated loss is split over the
+        diameters in proportion to their static loss, which is their share of U-value times length, so the sum row is
+        still the sum of the diameters.
+
+        Parameters
+        ----------
+        hourly_loss : array_like
+            Loss of the net in every hour in kW, e.g. 'loss [kW]' of Net.thermal_simulation.
+        hourly_loss_extra : array_like
+            Loss of the net with extra insulation in every hour in kW.
+        '''
+        rows = self.gdf.index != 'Summe'
+        for column, hourly in (('Verlust [MWh/a]', hourly_loss), ('Verlust bei extra Daemmung [MWh/a]', hourly_loss_extra)):
+            static = self.gdf.loc[rows, column].astype(float)
+            total = np.sum(hourly) / 1000 # kWh in MWh
+            share = static / static.sum() if static.sum() > 0 else static * 0
+            self.gdf.loc[rows, column] = share * total
+            self.gdf.loc['Summe', column] = self.gdf.loc[rows, column].sum()
+
     def save_in_excel(self, result_table, col = 0, row = 0, index_bool=False, sheet_option ='replace', sheet = 'Zusammenfassung'):
         '''
         Saves the DataFrame to an Excel sheet.
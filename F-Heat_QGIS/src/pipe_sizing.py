@@ -0,0 +1,263 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .hydraulics import pressure_gradient
+from .street_graph import tree_depth
+
+def annuity_factor(interest, years):
+    '''
+    Calculate the annuity factor of an investment.
+
+    Parameters
+    ----------
+    interest : float
+        Interest rate, e.g. 0.04.
+    years : int
+        Depreciation period in years.
+
+    Returns
+    -------
+    float
+        Share of the investment which has to be paid every year.
+    '''
+    if interest == 0:
+        return 1 / years
+    q = (1 + interest) ** years
+    return interest * q / (q - 1)
+
+class PipeCosts:
+    '''
+    The pipe prices of costs.xlsx for every pipe type of a PipeCatalog and the economic assumptions of the sizing.
+
+    Attributes
+    ----------
+    street, street_extra : ndarray
+        Price per trench metre of supply and return pipe with standard and extra insulation, nan if not available.
+    house, house_extra : ndarray
+        Price of a house connection up to base_length with standard and extra insulation, nan if not available.
+    house_per_m, house_per_m_extra : ndarray
+        Additional or reduced price per metre of a house connection longer or shorter than base_length.
+    base_length : float
+        Length of a house connection included in its price in m.
+    heat_price : float
+        Price of the heat losses in €/kWh.
+    electricity_price : float
+        Price of the pump energy in €/kWh.
+    interest : float
+        Interest rate of the investment.
+    years : int
+        Depreciation period of the pipes in years.
+    pump_efficiency : float
+        Efficiency of the pumps.
+    pump_hours : float
+        Equivalent full load hours of the pumps at design flow per year.
+
+    Methods
+    -------
+    investment(length, house_connection, extra_insulation=False):
+        Returns the investment of every edge for every pipe type.
+    annual_cost(volumeflow, length, house_connection, catalog, htemp, ltemp, extra_insulation=False, roughness=0.1):
+        Returns the annual cost of every edge for every pipe type.
+    '''
+
+    def __init__(self, path, catalog, heat_price=0.08, electricity_price=0.3, interest=0.04, years=40, pump_efficiency=0.7, pump_hours=2000, base_length=15):
+        '''
+        Reads the pipe prices from the sheet 'Rohrpreise' of costs.xlsx.
+
+        The sheet contains four blocks of rows labelled e.g. 'DN 25 (PEX 32*2,9mm)*': street pipes with standard and
+        extra insulation and house connections with standard and extra insulation. Labels ending with '**' are steel
+        pipes (KMR), the others PEX pipes, they are matched to the DN of the catalog, e.g. 'PEX 25' or 'KMR 100'.
+
+        Parameters
+        ----------
+        path : str or Path
+            Path of costs.xlsx.
+        catalog : PipeCatalog
+            The compiled pipe information.
+        heat_price : float, optional
+            Price of the heat losses in €/kWh (default is 0.08).
+        electricity_price : float, optional
+            Price of the pump energy in €/kWh (default is 0.3).
+        interest : float, optional
+            Interest rate of the investment (default is 0.04).
+        years : int, optional
+            Depreciation period of the pipes in years (default is 40).
+        pump_efficiency : float, optional
+            Efficiency of the pumps (default is 0.7).
+        pump_hours : float, optional
+            Equivalent full load hours of the pumps at design flow per year (default is 2000).
+        base_length : float, optional
+            Length of a house connection included in its price in m (default is 15).
+        '''
+        sheet = pd.read_excel(path, sheet_name='Rohrpreise', header=None)
+        labels = sheet[0].astype(str).str.strip()
+        is_price = labels.str.match(r'DN \d+').to_numpy()
+
+        # Contiguous blocks of price rows
+        rows = np.flatnonzero(is_price)
+        blocks = np.split(rows, np.flatnonzero(np.diff(rows) > 1) + 1)
+        if len(blocks) < 4:
+            raise ValueError(f'Expected four blocks of pipe prices in {path}, found {len(blocks)}.')
+
+        position = {str(dn): i for i, dn in enumerate(catalog.dn)}
+
+        def prices(block, column):
+            values = np.full(len(catalog.dn), np.nan)
+            for row in block:
+                label = labels.iloc[row]
+                material = 'KMR' if label.endswith('**') else 'PEX'
+                number = re.match(r'DN (\d+)', label).group(1)
+                key = f'{material} {number}'
+                if key in position:
+                    values[position[key]] = float(sheet.iloc[row, column])
+            return values
+
+        self.street = prices(blocks[0], 2)
+        self.street_extra = prices(blocks[1], 2)
+        self.house = prices(blocks[2], 2)
+        self.house_extra = prices(blocks[3], 2)
+        self.house_per_m = prices(blocks[2], 7)
+        self.house_per_m_extra = prices(blocks[3], 7)
+        self.base_length = base_length
+
+        self.heat_price = heat_price
+        self.electricity_price = electricity_price
+        self.interest = interest
+        self.years = years
+        self.pump_efficiency = pump_efficiency
+        self.pump_hours = pump_hours
+
+    def investment(self, length, house_connection, extra_insulation=False):
+        '''
+        Returns the investment of every edge for every pipe type.
+
+        Parameters
+        ----------
+        length : ndarray
+            Length of each edge in m.
+        house_connection : ndarray
+            Boolean mask of the house connections.
+        extra_insulation : bool, optional
+            Use the prices of the pipes with extra insulation (default is False).
+
+        Returns
+        -------
+        ndarray
+            Investment in € with shape (edges, pipe types), nan where the pipe type has no price.
+        '''
+        length = np.asarray(length, dtype=np.float64)[:, None]
+        street = self.street_extra if extra_insulation else self.street
+        house = self.house_extra if extra_insulation else self.house
+        house_per_m = self.house_per_m_extra if extra_insulation else self.house_per_m
+        return np.where(
+            np.asarray(house_connection, dtype=bool)[:, None],
+            house[None, :] + (length - self.base_length) * house_per_m[None, :],
+            street[None, :] * length
+        )
+
+    def annual_cost(self, volumeflow, length, house_connection, catalog, htemp, ltemp, extra_insulation=False, roughness=0.1):
+        '''
+        Returns the annual cost of every edge for every pipe type: annuity of the investment, heat losses and pump
+        energy at design flow.
+
+        Parameters
+        ----------
+        volumeflow : ndarray
+            Design volume flow of each edge in l/s.
+        length : ndarray
+            Length of each edge in m.
+        house_connection : ndarray
+            Boolean mask of the house connections.
+        catalog : PipeCatalog
+            The compiled pipe information.
+        htemp : float
+            Supply temperature.
+        ltemp : float
+            Return temperature.
+        extra_insulation : bool, optional
+            Use the prices and U-values of the pipes with extra insulation (default is False).
+        roughness : float, optional
+            Absolute roughness of the pipe walls in mm (default is 0.1).
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - cost (ndarray): Annual cost in €/a with shape (edges, pipe types), nan where the pipe type has no price.
+            - gradient (ndarray): Pressure gradient of the supply line in Pa/m with shape (edges, pipe types).
+        '''
+        volumeflow = np.asarray(volumeflow, dtype=np.float64)[:, None]
+        length = np.asarray(length, dtype=np.float64)[:, None]
+        velocity = volumeflow * 1000 / (np.pi * (catalog.di[None, :] / 2) ** 2)
+
+        # Heat losses of supply and return line, see size_pipes
+        u = catalog.u_plus if extra_insulation else catalog.u
+        loss = 8760 * 2 * (u[None, :] * ((htemp + ltemp) / 2 - 10) * length) / 1000
+
+        # Pump energy for the pressure loss of supply and return line
+        gradient = pressure_gradient(velocity, catalog.di[None, :], htemp, roughness)
+        pressure_loss = (gradient + pressure_gradient(velocity, catalog.di[None, :], ltemp, roughness)) * length
+        pump = pressure_loss * volumeflow / 1000 / self.pump_efficiency * self.pump_hours / 1000
+
+        cost = (
+            annuity_factor(self.interest, self.years) * self.investment(length[:, 0], house_connection, extra_insulation)
+            + loss * self.heat_price
+            + pump * self.electricity_price
+        )
+        return cost, gradient
+
+def monotone_sizes(parent, cost):
+    '''
+    Chooses one pipe type per edge with the lowest total cost, so that no edge is larger than its upstream edge.
+
+    The pipe types have to be sorted by size. The minimum is found exactly by dynamic programming over the tree: from
+    the leaves to the sources every edge adds, for each pipe type, the cheapest choices of its children which are not
+    larger. From the sources to the leaves every edge then takes its cheapest choice up to the type of its parent.
+
+    Parameters
+    ----------
+    parent : ndarray
+        Index of the upstream edge of each edge, -1 for edges at a source.
+    cost : ndarray
+        Cost of each edge for each pipe type with shape (edges, pipe types), inf for types which are not allowed.
+
+    Returns
+    -------
+    ndarray
+        Index of the pipe type of each edge.
+    '''
+    parent = np.asarray(parent, dtype=np.int64)
+    m, k = cost.shape
+    if m == 0:
+        return np.empty(0, dtype=np.int64)
+
+    # Edges without any allowed type take the largest one
+    cost = np.where(np.isfinite(cost), cost, np.inf)
+    none_allowed = ~np.isfinite(cost).any(axis=1)
+    cost[none_allowed, -1] = 0
+
+    depth = tree_depth(parent)
+    order = np.argsort(depth, kind='stable')
+    levels = np.split(order, np.flatnonzero(np.diff(depth[order])) + 1)
+
+    # Total cost of each edge and its subtree for every type of the edge
+    total = cost.copy()
+    for level in levels[::-1]:
+        if depth[level[0]] == 0:
+            continue
+        np.add.at(total, parent[level], np.minimum.accumulate(total[level], axis=1))
+
+    # Position of the cheapest type up to each type
+    columns = np.broadcast_to(np.arange(k), total.shape)
+    record = np.where(total <= np.minimum.accumulate(total, axis=1), columns, 0)
+    best_up_to = np.maximum.accumulate(record, axis=1)
+
+    choice = np.empty(m, dtype=np.int64)
+    for level in levels:
+        if depth[level[0]] == 0:
+            choice[level] = best_up_to[level, -1]
+        else:
+            choice[level] = best_up_to[level, choice[parent[level]]]
+    return choice
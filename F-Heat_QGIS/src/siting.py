@@ -0,0 +1,128 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from .net_analysis import StreetSegmentIndex
+from .street_graph import subtree_sums
+
+def _score_sites(task):
+    '''
+    Scores a batch of candidate sites on the street graph. Used by rank_sites.
+
+    Parameters
+    ----------
+    task : tuple
+        Adjacency matrix with the candidate sites as additional nodes, node ids of the sites, distance of each site to
+        its street edge, node of each building and demand of each building.
+
+    Returns
+    -------
+    ndarray
+        For every site the demand-weighted distance, the trench length of the shortest path tree to all buildings,
+        the unreached demand and the largest distance to a building, shape (sites, 4).
+    '''
+    adjacency, sites, connection, building_node, demand = task
+    dist, pred = dijkstra(adjacency, indices=sites, return_predecessors=True)
+    pred = np.where(pred < 0, -1, pred).astype(np.int64)
+
+    scores = np.empty((len(sites), 4))
+    for k in range(len(sites)):
+        d = dist[k, building_node]
+        reached = np.isfinite(d)
+
+        # Edges of the shortest path tree which lead to buildings, the length of a tree edge is the distance gained
+        count = np.zeros(adjacency.shape[0])
+        np.add.at(count, building_node[reached], 1)
+        count = subtree_sums(pred[k], count)
+        tree = np.flatnonzero((pred[k] >= 0) & (count > 0))
+        trench = (dist[k, tree] - dist[k, pred[k, tree]]).sum()
+
+        # The connection to the street is only built once if the net leaves the site in both directions
+        if (pred[k, tree] == sites[k]).sum() == 2:
+            trench -= connection[k]
+
+        scores[k] = (
+            (demand[reached] * d[reached]).sum(),
+            trench,
+            demand[~reached].sum(),
+            d[reached].max(initial=0)
+        )
+    return scores
+
+def rank_sites(net, candidates, demand=None, batch_size=64):
+    '''
+    Ranks candidate sites of a heat source by the network distance to all connected buildings.
+
+    Every candidate is connected to the closest street edge of the prebuilt street graph of an IncrementalNet, without
+    changing the graph. One shortest path computation per candidate gives the demand-weighted distance to the
+    buildings and the trench length of the shortest path tree to all buildings, as an estimate of the net which
+    network_analysis would route from this site. The candidates are scored in batches, which limits the memory of the
+    distance matrix to batch_size times the number of nodes.
+
+    Parameters
+    ----------
+    net : IncrementalNet
+        The net with the street graph and the snapped buildings.
+    candidates : GeoDataFrame
+        Points of the candidate sites.
+    demand : array_like, optional
+        Demand of each building in the buildings GeoDataFrame of the net (default is None, the power of the net).
+    batch_size : int, optional
+        Number of candidates per shortest path computation (default is 64).
+
+    Returns
+    -------
+    GeoDataFrame
+        The candidates with the columns 'weighted_distance [m]' (demand-weighted mean distance to the reached
+        buildings), 'trench_length [m]', 'max_distance [m]', 'unreached_demand' and 'rank', sorted by rank. Sites which
+        reach more demand rank first, then sites with the lower weighted distance.
+    '''
+    G = net.graph.graph
+    demand = np.asarray(net.power if demand is None else demand, dtype=np.float64)
+    result = candidates.copy()
+    columns = ['weighted_distance [m]', 'trench_length [m]', 'unreached_demand', 'max_distance [m]']
+    if len(candidates) == 0:
+        for name in columns + ['rank']:
+            result[name] = []
+        return result
+
+    # Connected buildings
+    buildings = np.flatnonzero(net.building_active & (net.building_node >= 0))
+    building_node = net.building_node[buildings]
+    demand = demand[buildings]
+
+    # Closest street edge of every candidate, the index of the segments are the edge ids
+    street_edges = np.flatnonzero(G.street_id >= 0)
+    segments = gpd.GeoDataFrame(geometry=shapely.linestrings(G.coords[G.edges[street_edges]]), index=street_edges)
+    segment_index = StreetSegmentIndex(segments)
+    xy = shapely.get_coordinates(candidates.geometry.values).reshape(-1, 2)
+    segment, closest, distance = segment_index.nearest(shapely.points(xy))
+    edge = segment_index.street_id[segment]
+
+    # Every candidate becomes a node connected to both ends of its street edge
+    n = G.n_nodes
+    k = len(candidates)
+    sites = np.arange(n, n + k)
+    a = G.edges[edge, 0].astype(np.int64)
+    b = G.edges[edge, 1].astype(np.int64)
+    weight_a = distance + np.hypot(*(closest - G.coords[a]).T)
+    weight_b = distance + np.hypot(*(closest - G.coords[b]).T)
+    base = G.csr.tocoo()
+    row = np.concatenate([base.row, sites, sites, a, b])
+    col = np.concatenate([base.col, a, b, sites, sites])
+    data = np.concatenate([base.data, weight_a, weight_b, weight_a, weight_b])
+    adjacency = coo_matrix((data, (row, col)), shape=(n + k, n + k)).tocsr()
+
+    scores = np.concatenate([
+        _score_sites((adjacency, sites[i:i + batch_size], distance[i:i + batch_size], building_node, demand))
+        for i in range(0, k, batch_size)
+    ])
+
+    reached_demand = demand.sum() - scores[:, 2]
+    scores[:, 0] = np.divide(scores[:, 0], reached_demand, out=np.full(k, np.inf), where=reached_demand > 0)
+    for name, values in zip(columns, scores.T):
+        result[name] = values
+    result['rank'] = np.argsort(np.lexsort((scores[:, 0], scores[:, 2]))) + 1
+    return result.sort_values('rank')
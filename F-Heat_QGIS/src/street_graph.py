@@ -0,0 +1,873 @@
+import geopandas as gpd
+import numpy as np
+import shapely
+import networkx as nx
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra, connected_components
+
+def tree_depth(pred):
+    '''
+    Calculate the depth of every node in a shortest path tree.
+
+    Parameters
+    ----------
+    pred : ndarray
+        Predecessor of every node, -1 for the root and for unreachable nodes.
+
+    Returns
+    -------
+    ndarray
+        Number of edges between each node and the root of its tree.
+
+    Notes
+    -----
+    The depth is computed by pointer jumping, so the number of vectorized steps only grows with the logarithm
+    of the tree depth.
+    '''
+    depth = (pred >= 0).astype(np.int64)
+    jump = pred.astype(np.int64)
+    active = np.flatnonzero(jump >= 0)
+    while len(active):
+        depth[active] = depth[active] + depth[jump[active]]
+        jump[active] = jump[jump[active]]
+        active = active[jump[active] >= 0]
+    return depth
+
+def path_sums(pred, values):
+    '''
+    Sum edge values along the paths from the roots of a shortest path tree to every node.
+
+    Parameters
+    ----------
+    pred : ndarray
+        Predecessor of every node, -1 for the root and for unreachable nodes.
+    values : ndarray
+        Value of the tree edge from the predecessor to each node, values of roots are ignored.
+
+    Returns
+    -------
+    ndarray
+        For every node the sum of the values of all edges between the root and the node.
+
+    Notes
+    -----
+    Like tree_depth the sums are computed by pointer jumping.
+    '''
+    sums = np.where(pred >= 0, values, 0).astype(np.float64)
+    jump = pred.astype(np.int64)
+    active = np.flatnonzero(jump >= 0)
+    while len(active):
+        sums[active] = sums[active] + sums[jump[active]]
+        jump[active] = jump[jump[active]]
+        active = active[jump[active] >= 0]
+    return sums
+
+def subtree_sums(pred, values):
+    '''
+    Sum node values over the subtrees of a shortest path tree.
+
+    Parameters
+    ----------
+    pred : ndarray
+        Predecessor of every node, -1 for the root and for unreachable nodes.
+    values : ndarray
+        Values per node, either of shape (n,) or (n, k).
+
+    Returns
+    -------
+    ndarray
+        For every node the sum of its own value and the values of all its descendants.
+    '''
+    sums = np.array(values, dtype=np.float64, copy=True)
+    depth = tree_depth(pred)
+
+    # Process the tree level by level from the leaves to the root
+    order = np.argsort(depth, kind='stable')[::-1]
+    splits = np.flatnonzero(np.diff(depth[order])) + 1
+    for level in np.split(order, splits):
+        if depth[level[0]] == 0:
+            continue
+        np.add.at(sums, pred[level], sums[level])
+    return sums
+
+class NodeIndex:
+    '''
+    A hashed index that identifies nodes by quantized integer grid keys, so nearly coincident vertices become one node.
+
+    Attributes
+    ----------
+    tolerance : float
+        Size of the grid cells in the units of the coordinate reference system.
+    coords : ndarray
+        Coordinates of the nodes with shape (n, 2), the first coordinate added for each node.
+
+    Methods
+    -------
+    add(xy):
+        Adds coordinates and returns their node ids.
+    lookup(xy):
+        Returns the node ids of coordinates without adding new nodes.
+    from_coords(coords, tolerance=0.001):
+        Restores an index from the coordinates of its nodes.
+
+    Notes
+    -----
+    A coordinate belongs to the node of its grid cell. If its cell is empty, a node in one of the eight neighbouring
+    cells within the tolerance is used, so vertices on both sides of a cell border are merged as well.
+    '''
+
+    # Offsets of the neighbouring grid cells
+    _neighbours = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+    def __init__(self, tolerance=0.001):
+        '''
+        Initializes the NodeIndex class with an empty index.
+
+        Parameters
+        ----------
+        tolerance : float, optional
+            Size of the grid cells, e.g. 0.001 for 1 mm in a metric coordinate reference system (default is 0.001).
+        '''
+        if not tolerance > 0:
+            raise ValueError('The tolerance of the node index has to be positive.')
+        self.tolerance = tolerance
+        self._cells = {}
+        self._coords = np.empty((0, 2), dtype=np.float64)
+        self._n = 0
+
+    @property
+    def coords(self):
+        '''
+        Coordinates of the nodes with shape (n, 2).
+        '''
+        return self._coords[:self._n]
+
+    def __len__(self):
+        return self._n
+
+    @classmethod
+    def from_coords(cls, coords, tolerance=0.001):
+        '''
+        Restores an index from the coordinates of its nodes, e.g. from a saved StreetGraph.
+
+        Parameters
+        ----------
+        coords : array_like
+            Coordinates of the nodes with shape (n, 2) as returned by coords.
+        tolerance : float, optional
+            Size of the grid cells the nodes were added with (default is 0.001).
+
+        Returns
+        -------
+        NodeIndex
+            An index with the same node ids.
+        '''
+        index = cls(tolerance)
+        coords = np.array(coords, dtype=np.float64).reshape(-1, 2)
+
+        # The grid cells are only rebuilt when the index is queried
+        index._cells = None
+        index._coords = coords
+        index._n = len(coords)
+        return index
+
+    def _restore_cells(self):
+        '''
+        Rebuilds the grid cells of a restored index. Every node was created in its own cell, so the cells map back to
+        the node ids.
+        '''
+        keys = np.floor(self.coords / self.tolerance + 0.5).astype(np.int64)
+        self._cells = dict(zip(map(tuple, keys.tolist()), range(self._n)))
+
+    def _find(self, key, point):
+        '''
+        Returns the node id for a grid key, looking into the neighbouring cells if the cell itself is empty.
+        '''
+        node = self._cells.get(key)
+        if node is not None:
+            return node
+
+        kx, ky = key
+        for dx, dy in self._neighbours:
+            node = self._cells.get((kx + dx, ky + dy))
+            if node is not None:
+                ref = self._coords[node]
+                if abs(ref[0] - point[0]) <= self.tolerance and abs(ref[1] - point[1]) <= self.tolerance:
+                    return node
+        return None
+
+    def _keys(self, xy):
+        '''
+        Quantizes coordinates to integer grid keys and collapses duplicate keys.
+        '''
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        keys = np.floor(xy / self.tolerance + 0.5).astype(np.int64)
+        keys, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+        return keys, xy[first], inverse.ravel()
+
+    def add(self, xy):
+        '''
+        Adds coordinates and returns their node ids. Coordinates of existing nodes are not added twice.
+
+        Parameters
+        ----------
+        xy : array_like
+            Coordinates with shape (n, 2).
+
+        Returns
+        -------
+        ndarray
+            Node id of each coordinate.
+        '''
+        if self._cells is None:
+            self._restore_cells()
+        keys, points, inverse = self._keys(xy)
+
+        # Grow the coordinate buffer so that every key could become a new node
+        if self._n + len(keys) > len(self._coords):
+            buffer = np.empty((max(2 * len(self._coords), self._n + len(keys)), 2), dtype=np.float64)
+            buffer[:self._n] = self._coords[:self._n]
+            self._coords = buffer
+
+        ids = np.empty(len(keys), dtype=np.int32)
+        for i, (key, point) in enumerate(zip(map(tuple, keys.tolist()), points.tolist())):
+            node = self._find(key, point)
+            if node is None:
+                node = self._n
+                self._cells[key] = node
+                self._coords[node] = point
+                self._n += 1
+            ids[i] = node
+        return ids[inverse]
+
+    def lookup(self, xy):
+        '''
+        Returns the node ids of coordinates without adding new nodes.
+
+        Parameters
+        ----------
+        xy : array_like
+            Coordinates with shape (n, 2).
+
+        Returns
+        -------
+        ndarray
+            Node id of each coordinate, -1 if there is no node within the tolerance.
+        '''
+        if self._cells is None:
+            self._restore_cells()
+        keys, points, inverse = self._keys(xy)
+        ids = np.full(len(keys), -1, dtype=np.int32)
+        for i, (key, point) in enumerate(zip(map(tuple, keys.tolist()), points.tolist())):
+            node = self._find(key, point)
+            if node is not None:
+                ids[i] = node
+        return ids[inverse]
+
+class StreetGraph:
+    '''
+    An array based street network graph with integer node ids and a CSR adjacency matrix.
+
+    Attributes
+    ----------
+    node_index : NodeIndex
+        Index of the nodes by quantized coordinates.
+    coords : ndarray
+        Coordinates of the nodes with shape (n, 2).
+    edges : ndarray
+        Node ids of the edges with shape (m, 2).
+    length : ndarray
+        Length of each edge.
+    edge_type : ndarray
+        Type of each edge, e.g. 'Straßenleitung' or 'Hausanschluss'.
+    street_id : ndarray
+        Index of the street each edge belongs to, -1 for connections.
+    crs : string
+        coordinate reference system
+
+    Methods
+    -------
+    add_nodes(xy):
+        Adds nodes by coordinates and returns their ids.
+    add_edges(xy_u, xy_v, edge_type, street_id=-1):
+        Adds edges between coordinates.
+    remove_edges(edge_ids):
+        Removes edges by their index.
+    node_ids(xy):
+        Returns the ids of existing nodes.
+    edge_index(u, v):
+        Returns the index of the edges between node ids.
+    shortest_path_tree(source):
+        Calculates distances and predecessors from one or several source nodes.
+    contract(keep=None):
+        Contracts the chains of nodes with degree 2 into single edges.
+    connected_components():
+        Labels the connected components of the graph.
+    degree():
+        Returns the degree of every node.
+    to_gdf():
+        Converts the graph edges to a GeoDataFrame.
+    to_networkx():
+        Converts the graph to a NetworkX graph with coordinate tuples as nodes.
+    to_arrays():
+        Returns the nodes and edges as plain arrays, e.g. to save them with numpy.savez.
+    from_arrays(arrays, crs=None):
+        Restores a graph from the arrays of to_arrays.
+    '''
+
+    def __init__(self, crs=None, tolerance=0.001):
+        '''
+        Initializes the StreetGraph class with an empty graph.
+
+        Parameters
+        ----------
+        crs : string, optional
+            coordinate reference system (default is None).
+        tolerance : float, optional
+            Distance up to which vertices are merged into one node (default is 0.001).
+        '''
+        self.crs = crs
+        self.node_index = NodeIndex(tolerance)
+        self.edges = np.empty((0, 2), dtype=np.int32)
+        self.length = np.empty(0, dtype=np.float64)
+        self.edge_type = np.empty(0, dtype=object)
+        self.street_id = np.empty(0, dtype=np.int64)
+        self._csr = None
+
+    @property
+    def coords(self):
+        '''
+        Coordinates of the nodes with shape (n, 2).
+        '''
+        return self.node_index.coords
+
+    @property
+    def n_nodes(self):
+        '''
+        Number of nodes in the graph.
+        '''
+        return len(self.coords)
+
+    @property
+    def n_edges(self):
+        '''
+        Number of edges in the graph.
+        '''
+        self._compact()
+        return len(self.edges)
+
+    @property
+    def nodes(self):
+        '''
+        List of node coordinates as tuples, compatible with the nodes of a NetworkX street graph.
+        '''
+        return list(map(tuple, self.coords.tolist()))
+
+    def add_nodes(self, xy):
+        '''
+        Adds nodes by coordinates and returns their ids. Coordinates within the tolerance of a node are not added again.
+
+        Parameters
+        ----------
+        xy : array_like
+            Coordinates with shape (n, 2).
+
+        Returns
+        -------
+        ndarray
+            Node id of each coordinate.
+        '''
+        return self.node_index.add(xy)
+
+    def add_edges(self, xy_u, xy_v, edge_type, street_id=-1):
+        '''
+        Adds edges between coordinates. Missing nodes are created, an existing edge is replaced.
+
+        Parameters
+        ----------
+        xy_u, xy_v : array_like
+            Coordinates of the edge ends with shape (m, 2).
+        edge_type : str or array_like
+            Type of the edges.
+        street_id : int or array_like, optional
+            Index of the street of the edges (default is -1, no street).
+        '''
+        u = self.add_nodes(xy_u)
+        v = self.add_nodes(xy_v)
+        edge_type = np.broadcast_to(np.asarray(edge_type, dtype=object), u.shape)
+        street_id = np.broadcast_to(np.asarray(street_id, dtype=np.int64), u.shape)
+
+        # Loops do not contribute to the network
+        keep = u != v
+        u, v, edge_type, street_id = u[keep], v[keep], edge_type[keep], street_id[keep]
+
+        length = np.hypot(*(self.coords[u] - self.coords[v]).T)
+
+        self.edges = np.vstack([self.edges, np.column_stack([u, v]).astype(np.int32)])
+        self.length = np.concatenate([self.length, length])
+        self.edge_type = np.concatenate([self.edge_type, edge_type])
+        self.street_id = np.concatenate([self.street_id, street_id])
+        self._csr = None
+
+    def remove_edges(self, edge_ids):
+        '''
+        Removes edges by their index. The nodes are kept, so node ids stay valid.
+
+        Parameters
+        ----------
+        edge_ids : array_like
+            Index of the edges in the edge arrays, e.g. from edge_index. Negative values are ignored.
+        '''
+        self._compact()
+        edge_ids = np.asarray(edge_ids, dtype=np.int64)
+        keep = np.ones(len(self.edges), dtype=bool)
+        keep[edge_ids[edge_ids >= 0]] = False
+
+        self.edges = self.edges[keep]
+        self.length = self.length[keep]
+        self.edge_type = self.edge_type[keep]
+        self.street_id = self.street_id[keep]
+        self._csr = None
+
+    def _compact(self):
+        '''
+        Removes duplicate edges, keeping the last one added, and builds the adjacency matrix and edge lookup.
+        '''
+        if self._csr is not None:
+            return
+
+        n = len(self.coords)
+        u, v = self.edges[:, 0].astype(np.int64), self.edges[:, 1].astype(np.int64)
+        keys = np.minimum(u, v) * n + np.maximum(u, v)
+
+        # Keep the last occurrence of every edge in insertion order
+        _, last = np.unique(keys[::-1], return_index=True)
+        keep = np.sort(len(keys) - 1 - last)
+        self.edges = self.edges[keep]
+        self.length = self.length[keep]
+        self.edge_type = self.edge_type[keep]
+        self.street_id = self.street_id[keep]
+        keys = keys[keep]
+
+        self._edge_order = np.argsort(keys)
+        self._edge_keys = keys[self._edge_order]
+
+        row = np.concatenate([self.edges[:, 0], self.edges[:, 1]])
+        col = np.concatenate([self.edges[:, 1], self.edges[:, 0]])
+        data = np.concatenate([self.length, self.length])
+        self._csr = csr_matrix((data, (row, col)), shape=(n, n))
+
+    @property
+    def csr(self):
+        '''
+        Symmetric adjacency matrix in CSR format with edge lengths as weights.
+        '''
+        self._compact()
+        return self._csr
+
+    def node_ids(self, xy):
+        '''
+        Returns the ids of existing nodes.
+
+        Parameters
+        ----------
+        xy : array_like
+            Coordinates with shape (n, 2).
+
+        Returns
+        -------
+        ndarray
+            Node id of each coordinate, -1 if there is no node within the tolerance.
+        '''
+        return self.node_index.lookup(xy)
+
+    def edge_index(self, u, v):
+        '''
+        Returns the index of the edges between node ids.
+
+        Parameters
+        ----------
+        u, v : array_like
+            Node ids of the edge ends.
+
+        Returns
+        -------
+        ndarray
+            Index of each edge in the edge arrays, -1 if there is no such edge.
+        '''
+        self._compact()
+        u = np.asarray(u, dtype=np.int64)
+        v = np.asarray(v, dtype=np.int64)
+        keys = np.minimum(u, v) * len(self.coords) + np.maximum(u, v)
+        if len(self._edge_keys) == 0:
+            return np.full(keys.shape, -1)
+
+        pos = np.minimum(np.searchsorted(self._edge_keys, keys), len(self._edge_keys) - 1)
+        return np.where(self._edge_keys[pos] == keys, self._edge_order[pos], -1)
+
+    def shortest_path_tree(self, source):
+        '''
+        Calculates distances and predecessors from one or several source nodes.
+
+        Parameters
+        ----------
+        source : int or array_like
+            Id of the source node or ids of several source nodes.
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - dist (ndarray): Distance of each node to its closest source, inf if unreachable.
+            - pred (ndarray): Predecessor of each node, -1 for sources and unreachable nodes.
+            - origin (ndarray): Id of the closest source of each node, -1 if unreachable.
+        '''
+        dist, pred, origin = dijkstra(self.csr, directed=True, indices=np.atleast_1d(source), return_predecessors=True, min_only=True)
+        pred = np.where(pred < 0, -1, pred).astype(np.int32)
+        origin = np.where(origin < 0, -1, origin).astype(np.int32)
+        return dist, pred, origin
+
+    def contract(self, keep=None):
+        '''
+        Contracts the chains of nodes with degree 2 into single edges.
+
+        Parameters
+        ----------
+        keep : array_like, optional
+            Node ids which must not be contracted, e.g. sources and buildings (default is None).
+
+        Returns
+        -------
+        ContractedGraph
+            The reduced graph.
+        '''
+        return ContractedGraph(self, keep)
+
+    def connected_components(self):
+        '''
+        Labels the connected components of the graph.
+
+        Returns
+        -------
+        tuple
+            A tuple containing:
+            - n_components (int): Number of connected components.
+            - labels (ndarray): Component label of each node.
+        '''
+        return connected_components(self.csr, directed=False)
+
+    def degree(self):
+        '''
+        Returns the degree of every node.
+
+        Returns
+        -------
+        ndarray
+            Number of edges at each node.
+        '''
+        self._compact()
+        return np.bincount(self.edges.ravel(), minlength=len(self.coords))
+
+    def to_gdf(self):
+        '''
+        Converts the graph edges to a GeoDataFrame.
+
+        Returns
+        -------
+        GeoDataFrame
+            A GeoDataFrame with the columns 'type' and 'length [m]'.
+        '''
+        self._compact()
+        geometries = shapely.linestrings(self.coords[self.edges])
+        return gpd.GeoDataFrame({'type': self.edge_type, 'length [m]': self.length}, geometry=geometries, crs=self.crs)
+
+    def to_networkx(self):
+        '''
+        Converts the graph to a NetworkX graph with coordinate tuples as nodes.
+
+        Returns
+        -------
+        nx.Graph
+            The street network graph.
+        '''
+        self._compact()
+        nodes = self.nodes
+        G = nx.Graph()
+        G.add_nodes_from(nodes)
+        G.add_edges_from(
+            (nodes[u], nodes[v], {'type': t, 'length [m]': l})
+            for (u, v), t, l in zip(self.edges.tolist(), self.edge_type, self.length.tolist())
+        )
+        return G
+
+    def to_arrays(self):
+        '''
+        Returns the nodes and edges as plain arrays, e.g. to save them with numpy.savez.
+
+        Returns
+        -------
+        dict
+            Arrays 'tolerance', 'coords', 'edges', 'length', 'street_id', 'edge_type' with the code of each edge type
+            and 'edge_type_names' with the names of the codes.
+        '''
+        self._compact()
+        names, codes = np.unique(self.edge_type.astype(str), return_inverse=True)
+        return {
+            'tolerance': np.float64(self.node_index.tolerance),
+            'coords': self.coords.copy(),
+            'edges': self.edges.copy(),
+            'length': self.length.copy(),
+            'street_id': self.street_id.copy(),
+            'edge_type': codes.ravel().astype(np.int32),
+            'edge_type_names': names
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, crs=None):
+        '''
+        Restores a graph from the arrays of to_arrays.
+
+        Parameters
+        ----------
+        arrays : dict or NpzFile
+            The arrays returned by to_arrays.
+        crs : string, optional
+            coordinate reference system (default is None).
+
+        Returns
+        -------
+        StreetGraph
+            A graph with the same node ids and edges.
+        '''
+        tolerance = float(arrays['tolerance'])
+        G = cls(crs, tolerance)
+        G.node_index = NodeIndex.from_coords(arrays['coords'], tolerance)
+        G.edges = np.asarray(arrays['edges'], dtype=np.int32).reshape(-1, 2)
+        G.length = np.asarray(arrays['length'], dtype=np.float64)
+        G.street_id = np.asarray(arrays['street_id'], dtype=np.int64)
+        G.edge_type = np.asarray(arrays['edge_type_names'], dtype=object)[np.asarray(arrays['edge_type'], dtype=np.int64)]
+        return G
+
+class ContractedGraph:
+    '''
+    A StreetGraph reduced to the nodes which are not inner nodes of chains, e.g. the many vertices of a curved street.
+
+    Every chain of nodes with degree 2 becomes one edge with the length of the chain. Shortest paths are calculated on
+    the reduced graph and then expanded to all nodes of the street graph, so the results equal those of
+    StreetGraph.shortest_path_tree.
+
+    Attributes
+    ----------
+    graph : StreetGraph
+        The full street graph.
+    nodes : ndarray
+        Ids of the nodes of the reduced graph in the street graph.
+    position : ndarray
+        Position of every node of the street graph in nodes, -1 for inner nodes of chains.
+    csr : csr_matrix
+        Symmetric adjacency matrix of the reduced graph with the shortest chain or edge between two nodes as weight.
+    chain_start, chain_end : ndarray
+        Node ids of the ends of each chain.
+    chain_length : ndarray
+        Length of each chain.
+    chain_first, chain_last : ndarray
+        Node ids of the first and last inner node of each chain, seen from chain_start.
+    chain : ndarray
+        Chain of every node of the street graph, -1 for nodes of the reduced graph and nodes of closed rings.
+    offset : ndarray
+        Distance of every inner node from the start of its chain.
+    previous, next : ndarray
+        Neighbour of every inner node towards the start and towards the end of its chain.
+
+    Methods
+    -------
+    shortest_path_tree(source):
+        Calculates distances and predecessors of all nodes of the street graph from one or several source nodes.
+    subtree_sums(pred, values):
+        Sums node values over the subtrees of a shortest path tree of the street graph.
+    '''
+
+    def __init__(self, graph, keep=None):
+        '''
+        Finds the chains of the street graph and builds the reduced graph.
+
+        Parameters
+        ----------
+        graph : StreetGraph
+            The street graph.
+        keep : array_like, optional
+            Node ids which must not be contracted, e.g. sources and buildings (default is None).
+        '''
+        self.graph = graph
+        csr = graph.csr
+        n = csr.shape[0]
+        indptr, indices, weights = csr.indptr, csr.indices.astype(np.int64), csr.data
+        row = np.repeat(np.arange(n), np.diff(indptr))
+
+        # Inner nodes of chains have two neighbours and no loop
+        inner = np.diff(indptr) == 2
+        inner[row[row == indices]] = False
+        if keep is not None:
+            inner[np.asarray(keep, dtype=np.int64)] = False
+
+        # Walk along all chains at once, starting at every edge from a node of the reduced graph into a chain
+        start_edge = np.flatnonzero(~inner[row] & inner[indices])
+        start = row[start_edge]
+        current = indices[start_edge]
+        previous = start.copy()
+        distance = weights[start_edge].copy()
+        walk = np.arange(len(start_edge))
+        first = current.copy()
+        end = np.full(len(start_edge), -1, dtype=np.int64)
+        last = np.full(len(start_edge), -1, dtype=np.int64)
+        total = np.zeros(len(start_edge))
+        steps = []
+        while len(walk):
+            # The neighbour which is not the previous node
+            k = indptr[current]
+            other = indices[k] == previous
+            following = np.where(other, indices[k + 1], indices[k])
+            steps.append((walk, current, previous, following, distance))
+
+            distance = distance + np.where(other, weights[k + 1], weights[k])
+            previous, current = current, following
+            done = ~inner[current]
+            end[walk[done]] = current[done]
+            last[walk[done]] = previous[done]
+            total[walk[done]] = distance[done]
+            walk, current, previous, distance = walk[~done], current[~done], previous[~done], distance[~done]
+
+        # Every chain is walked from both ends, the walk from the smaller end is kept
+        forward = (start < end) | ((start == end) & (first < last))
+        self.chain_start = start[forward]
+        self.chain_end = end[forward]
+        self.chain_length = total[forward]
+        self.chain_first = first[forward]
+        self.chain_last = last[forward]
+        chain_id = np.full(len(start_edge), -1, dtype=np.int64)
+        chain_id[forward] = np.arange(forward.sum())
+
+        self.chain = np.full(n, -1, dtype=np.int64)
+        self.offset = np.zeros(n)
+        self.previous = np.full(n, -1, dtype=np.int64)
+        self.next = np.full(n, -1, dtype=np.int64)
+        for walk, current, previous, following, distance in steps:
+            keep_step = forward[walk]
+            current = current[keep_step]
+            self.chain[current] = chain_id[walk[keep_step]]
+            self.offset[current] = distance[keep_step]
+            self.previous[current] = previous[keep_step]
+            self.next[current] = following[keep_step]
+
+        # Reduced graph with the shortest connection between each pair of nodes
+        self.nodes = np.flatnonzero(~inner)
+        self.position = np.full(n, -1, dtype=np.int64)
+        self.position[self.nodes] = np.arange(len(self.nodes))
+        direct = np.flatnonzero(~inner[row] & ~inner[indices] & (row < indices))
+        ring = self.chain_start == self.chain_end
+        u = self.position[np.concatenate([row[direct], self.chain_start[~ring]])]
+        v = self.position[np.concatenate([indices[direct], self.chain_end[~ring]])]
+        w = np.concatenate([weights[direct], self.chain_length[~ring]])
+        via = np.concatenate([np.full(len(direct), -1, dtype=np.int64), np.flatnonzero(~ring)])
+
+        m = len(self.nodes)
+        keys = np.minimum(u, v) * m + np.maximum(u, v)
+        order = np.lexsort((w, keys))
+        shortest = order[np.r_[True, keys[order][1:] != keys[order][:-1]]] if len(order) else order
+        self._edge_keys = keys[shortest]
+        self._edge_chain = via[shortest]
+        u, v, w = u[shortest], v[shortest], w[shortest]
+        self.csr = csr_matrix((np.concatenate([w, w]), (np.concatenate([u, v]), np.concatenate([v, u]))), shape=(m, m))
+
+    def shortest_path_tree(self, source):
+        '''
+        Calculates distances and predecessors of all nodes of the street graph from one or several source nodes.
+
+        Parameters
+        ----------
+        source : int or array_like
+            Id of the source node or ids of several source nodes in the street graph, which must not be inner nodes of
+            chains.
+
+        Returns
+        -------
+        tuple
+            dist, pred and origin of every node of the street graph, see StreetGraph.shortest_path_tree.
+        '''
+        n = len(self.position)
+        source = self.position[np.atleast_1d(source)]
+        r_dist, r_pred, r_origin = dijkstra(self.csr, directed=True, indices=source, return_predecessors=True, min_only=True)
+
+        dist = np.full(n, np.inf)
+        pred = np.full(n, -1, dtype=np.int64)
+        origin = np.full(n, -1, dtype=np.int64)
+        dist[self.nodes] = r_dist
+        reached = np.flatnonzero(r_origin >= 0)
+        origin[self.nodes[reached]] = self.nodes[r_origin[reached]]
+
+        # Predecessors of the reduced nodes are the last inner node of the chain they are reached through
+        child = np.flatnonzero(r_pred >= 0)
+        parent = r_pred[child]
+        m = len(self.nodes)
+        keys = np.minimum(parent, child) * m + np.maximum(parent, child)
+        via = self._edge_chain[np.searchsorted(self._edge_keys, keys)]
+        child, parent = self.nodes[child], self.nodes[parent]
+        through = via >= 0
+        from_start = self.chain_start[via[through]] == parent[through]
+        pred[child] = parent
+        pred[child[through]] = np.where(from_start, self.chain_last[via[through]], self.chain_first[via[through]])
+
+        # Inner nodes are reached from the nearer end of their chain
+        inner = np.flatnonzero(self.chain >= 0)
+        c = self.chain[inner]
+        via_start = dist[self.chain_start[c]] + self.offset[inner]
+        via_end = dist[self.chain_end[c]] + self.chain_length[c] - self.offset[inner]
+        use_start = via_start <= via_end
+        dist[inner] = np.minimum(via_start, via_end)
+        reached = np.isfinite(dist[inner])
+        inner, c, use_start = inner[reached], c[reached], use_start[reached]
+        pred[inner] = np.where(use_start, self.previous[inner], self.next[inner])
+        origin[inner] = origin[np.where(use_start, self.chain_start[c], self.chain_end[c])]
+        return dist, pred.astype(np.int32), origin.astype(np.int32)
+
+    def subtree_sums(self, pred, values):
+        '''
+        Sums node values over the subtrees of a shortest path tree of the street graph.
+
+        The sums are accumulated on the reduced graph and copied to the inner nodes of the chains, so all values must
+        belong to nodes of the reduced graph.
+
+        Parameters
+        ----------
+        pred : ndarray
+            Predecessor of every node of the street graph, e.g. from shortest_path_tree.
+        values : ndarray
+            Values per node of the street graph, either of shape (n,) or (n, k).
+
+        Returns
+        -------
+        ndarray
+            For every node the sum of its own value and the values of all its descendants.
+        '''
+        pred = np.asarray(pred, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        # Predecessor in the reduced tree, chains are skipped to their other end
+        parent = pred[self.nodes]
+        chain = np.where(parent >= 0, self.chain[np.maximum(parent, 0)], -1)
+        through = chain >= 0
+        parent[through] = np.where(self.chain_end[chain[through]] == self.nodes[through], self.chain_start[chain[through]], self.chain_end[chain[through]])
+        parent = np.where(parent >= 0, self.position[np.maximum(parent, 0)], -1)
+
+        sums = np.zeros(values.shape)
+        sums[self.nodes] = subtree_sums(parent, values[self.nodes])
+
+        # Inner nodes of a chain which leads to a reduced node carry the sums of that node
+        child = self.nodes[through]
+        covered = np.zeros(len(self.chain_start), dtype=np.int64) - 1
+        covered[chain[through]] = child
+        inner = np.flatnonzero(self.chain >= 0)
+        below = covered[self.chain[inner]]
+        inner, below = inner[below >= 0], below[below >= 0]
+        sums[inner] = sums[below]
+        return sums
@@ -0,0 +1,138 @@
+import numpy as np
+
+from .street_graph import tree_depth
+from .water_properties import density, heat_capacity, volumeflow
+
+def temperature_factor(ua, flow, temp):
+    '''
+    Share of the temperature difference to the ground which is left at the end of a pipe.
+
+    Parameters
+    ----------
+    ua : array_like
+        Heat transfer of the pipe, U-value times length, in W/K.
+    flow : array_like
+        Volume flow in l/s.
+    temp : float or array_like
+        Water temperature in °C for the density and heat capacity.
+
+    Returns
+    -------
+    ndarray
+        exp(-UA / (m * cp)), 0 for pipes without flow, which cool down to the ground temperature.
+    '''
+    ua = np.asarray(ua, dtype=np.float64)
+    flow = np.asarray(flow, dtype=np.float64)
+    capacity_rate = density(temp) * heat_capacity(temp) * flow  # W/K, kg/m³ * l/s * kJ/(kg K)
+    exponent = np.divide(ua, capacity_rate, out=np.full(np.broadcast(ua, capacity_rate).shape, np.inf), where=capacity_rate > 0)
+    return np.exp(-exponent)
+
+def simulate_tree(pred, ua, power, load_factor, htemp, ltemp, ground_temp=10, targets=None, chunk_size=168):
+    '''
+    Hourly supply temperatures and heat losses of a tree shaped net.
+
+    The volume flow of every pipe follows its design power times the load factor of the hour. The supply
+    temperature is propagated from the sources level by level through the tree, every pipe cools the water
+    exponentially towards the ground temperature. The return line is assumed to have the return temperature
+    everywhere, so its loss is UA * (ltemp - ground_temp). All nodes are calculated at once for a chunk of hours.
+
+    The model is quasi-steady, the heat stored in the water is not tracked from hour to hour. A pipe without flow in
+    an hour, e.g. in every hour with a load factor of 0, is assumed to have cooled down to the ground temperature: its
+    supply line gives off no heat and the pipes behind it get water at ground temperature. The supply loss of such
+    hours is therefore underestimated, the return loss is counted in every hour.
+
+    Parameters
+    ----------
+    pred : ndarray
+        Predecessor of every node, -1 for the sources and for unreachable nodes.
+    ua : ndarray
+        U-value times length of the tree edge from the predecessor to each node in W/K.
+    power : ndarray
+        Design power of the tree edge from the predecessor to each node in kW, e.g. with simultaneity factor.
+    load_factor : array_like
+        Share of the design power in each hour, e.g. the hourly demand divided by its maximum.
+    htemp : float or array_like
+        Supply temperature at the sources, constant or one value per hour.
+    ltemp : float or array_like
+        Return temperature, constant or one value per hour.
+    ground_temp : float or array_like, optional
+        Temperature of the ground, constant or one value per hour (default is 10).
+    targets : array_like, optional
+        Nodes for the lowest supply temperature, e.g. the buildings (default is None, all reached nodes).
+    chunk_size : int, optional
+        Number of hours per chunk (default is 168, one week).
+
+    Returns
+    -------
+    dict
+        Arrays with one value per hour: 'supply_loss [kW]', 'return_loss [kW]', 'loss [kW]' and
+        'min_supply_temperature [°C]' of the targets, and with one value per node: 'min_temperature [°C]',
+        the lowest supply temperature of the year, NaN for unreachable nodes.
+    '''
+    pred = np.asarray(pred, dtype=np.int64)
+    n_nodes = len(pred)
+    load_factor = np.asarray(load_factor, dtype=np.float64)
+    n_hours = len(load_factor)
+    htemp = np.broadcast_to(np.asarray(htemp, dtype=np.float64), (n_hours,))
+    ltemp = np.broadcast_to(np.asarray(ltemp, dtype=np.float64), (n_hours,))
+    ground_temp = np.broadcast_to(np.asarray(ground_temp, dtype=np.float64), (n_hours,))
+
+    # Tree edges, one per reached node, ordered level by level from the sources
+    depth = tree_depth(pred)
+    reached = np.flatnonzero(pred >= 0)
+    order = reached[np.argsort(depth[reached], kind='stable')]
+    bounds = np.concatenate([[0], np.flatnonzero(np.diff(depth[order])) + 1, [len(order)]]) if len(order) else [0]
+    levels = [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+    position = np.full(n_nodes, -1, dtype=np.int64)
+    position[order] = np.arange(len(order))
+    parent = position[pred[order]]
+    ua = np.nan_to_num(np.asarray(ua, dtype=np.float64)[order])
+    power = np.nan_to_num(np.asarray(power, dtype=np.float64)[order])
+
+    targets = order if targets is None else np.asarray(targets, dtype=np.int64)
+    targets = position[targets[position[targets] >= 0]]
+
+    supply_loss = np.zeros(n_hours)
+    min_supply = np.full(n_hours, np.nan)
+    lowest = np.full(len(order), np.inf)
+
+    for start in range(0, n_hours, chunk_size):
+        hours = slice(start, min(start + chunk_size, n_hours))
+        source_excess = htemp[hours] - ground_temp[hours]
+
+        # Volume flows and temperature factors of all tree edges, shape (edges, hours)
+        flow = power[:, None] * volumeflow(load_factor[hours], htemp[hours], ltemp[hours])[None, :]
+        factor = temperature_factor(ua[:, None], flow, htemp[hours][None, :])
+
+        # Temperature above ground at the end of each edge, the parents of the first level are sources
+        excess = np.empty_like(flow)
+        inlet = np.empty_like(flow)
+        for level in levels:
+            parents = parent[level]
+            if parents[0] < 0:
+                inlet[level] = source_excess
+            else:
+                inlet[level] = excess[parents]
+            excess[level] = inlet[level] * factor[level]
+
+        # Heat given off by the water of each edge, kg/m³ * l/s / 1000 * kJ/(kg K) * K = kW
+        capacity = (density(htemp[hours]) * heat_capacity(htemp[hours]))[None, :] * flow / 1000
+        supply_loss[hours] = (capacity * (inlet - excess)).sum(axis=0)
+        if len(targets):
+            min_supply[hours] = ground_temp[hours] + excess[targets].min(axis=0)
+        if len(order):
+            np.minimum(lowest, (excess + ground_temp[hours][None, :]).min(axis=1), out=lowest)
+
+    return_loss = ua.sum() * (ltemp - ground_temp) / 1000
+    min_temperature = np.full(n_nodes, np.nan)
+    min_temperature[order] = lowest
+    sources = (pred < 0) & np.isin(np.arange(n_nodes), pred)
+    min_temperature[sources] = htemp.min(initial=np.inf) if n_hours else np.nan
+
+    return {
+        'supply_loss [kW]': supply_loss,
+        'return_loss [kW]': return_loss,
+        'loss [kW]': supply_loss + return_loss,
+        'min_supply_temperature [°C]': min_supply,
+        'min_temperature [°C]': min_temperature
+    }
@@ -0,0 +1,149 @@
+import numpy as np
+
+# Properties of water at 0, 10, ..., 100 °C
+TEMPERATURE = np.array([0, 10, 20, 30, 40, 50, 60, 70, 80, 90, 100], dtype=np.float64)
+DENSITY = np.array([999.84, 999.7, 998.21, 995.65, 992.22, 988.03, 983.2, 977.78, 971.82, 965.35, 958.4])  # kg/m³
+HEAT_CAPACITY = np.array([4.2176, 4.1921, 4.1818, 4.1784, 4.1785, 4.1806, 4.1843, 4.1895, 4.1963, 4.205, 4.2159])  # kJ/(kg K)
+VISCOSITY = np.array([1.792, 1.307, 1.004, 0.801, 0.658, 0.553, 0.474, 0.413, 0.365, 0.326, 0.294]) * 1e-6  # m²/s
+
+def density(temp):
+    '''
+    Density of water by piecewise linear interpolation.
+
+    Parameters
+    ----------
+    temp : float or array_like
+        Temperature in °C.
+
+    Returns
+    -------
+    float or ndarray
+        Density in kg/m³.
+    '''
+    return np.interp(temp, TEMPERATURE, DENSITY)
+
+def heat_capacity(temp):
+    '''
+    Specific heat capacity of water by piecewise linear interpolation.
+
+    Parameters
+    ----------
+    temp : float or array_like
+        Temperature in °C.
+
+    Returns
+    -------
+    float or ndarray
+        Specific heat capacity in kJ/(kg K).
+    '''
+    return np.interp(temp, TEMPERATURE, HEAT_CAPACITY)
+
+def kinematic_viscosity(temp):
+    '''
+    Kinematic viscosity of water by piecewise linear interpolation.
+
+    Parameters
+    ----------
+    temp : float or array_like
+        Temperature in °C.
+
+    Returns
+    -------
+    float or ndarray
+        Kinematic viscosity in m²/s.
+    '''
+    return np.interp(temp, TEMPERATURE, VISCOSITY)
+
+def volumeflow(power, htemp, ltemp):
+    '''
+    Volume flow of water which transports a power between supply and return temperature.
+
+    All parameters are broadcast against each other, e.g. powers of shape (edges,) and temperatures of shape (hours, 1).
+
+    Parameters
+    ----------
+    power : float or array_like
+        Power in kW.
+    htemp : float or array_like
+        Supply temperature in °C, the properties of the water are taken at the supply temperature.
+    ltemp : float or array_like
+        Return temperature in °C.
+
+    Returns
+    -------
+    float or ndarray
+        Volume flow in l/s.
+    '''
+    htemp = np.asarray(htemp, dtype=np.float64)
+    return np.asarray(power, dtype=np.float64) / (density(htemp) / 1000 * heat_capacity(htemp) * (htemp - np.asarray(ltemp, dtype=np.float64)))
+
+def hourly_volumeflows(power, load_factor, htemp, ltemp, chunk_size=744):
+    '''
+    Volume flows of many edges for every hour of a load profile, calculated in chunks of hours.
+
+    Parameters
+    ----------
+    power : array_like
+        Design power of each edge in kW, e.g. with simultaneity factor.
+    load_factor : array_like
+        Share of the design power in each hour, e.g. the hourly demand divided by its maximum.
+    htemp : float or array_like
+        Supply temperature, constant or one value per hour, e.g. from a sliding supply temperature curve.
+    ltemp : float or array_like
+        Return temperature, constant or one value per hour.
+    chunk_size : int, optional
+        Number of hours per chunk (default is 744, one month).
+
+    Yields
+    ------
+    tuple
+        The slice of the hours and the volume flows in l/s of these hours with shape (hours, edges).
+    '''
+    power = np.asarray(power, dtype=np.float64)
+    load_factor = np.asarray(load_factor, dtype=np.float64)
+    n_hours = len(load_factor)
+    htemp = np.broadcast_to(np.asarray(htemp, dtype=np.float64), (n_hours,))
+    ltemp = np.broadcast_to(np.asarray(ltemp, dtype=np.float64), (n_hours,))
+
+    for start in range(0, n_hours, chunk_size):
+        hours = slice(start, min(start + chunk_size, n_hours))
+        # The flow per kW only depends on the hour
+        flow_per_kW = volumeflow(load_factor[hours], htemp[hours], ltemp[hours])
+        yield hours, flow_per_kW[:, None] * power[None, :]
+
+def hourly_volumeflow_summary(power, load_factor, htemp, ltemp, chunk_size=744):
+    '''
+    Maximum and annual volume flow of many edges over a load profile without keeping all hours in memory.
+
+    Parameters
+    ----------
+    power : array_like
+        Design power of each edge in kW, e.g. with simultaneity factor.
+    load_factor : array_like
+        Share of the design power in each hour.
+    htemp : float or array_like
+        Supply temperature, constant or one value per hour.
+    ltemp : float or array_like
+        Return temperature, constant or one value per hour.
+    chunk_size : int, optional
+        Number of hours per chunk (default is 744, one month).
+
+    Returns
+    -------
+    dict
+        Arrays with one value per edge: 'max_volumeflow [l/s]', 'max_hour' with the hour of the maximum and
+        'volume [m³/a]' with the volume of all hours.
+    '''
+    power = np.asarray(power, dtype=np.float64)
+    maximum = np.zeros(len(power))
+    max_hour = np.zeros(len(power), dtype=np.int64)
+    volume = np.zeros(len(power))
+
+    for hours, flows in hourly_volumeflows(power, load_factor, htemp, ltemp, chunk_size):
+        chunk_max = flows.max(axis=0, initial=0)
+        larger = chunk_max > maximum
+        maximum[larger] = chunk_max[larger]
+        max_hour[larger] = hours.start + flows.argmax(axis=0)[larger]
+        volume += flows.sum(axis=0) * 3.6  # l/s for one hour --> m³
+
+    return {'max_volumeflow [l/s]': maximum, 'max_hour': max_hour, 'volume [m³/a]': volume}
@@ -48,6 +48,7 @@ autodoc_mock_imports = [
     'matplotlib',
     'openpyxl',
     'numpy',
+    'scipy',
     'owslib',
     'networkx',
     'qgis',